@@ -0,0 +1,72 @@
+"""
+Benchmark of the cohort aggregation over synthetic ancestry results.
+
+Writes cohorts of increasing size as NDJSON and as a JSON array, then reports the time to
+aggregate each one and the peak memory allocated while doing so.
+
+Usage: python benchmarks/bench_cohort.py --profiles 10000 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from genobank_cohort import REFERENCE_POPULATIONS, aggregate_files
+
+
+def write_cohort(path: str, profiles: int, as_array: bool, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        if as_array:
+            f.write("[\n")
+        for start in range(0, profiles, 10_000):
+            fractions = rng.dirichlet(np.full(len(REFERENCE_POPULATIONS), 0.3), size=min(10_000, profiles - start))
+            for i, row in enumerate(fractions):
+                record = {"status": "Success", "data": {"ancestry": {
+                    name: f"{value:.6f}" for name, value in zip(REFERENCE_POPULATIONS, row) if value > 1e-6
+                }}}
+                separator = "," if as_array and start + i < profiles - 1 else ""
+                f.write(json.dumps(record) + separator + "\n")
+        if as_array:
+            f.write("]\n")
+
+
+def bench(path: str, chunk_size: int) -> tuple[float, int, int]:
+    started = time.perf_counter()
+    report = aggregate_files([path], chunk_size)
+    elapsed = time.perf_counter() - started
+    # tracemalloc slows allocation down several times, so memory is measured in a separate untimed run.
+    tracemalloc.start()
+    aggregate_files([path], chunk_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, report["profiles"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    print(f"{'profiles':>10} {'format':>7} {'time':>9} {'profiles/s':>12} {'peak alloc':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for profiles in args.profiles:
+            for as_array in (False, True):
+                path = os.path.join(directory, f"cohort_{profiles}.{'json' if as_array else 'ndjson'}")
+                write_cohort(path, profiles, as_array)
+                seconds, peak, counted = bench(path, args.chunk_size)
+                print(f"{counted:>10} {'json' if as_array else 'ndjson':>7} {seconds:>8.2f}s "
+                      f"{counted / seconds:>12.0f} {peak / 1024 / 1024:>9.1f} MiB")
+                os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Cold-start benchmark of the stdio MCP server.
+
+Starts `python genobank_api_functions.py` with stdin closed, so mcp.run exits as soon as it
+has started, and reports the median wall time over several runs. The runs include the server
+lifespan, with an empty state directory. One extra run with `-X importtime` lists the slowest
+imports, and checks that modules which must load lazily (qrcode, Pillow, http.server, webbrowser)
+are not imported at startup. The check also fails if startup created the SQLite state (journal, mint
+queue, OpenCRAVAT watcher), which opens on first use, or if the median exceeds --max-ms.
+
+Usage: python benchmarks/bench_import.py --runs 5
+       python benchmarks/bench_import.py --max-ms 1000   # exit with status 1 over budget
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER = os.path.join(ROOT, "genobank_api_functions.py")
+
+LAZY_MODULES = ("qrcode", "PIL", "http.server", "webbrowser", "numpy")
+# Median cold start budget, in milliseconds.
+DEFAULT_MAX_MS = 1500.0
+
+
+def _run_server(env: dict, *python_args: str) -> tuple[float, str]:
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, *python_args, SERVER],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+        cwd=ROOT,
+        text=True,
+        check=True,
+    )
+    return time.perf_counter() - started, completed.stderr
+
+
+def parse_importtime(stderr: str) -> dict[str, tuple[int, int]]:
+    """
+    Maps each imported module to its (self, cumulative) import time in microseconds.
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to time")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--max-ms", type=float, default=DEFAULT_MAX_MS,
+                        help="Exit with status 1 if the median cold start exceeds this (0 disables the check)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        env = {**os.environ, "GENOBANK_STATE_DIR": state_dir}
+        # Warm the bytecode and OS file caches so every timed run measures the same thing.
+        _run_server(env)
+        timings = [_run_server(env)[0] for _ in range(args.runs)]
+        _, stderr = _run_server(env, "-X", "importtime")
+        eager_state = sorted(os.listdir(state_dir))
+
+    modules = parse_importtime(stderr)
+    median_ms = statistics.median(timings) * 1000
+    eager = [name for name in LAZY_MODULES if name in modules]
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[: args.top]
+
+    print(f"cold start: median {median_ms:.1f}ms, min {min(timings) * 1000:.1f}ms over {len(timings)} runs")
+    print(f"imported modules: {len(modules)}")
+    print("slowest imports (self time):")
+    for name, (self_us, cumulative_us) in slowest:
+        print(f"  {self_us / 1000:8.1f}ms self {cumulative_us / 1000:8.1f}ms cumulative  {name}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"median_ms": median_ms, "runs_ms": [t * 1000 for t in timings],
+                       "modules": len(modules), "eager_lazy_modules": eager, "eager_state": eager_state}, f, indent=2)
+
+    failed = False
+    if eager:
+        print(f"REGRESSION: imported at startup but should load lazily: {', '.join(eager)}")
+        failed = True
+    if eager_state:
+        print(f"REGRESSION: startup created state that should open on first use: {', '.join(eager_state)}")
+        failed = True
+    if args.max_ms > 0 and median_ms > args.max_ms:
+        print(f"REGRESSION: median cold start {median_ms:.1f}ms > {args.max_ms}ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark of the ancestry profile store: bulk insert rate and k-nearest-neighbor query latency.
+
+Fills a temporary store with synthetic profiles, then reports p50/p95 query latency for both metrics.
+
+Usage: python benchmarks/bench_profiles.py --profiles 100000 1000000 --queries 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from genobank_profiles import DIMENSIONS, METRICS, ProfileStore
+
+INSERT_BATCH = 100_000
+
+
+def fill(store: ProfileStore, profiles: int, rng: np.random.Generator) -> float:
+    started = time.perf_counter()
+    for start in range(store.count, profiles, INSERT_BATCH):
+        vectors = rng.dirichlet(np.full(DIMENSIONS, 0.3), size=min(INSERT_BATCH, profiles - start)).astype(np.float32)
+        store.add((f"profile-{start + i}", vector) for i, vector in enumerate(vectors))
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'profiles':>10} {'insert/s':>10} {'metric':>10} {'p50':>9} {'p95':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        store = ProfileStore(directory)
+        for profiles in sorted(args.profiles):
+            before = store.count
+            seconds = fill(store, profiles, rng)
+            queries = rng.dirichlet(np.full(DIMENSIONS, 0.3), size=args.queries).astype(np.float32)
+            for metric in METRICS:
+                latencies = []
+                for query in queries:
+                    started = time.perf_counter()
+                    store.search(query, args.k, metric)
+                    latencies.append((time.perf_counter() - started) * 1000)
+                p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+                print(f"{store.count:>10} {(store.count - before) / max(seconds, 1e-9):>10.0f} {metric:>10} "
+                      f"{statistics.median(latencies):>7.1f}ms {p95:>7.1f}ms")
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
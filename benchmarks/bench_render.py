@@ -0,0 +1,56 @@
+"""
+Micro-benchmark for the ancestry report renderer.
+
+Renders synthetic ancestry profiles of increasing size and reports the time per render
+and the memory allocated while rendering.
+
+Usage: python benchmarks/bench_render.py [--repeat N]
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from genobank_api_functions import get_html_ancestry_page_chart
+from genobank_cohort import REFERENCE_POPULATIONS
+
+
+def make_profile(populations: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    names = [REFERENCE_POPULATIONS[i % len(REFERENCE_POPULATIONS)] + ("" if i < len(REFERENCE_POPULATIONS) else f"_{i}")
+             for i in range(populations)]
+    weights = [rng.random() for _ in names]
+    total = sum(weights)
+    return {"data": {"ancestry": {name: str(w / total) for name, w in zip(names, weights)}}}
+
+
+def bench(populations: int, repeat: int) -> tuple[float, int]:
+    data = make_profile(populations)
+    get_html_ancestry_page_chart(data)
+    number = max(1, 2000 // populations)
+    best = min(timeit.repeat(lambda: get_html_ancestry_page_chart(data), number=number, repeat=repeat)) / number
+
+    tracemalloc.start()
+    get_html_ancestry_page_chart(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'populations':>12} {'time/render':>14} {'peak alloc':>12}")
+    for populations in (len(REFERENCE_POPULATIONS), 100, 1_000, 10_000):
+        seconds, peak = bench(populations, args.repeat)
+        print(f"{populations:>12} {seconds * 1e6:>11.1f} us {peak / 1024:>9.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Load benchmark of the MCP tools against the local mock GenoBank API.
+
+Calls each tool through the FastMCP tool manager at several concurrency levels and
+reports p50/p95/p99 latency and calls per second. Signing is skipped by presetting a signature.
+
+Usage: python benchmarks/bench_tools.py --requests 200 --concurrency 1 8 32 --latency-ms 50
+       python benchmarks/bench_tools.py --max-p95-ms 500 --json bench_output.json   # fail on regressions
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_genobank import add_mock_arguments, config_from_args, start_mock_server
+
+BENCH_SIGNATURE = "0x" + "ab" * 65
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _mint_ip_job_args() -> dict:
+    return {
+        "receiver": "0x" + "1" * 40,
+        "job_id": uuid.uuid4().hex,
+        "biosample_serial": 1,
+        "opencravat_version": "2.4.2",
+        "num_unique_var": "4500000",
+        "owner": "0x" + "2" * 40,
+        "submission_time": "2025-01-01T00:00:00",
+        "assembly": "hg38",
+    }
+
+
+def scenarios(g, use_cache: bool) -> dict:
+    """
+    Each scenario returns the (tool name, arguments) of one call, after preparing module state.
+    """
+    def ancestry(output_format: str):
+        def call():
+            g.default_client_state.signature = BENCH_SIGNATURE
+            if not use_cache:
+                g.results_cache.clear()
+                g.report_cache.clear()
+            return "get_ancestry_html_results", {"output_format": output_format, "max_chars": 0}
+        return call
+
+    # Mints use fresh arguments on every call, so the mint journal never short-circuits them.
+    def license_token():
+        g.default_client_state.signature = BENCH_SIGNATURE
+        return "mint_license_token", {"ip_asset": "0x" + uuid.uuid4().hex, "receiver": "0x" + "4" * 40}
+
+    def ancestry_mint():
+        g.default_client_state.signature = "0x" + uuid.uuid4().hex
+        return "mint_my_ancestry_results", {}
+
+    return {
+        "mint_ip_job": lambda: ("mint_ip_job", _mint_ip_job_args()),
+        "mint_license_token": license_token,
+        "get_ancestry_html_results[html]": ancestry("html"),
+        "get_ancestry_html_results[summary]": ancestry("summary"),
+        "mint_my_ancestry_results": ancestry_mint,
+    }
+
+
+async def run_level(g, prepare, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            name, arguments = prepare()
+            started = time.perf_counter()
+            try:
+                result = await g.mcp.call_tool(name, arguments)
+                if hasattr(result, "content"):
+                    content = result.content
+                else:
+                    content = result[0] if isinstance(result, tuple) else result
+                text = content[0].text if content and hasattr(content[0], "text") else ""
+                if getattr(result, "isError", False) or text.startswith("Error"):
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "calls": len(latencies),
+        "errors": errors,
+        "p50_ms": _percentile(latencies, 0.50) * 1000,
+        "p95_ms": _percentile(latencies, 0.95) * 1000,
+        "p99_ms": _percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        "calls_per_second": len(latencies) / elapsed if elapsed else 0.0,
+    }
+
+
+async def run(args) -> list:
+    import genobank_api_functions as g
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    server = None
+    if args.base_url:
+        g.GENBANK_API_BASE = args.base_url
+    else:
+        server = start_mock_server(config_from_args(args))
+        g.GENBANK_API_BASE = f"http://127.0.0.1:{server.server_address[1]}"
+
+    results = []
+    state_dir = tempfile.TemporaryDirectory()
+    g.JOURNAL_PATH = os.path.join(state_dir.name, "state.sqlite3")
+    try:
+        async with g.app_lifespan(g.mcp):
+            available = scenarios(g, args.cache)
+            for name in args.scenarios or list(available):
+                for concurrency in args.concurrency:
+                    row = await run_level(g, available[name], args.requests, concurrency)
+                    row["scenario"] = name
+                    results.append(row)
+                    print(
+                        f"{name:<36} c={concurrency:<4} calls={row['calls']:<5} err={row['errors']:<4} "
+                        f"p50={row['p50_ms']:8.1f}ms p95={row['p95_ms']:8.1f}ms p99={row['p99_ms']:8.1f}ms "
+                        f"{row['calls_per_second']:8.1f} calls/s"
+                    )
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        state_dir.cleanup()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="Calls per scenario and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--scenarios", nargs="*", help="Scenarios to run (default: all)")
+    parser.add_argument("--cache", action="store_true", help="Keep the ancestry results cache warm between calls")
+    parser.add_argument("--base-url", help="Benchmark an already running API instead of the in-process mock")
+    parser.add_argument("--json", help="Write the results to this file")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit with status 1 if any p95 latency exceeds this")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.max_p95_ms is not None:
+        slow = [r for r in results if r["p95_ms"] > args.max_p95_ms]
+        for r in slow:
+            print(f"REGRESSION: {r['scenario']} at concurrency {r['concurrency']}: p95 {r['p95_ms']:.1f}ms > {args.max_p95_ms}ms")
+        sys.exit(1 if slow else 0)
+
+
+if __name__ == "__main__":
+    main()
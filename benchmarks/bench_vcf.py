@@ -0,0 +1,95 @@
+"""
+Benchmark of the VCF summary over a synthetic sorted VCF with multi-allelic and duplicate records.
+
+Writes the VCF plain and BGZF-compressed, summarizes each with 1 worker and with a process pool,
+and checks the unique variant count against a naive in-memory count.
+
+Usage: python benchmarks/bench_vcf.py --variants 1000000 --workers 1 8
+"""
+import argparse
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from genobank_vcf import ASSEMBLY_CONTIG_LENGTHS, summarize_vcf
+
+BGZF_BLOCK_DATA = 0xFF00
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+BASES = "ACGT"
+
+
+def bgzf_block(data: bytes) -> bytes:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    header = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+    return (header + struct.pack("<H", len(header) + 2 + len(compressed) + 8 - 1) + compressed
+            + struct.pack("<II", zlib.crc32(data), len(data)))
+
+
+def write_vcf(path: str, variants: int, seed: int = 0) -> int:
+    """
+    Writes a GRCh38 VCF and returns its number of unique (chrom, pos, ref, alt) variants.
+    """
+    rng = random.Random(seed)
+    lines = ["##fileformat=VCFv4.2"]
+    lines += [f"##contig=<ID=chr{name},length={length}>" for name, length in ASSEMBLY_CONTIG_LENGTHS["GRCh38"].items()]
+    lines.append("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tSAMPLE")
+    unique = set()
+    per_contig = variants // len(ASSEMBLY_CONTIG_LENGTHS["GRCh38"])
+    for name in ASSEMBLY_CONTIG_LENGTHS["GRCh38"]:
+        pos = 10_000
+        for _ in range(per_contig):
+            pos += rng.randint(0, 400)
+            ref = rng.choice(BASES)
+            alts = rng.sample([b for b in BASES if b != ref], rng.choice((1, 1, 1, 2)))
+            if rng.random() < 0.05:
+                alts = ["<NON_REF>"]
+            unique.update((name, pos, ref, a) for a in alts if a != "<NON_REF>")
+            lines.append(f"chr{name}\t{pos}\t.\t{ref}\t{','.join(alts)}\t50\tPASS\tDP=30\tGT:DP\t0/1:30")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return len(unique)
+
+
+def bgzip(source: str, target: str) -> None:
+    with open(source, "rb") as f, open(target, "wb") as out:
+        while data := f.read(BGZF_BLOCK_DATA):
+            out.write(bgzf_block(data))
+        out.write(BGZF_EOF)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        plain = os.path.join(directory, "sample.vcf")
+        expected = write_vcf(plain, args.variants)
+        compressed = plain + ".gz"
+        bgzip(plain, compressed)
+        print(f"{expected} unique variants, {os.path.getsize(plain) >> 20} MiB plain, "
+              f"{os.path.getsize(compressed) >> 20} MiB bgzip")
+        print(f"{'file':>6} {'workers':>8} {'chunks':>7} {'time':>8} {'records/s':>11} {'unique':>9} {'assembly':>9}")
+        for workers in args.workers:
+            with ProcessPoolExecutor(workers) as pool:
+                for label, path in (("plain", plain), ("bgzip", compressed)):
+                    started = time.perf_counter()
+                    summary = summarize_vcf(path, pool if workers > 1 else None, workers)
+                    elapsed = time.perf_counter() - started
+                    status = "ok" if summary["num_unique_var"] == expected else f"!= {expected}"
+                    print(f"{label:>6} {workers:>8} {summary['chunks']:>7} {elapsed:>7.2f}s "
+                          f"{summary['records'] / elapsed:>11,.0f} {summary['num_unique_var']:>9} "
+                          f"{summary['assembly']:>9} {status}")
+
+
+if __name__ == "__main__":
+    main()
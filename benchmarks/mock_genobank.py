@@ -0,0 +1,213 @@
+"""
+Local stand-in for the GenoBank API, for benchmarks and offline development.
+
+Implements /mint_ipa_job, /mint_license_token, /api_somos_dao/get_results and
+/api_somos_dao/min_ancestry_ip_asset with configurable latency, error rate and payload size,
+and OpenCRAVAT's /submit/getjobs, whose jobs finish a few seconds after they are first polled.
+
+Usage: python benchmarks/mock_genobank.py --port 8081 --latency-ms 50 --error-rate 0.01
+Then point the MCP server at it with GENBANK_API_BASE=http://localhost:8081
+(and OPENCRAVAT_API_BASE=http://localhost:8081)
+"""
+import argparse
+import hashlib
+import http.server
+import json
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from genobank_cohort import REFERENCE_POPULATIONS as POPULATIONS
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 20.0
+    jitter_ms: float = 5.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    populations: int = len(POPULATIONS)
+    padding_bytes: int = 0
+    # Mock OpenCRAVAT jobs finish within this many seconds of being polled for the first time.
+    cravat_job_seconds: float = 3.0
+
+
+CRAVAT_STEPS = ("Submitted", "Converter", "Mapper", "Annotator", "Aggregator", "Finished")
+
+
+def _ancestry_payload(signature: str, populations: int) -> dict:
+    rng = random.Random(signature)
+    names = [POPULATIONS[i % len(POPULATIONS)] + ("" if i < len(POPULATIONS) else f"_{i}") for i in range(populations)]
+    weights = [rng.random() for _ in names]
+    total = sum(weights)
+    return {"status": "Success", "data": {"ancestry": {n: f"{w / total:.6f}" for n, w in zip(names, weights)}}}
+
+
+def _mint_payload(config: MockConfig, rng: random.Random) -> dict:
+    payload = {
+        "status": "Success",
+        "ip_id": "0x" + "%040x" % rng.getrandbits(160),
+        "tx_hash": "0x" + "%064x" % rng.getrandbits(256),
+    }
+    if config.padding_bytes:
+        payload["padding"] = "x" * config.padding_bytes
+    return payload
+
+
+def make_handler(config: MockConfig):
+    first_polled: dict = {}
+
+    def cravat_job(job_id: str):
+        """
+        Status of a mock OpenCRAVAT job. IDs starting with "missing" are unknown, and with "error" fail.
+        """
+        if job_id.startswith("missing"):
+            return None
+        started = first_polled.setdefault(job_id, time.monotonic())
+        duration = config.cravat_job_seconds * (0.5 + random.Random(job_id).random() / 2)
+        progress = min(1.0, (time.monotonic() - started) / duration)
+        step = CRAVAT_STEPS[min(int(progress * (len(CRAVAT_STEPS) - 1)), len(CRAVAT_STEPS) - 1)]
+        if job_id.startswith("error") and step == "Finished":
+            step = "Error"
+        return {
+            "id": job_id,
+            "status": step,
+            "open_cravat_version": "2.4.2",
+            "num_unique_var": random.Random(job_id).randint(1000, 5_000_000),
+            "submission_time": "2026-01-01T00:00:00",
+            "assembly": "hg38",
+        }
+
+    class MockGenoBankHandler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _simulate(self) -> bool:
+            """
+            Sleeps for the configured latency; returns False if this request should fail.
+            """
+            delay = max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+            time.sleep(delay)
+            if random.random() < config.error_rate:
+                self._send_json(config.error_status, {"status": "Error", "message": "Simulated failure"})
+                return False
+            return True
+
+        def _route(self, method: str):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            length = int(self.headers.get("Content-Length", 0))
+            self.body = self.rfile.read(length) if length else b""
+
+            routes = {
+                ("POST", "/mint_ipa_job"): self._mint,
+                ("POST", "/mint_license_token"): self._mint,
+                ("GET", "/api_somos_dao/get_results"): self._get_results,
+                ("POST", "/api_somos_dao/min_ancestry_ip_asset"): self._mint,
+                ("POST", "/submit/getjobs"): self._get_cravat_jobs,
+            }
+            handler = routes.get((method, url.path))
+            if handler is None:
+                self._send_json(404, {"status": "Error", "message": "Not found"})
+                return
+            if self._simulate():
+                handler(query)
+
+        def _mint(self, query: dict):
+            self._send_json(200, _mint_payload(config, random.Random()))
+
+        def _get_results(self, query: dict):
+            payload = _ancestry_payload(query.get("user_signature", ""), config.populations)
+            etag = '"%s"' % hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:32]
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self._send_json(200, payload, {"ETag": etag})
+
+        def _get_cravat_jobs(self, query: dict):
+            ids = json.loads(self.body or b"{}").get("ids", [])
+            self.server.cravat_requests = getattr(self.server, "cravat_requests", 0) + 1
+            self._send_json(200, [job for job in map(cravat_job, ids) if job is not None])
+
+        def do_GET(self):
+            self._route("GET")
+
+        def do_POST(self):
+            self._route("POST")
+
+    return MockGenoBankHandler
+
+
+def start_mock_server(config: MockConfig, host: str = "127.0.0.1", port: int = 0) -> http.server.ThreadingHTTPServer:
+    """
+    Starts the mock API in a background thread and returns the server; its URL port is server_address[1].
+    """
+    server = http.server.ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_mock_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=5.0, help="Standard deviation of the latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of simulated failures")
+    parser.add_argument("--populations", type=int, default=len(POPULATIONS),
+                        help="Populations per ancestry result")
+    parser.add_argument("--padding-bytes", type=int, default=0, help="Extra bytes in mint responses")
+
+
+def config_from_args(args: argparse.Namespace) -> MockConfig:
+    return MockConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        populations=args.populations,
+        padding_bytes=args.padding_bytes,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    server = http.server.ThreadingHTTPServer((args.host, args.port), make_handler(config_from_args(args)))
+    server.daemon_threads = True
+    print(f"Mock GenoBank API listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
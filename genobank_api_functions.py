@@ -1,81 +1,663 @@
-import io
-import base64
-import qrcode
 import asyncio
+import base64
+import functools
+import hashlib
+import itertools
 import json
+import os
+import re
+import secrets
+import sys
 import threading
-import http.server
-import socketserver
+import time
+import weakref
 import httpx
-import webbrowser
-from typing import Any, Dict, Optional
-from mcp.server.fastmcp import FastMCP
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+from html import escape
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Literal, Optional
+from mcp.server.fastmcp import Context, FastMCP
+from mcp.types import CallToolResult, ImageContent, TextContent
+from pydantic import BaseModel
+
+from genobank_ecrecover import InvalidSignature, same_address, signer_address
+from genobank_jobs import MintJobQueue
+from genobank_journal import MintJournal
+from genobank_looplag import LoopLagMonitor
+from genobank_metrics import instrument_tool, metrics
+from genobank_resilience import AdaptiveLimiter, CircuitBreaker, RetryPolicy, send_with_retries
+from genobank_state import StateStore, open_state_store
+from genobank_watcher import OpenCravatWatcher
+
+if TYPE_CHECKING:
+    # http.server and webbrowser are only needed once a signing session is opened; they are imported on first use
+    # to keep the startup of the stdio server fast.
+    import http.server
+    from concurrent.futures import ProcessPoolExecutor
 
-GENBANK_API_BASE = "https://genobank.app"
-OPENCRAVAT_API_BASE = "https://cravat.genobank.app"
+    from mcp.server.transport_security import TransportSecuritySettings
+
+    from genobank_profiles import ProfileStore
+
+GENBANK_API_BASE = os.environ.get("GENBANK_API_BASE", "https://genobank.app")
+OPENCRAVAT_API_BASE = os.environ.get("OPENCRAVAT_API_BASE", "https://cravat.genobank.app")
 
 # GENBANK_API_BASE = "http://localhost:8081"
 # OPENCRAVAT_API_BASE = "http://localhost:9091"
+# OpenCRAVAT endpoint that returns the status of the jobs whose IDs are posted as {"ids": [...]}.
+OPENCRAVAT_JOBS_ENDPOINT = "/submit/getjobs"
 
+# Connection pool shared by every outbound call to the GenoBank API.
+HTTP_TIMEOUT = float(os.environ.get("GENOBANK_HTTP_TIMEOUT", "10.0"))
+HTTP_MAX_CONNECTIONS = int(os.environ.get("GENOBANK_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("GENOBANK_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get("GENOBANK_HTTP_KEEPALIVE_EXPIRY", "30.0"))
+HTTP2_ENABLED = os.environ.get("GENOBANK_HTTP2", "0") == "1"
 
-mcp = FastMCP("genobank_api_functions")
+# Retries with exponential backoff, and a circuit breaker per GenoBank endpoint.
+RETRY_POLICY = RetryPolicy(
+    max_attempts=int(os.environ.get("GENOBANK_RETRY_ATTEMPTS", "3")),
+    base_delay=float(os.environ.get("GENOBANK_RETRY_BASE_DELAY", "0.5")),
+    max_delay=float(os.environ.get("GENOBANK_RETRY_MAX_DELAY", "10.0")),
+)
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("GENOBANK_BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(os.environ.get("GENOBANK_BREAKER_RESET_TIMEOUT", "30.0"))
 
-user_signature = None
-server_instance = None
+# Adaptive (AIMD) limit of concurrent requests per GenoBank endpoint, within these bounds.
+CONCURRENCY_INITIAL = int(os.environ.get("GENOBANK_CONCURRENCY_INITIAL", "8"))
+CONCURRENCY_MIN = int(os.environ.get("GENOBANK_CONCURRENCY_MIN", "1"))
+CONCURRENCY_MAX = int(os.environ.get("GENOBANK_CONCURRENCY_MAX", "64"))
+# Latency above this multiple of an endpoint's baseline latency shrinks its limit.
+CONCURRENCY_LATENCY_TOLERANCE = float(os.environ.get("GENOBANK_CONCURRENCY_LATENCY_TOLERANCE", "2.0"))
 
-@mcp.tool()
-async def mint_ip_job(
-    receiver: str,
-    job_id: str,
-    biosample_serial: int,
-    opencravat_version: str,
-    num_unique_var: str,
-    owner: str,
-    submission_time: str,
-    assembly: str,
-    ip_asset: str = ""
-) -> str:
-    url = (
-        f"{GENBANK_API_BASE}/mint_ipa_job?"
-        f"receiver={receiver}"
-        f"&job_id={job_id}"
-        f"&biosample_serial={biosample_serial}"
-        f"&opencravat_version={opencravat_version}"
-        f"&num_unique_var={num_unique_var}"
-        f"&owner={owner}"
-        f"&submission_time={submission_time}"
-        f"&assembly={assembly}"
-        f"&ip_asset={ip_asset}"
-    )
+# How long flows wait for the user to sign, and how often they report progress meanwhile.
+SIGNATURE_TIMEOUT = float(os.environ.get("GENOBANK_SIGNATURE_TIMEOUT", "120.0"))
+SIGNATURE_PROGRESS_INTERVAL = 5.0
+
+# Local signing server. Port 0 binds an ephemeral port; each session gets its own URL on it.
+SIGNATURE_SERVER_HOST = os.environ.get("GENOBANK_SIGNATURE_HOST", "localhost")
+SIGNATURE_SERVER_BIND = os.environ.get("GENOBANK_SIGNATURE_BIND", "127.0.0.1")
+SIGNATURE_SERVER_PORT = int(os.environ.get("GENOBANK_SIGNATURE_PORT", "0"))
+SIGNING_SESSION_TTL = 3600.0
+# QR codes of signing links kept rendered in memory, by link.
+QR_CACHE_SIZE = 32
+# Opens a page in the MetaMask mobile app's browser.
+METAMASK_DAPP_LINK = "https://metamask.app.link/dapp/"
+# Whether signing flows open the page in a browser on this machine. Defaults to on for stdio and off for
+# network transports, where the server usually runs on another machine; the signing URL is reported instead.
+OPEN_BROWSER = os.environ.get("GENOBANK_OPEN_BROWSER", "")
+
+# MCP transport. "stdio" serves the one client that spawned the process; "streamable-http" and "sse"
+# serve many clients from one long-lived process that shares its connection pool and caches.
+MCP_TRANSPORT = os.environ.get("GENOBANK_MCP_TRANSPORT", "stdio")
+MCP_HOST = os.environ.get("GENOBANK_MCP_HOST", "127.0.0.1")
+MCP_PORT = int(os.environ.get("GENOBANK_MCP_PORT", "8000"))
+# Maximum concurrent HTTP connections and requests; further requests get a 503. 0 means no limit.
+MCP_MAX_CONCURRENCY = int(os.environ.get("GENOBANK_MCP_MAX_CONCURRENCY", "0"))
+# Worker processes of the HTTP transports (0 starts one per CPU core). Several workers serve streamable HTTP
+# statelessly, since a client's requests may reach any worker.
+MCP_WORKERS = int(os.environ.get("GENOBANK_MCP_WORKERS", "1"))
+MCP_STATELESS = os.environ.get("GENOBANK_MCP_STATELESS", "0") == "1"
+# Host names clients use to reach the HTTP transports, comma-separated; requests with another Host header are
+# refused (DNS rebinding protection). Empty means the --host name, or this machine's names for a wildcard bind.
+MCP_ALLOWED_HOSTS = os.environ.get("GENOBANK_MCP_ALLOWED_HOSTS", "")
+# Without MCP sessions (stateless HTTP), a client's state is found by the value of this request header.
+# It should be a secret random token, since it gives access to the client's signature.
+CLIENT_TOKEN_HEADER = "X-GenoBank-Client"
+# Stateless clients whose state a worker keeps in memory; the least recently used are dropped beyond this.
+STATELESS_CLIENTS_MAX = 10000
+
+# State shared by worker processes: signing sessions and cached ancestry results. "memory" keeps it in this
+# process; "sqlite", "sqlite:///<path>" or "redis://..." share it between processes.
+STATE_STORE_URL = os.environ.get("GENOBANK_STATE_STORE", "memory")
+# How often a flow waiting for a signature checks the shared store, for signatures posted to another worker.
+STATE_POLL_INTERVAL = 0.5
+
+# Batch minting: default and maximum number of mints in flight, and retries for connection failures.
+BATCH_CONCURRENCY = int(os.environ.get("GENOBANK_BATCH_CONCURRENCY", "8"))
+BATCH_MAX_CONCURRENCY = 32
+
+# Local state (mint journal) lives here. An empty GENOBANK_JOURNAL_PATH disables the journal.
+STATE_DIR = os.path.expanduser(os.environ.get("GENOBANK_STATE_DIR", "~/.genobank_mcp"))
+JOURNAL_PATH = os.environ.get("GENOBANK_JOURNAL_PATH", os.path.join(STATE_DIR, "state.sqlite3"))
+# Seconds a license token receipt is replayed for. personal_sign signatures are deterministic, so after this a
+# repeated (ip_asset, receiver, signature) mint is taken as a new license rather than a retry.
+LICENSE_RECEIPT_TTL = float(os.environ.get("GENOBANK_LICENSE_RECEIPT_TTL", "600.0"))
+
+# Background mint jobs: persisted queue, worker pool size, and the per-request timeout mints get when queued.
+JOBS_PATH = os.environ.get("GENOBANK_JOBS_PATH", os.path.join(STATE_DIR, "state.sqlite3"))
+MINT_WORKERS = int(os.environ.get("GENOBANK_MINT_WORKERS", "4"))
+MINT_JOB_TIMEOUT = float(os.environ.get("GENOBANK_MINT_JOB_TIMEOUT", "120.0"))
+
+# Polling of watched OpenCRAVAT jobs: job IDs per request, requests in flight, and bounds of each job's interval.
+CRAVAT_BATCH_SIZE = int(os.environ.get("GENOBANK_CRAVAT_BATCH_SIZE", "100"))
+CRAVAT_POLL_CONCURRENCY = int(os.environ.get("GENOBANK_CRAVAT_POLL_CONCURRENCY", "4"))
+CRAVAT_POLL_MIN_INTERVAL = float(os.environ.get("GENOBANK_CRAVAT_POLL_MIN_INTERVAL", "5.0"))
+CRAVAT_POLL_MAX_INTERVAL = float(os.environ.get("GENOBANK_CRAVAT_POLL_MAX_INTERVAL", "300.0"))
+
+# Local directory the cohort tools may read ancestry result files from. Paths outside it are refused.
+DATA_DIR = os.path.abspath(os.path.expanduser(os.environ.get("GENOBANK_DATA_DIR", os.path.join(STATE_DIR, "data"))))
+# Profiles parsed into one NumPy matrix at a time by the cohort tools; bounds their memory use.
+COHORT_CHUNK_SIZE = int(os.environ.get("GENOBANK_COHORT_CHUNK_SIZE", "10000"))
+# Processes that summarize VCF chunks in parallel (0 = one per CPU; 1 summarizes in a thread of the server).
+VCF_WORKERS = int(os.environ.get("GENOBANK_VCF_WORKERS", "0"))
+# Directory of the memory-mapped ancestry profile store searched by find_similar_ancestry_profiles.
+PROFILE_STORE_DIR = os.path.expanduser(os.environ.get("GENOBANK_PROFILE_STORE", os.path.join(STATE_DIR, "profiles")))
+
+# Event-loop stalls of at least this many seconds are recorded with the tool and stack that caused them (0 disables).
+LOOP_LAG_THRESHOLD = float(os.environ.get("GENOBANK_LOOP_LAG_THRESHOLD", "0"))
+
+# Default size budget, in characters, of the text a tool returns to the model.
+OUTPUT_MAX_CHARS = int(os.environ.get("GENOBANK_OUTPUT_MAX_CHARS", "20000"))
+
+# In-process cache of ancestry results (keyed by signature hash) and of rendered report pages.
+RESULTS_CACHE_TTL = float(os.environ.get("GENOBANK_RESULTS_CACHE_TTL", "300.0"))
+RESULTS_CACHE_MAX_ENTRIES = int(os.environ.get("GENOBANK_RESULTS_CACHE_MAX_ENTRIES", "256"))
+RESULTS_CACHE_MAX_BYTES = int(os.environ.get("GENOBANK_RESULTS_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+
+@dataclass
+class ClientState:
+    """
+    Signing state of one connected MCP client. Clients never see each other's signatures or signing sessions.
+    key is set for stateless HTTP clients, whose signature is also kept in the shared state store under it.
+    """
+    signature: Optional[str] = None
+    key: Optional[str] = None
+
+
+@dataclass
+class SigningSession:
+    """
+    One pending MetaMask signature, resolved from the server thread into the event loop that opened it.
+    """
+    nonce: str
+    url: str
+    loop: asyncio.AbstractEventLoop
+    future: asyncio.Future
+    client: ClientState
+    description: str = ""
+    signature: Optional[str] = None
+    created: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    size: int
+    expires: float
+    etag: Optional[str] = None
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires
+
+
+class TTLCache:
+    """
+    LRU cache bounded by entry count and approximate size in bytes, whose entries go stale after a TTL.
+    Stale entries that carry an ETag are kept so they can be revalidated instead of refetched.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not entry.fresh and entry.etag is None:
+            self.pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, value: Any, size: int, etag: Optional[str] = None) -> CacheEntry:
+        self.pop(key)
+        entry = CacheEntry(value, size, time.monotonic() + self.ttl, etag)
+        if size > self.max_bytes:
+            return entry
+        self._entries[key] = entry
+        self.total_bytes += size
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+        return entry
+
+    def touch(self, key: str) -> None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.expires = time.monotonic() + self.ttl
+
+    def pop(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+        return entry
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.total_bytes = 0
+
+
+# Per-client state, keyed by the client's MCP session so it is dropped when the client disconnects.
+client_states: "weakref.WeakKeyDictionary[Any, ClientState]" = weakref.WeakKeyDictionary()
+# State of calls made outside of an MCP request, such as direct calls from scripts and benchmarks.
+default_client_state = ClientState()
+# Stateless HTTP has a new MCP session per request, so those clients are keyed by their token header instead.
+stateless_client_states: "OrderedDict[str, ClientState]" = OrderedDict()
+server_instance: Optional["http.server.ThreadingHTTPServer"] = None
+signing_sessions: Dict[str, SigningSession] = {}
+_signing_lock = threading.Lock()
+results_cache = TTLCache(RESULTS_CACHE_TTL, RESULTS_CACHE_MAX_ENTRIES, RESULTS_CACHE_MAX_BYTES)
+report_cache = TTLCache(RESULTS_CACHE_TTL, RESULTS_CACHE_MAX_ENTRIES, RESULTS_CACHE_MAX_BYTES)
+http_client: Optional[httpx.AsyncClient] = None
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+concurrency_limiters: Dict[str, AdaptiveLimiter] = {}
+mint_journal: Optional[MintJournal] = None
+mint_queue: Optional[MintJobQueue] = None
+cravat_watcher: Optional[OpenCravatWatcher] = None
+state_store: Optional[StateStore] = None
+profile_store: Optional["ProfileStore"] = None
+_inflight_mints: Dict[str, asyncio.Task] = {}
+_journal_lock = threading.Lock()
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+# Tasks closing clients of event loops that are gone, kept until they finish.
+_closing_http_clients: set[asyncio.Task] = set()
+
+
+def client_state(ctx: Optional[Context]) -> ClientState:
+    """
+    Returns the state of the MCP client that made the current call.
+    Its signature may be stale in a multi-worker server; tools use load_client_state.
+    """
+    try:
+        session = ctx.session if ctx is not None else None
+    except ValueError:
+        # The context is not bound to a request.
+        session = None
+    if session is None:
+        return default_client_state
+    if MCP_STATELESS:
+        token = _client_token(ctx)
+        if token:
+            key = _digest(token)
+            state = stateless_client_states.get(key)
+            if state is None:
+                state = stateless_client_states[key] = ClientState(key=key)
+                if len(stateless_client_states) > STATELESS_CLIENTS_MAX:
+                    stateless_client_states.popitem(last=False)
+            stateless_client_states.move_to_end(key)
+            return state
+    state = client_states.get(session)
+    if state is None:
+        state = client_states[session] = ClientState()
+    return state
+
+
+def _client_token(ctx: Context) -> Optional[str]:
+    """
+    The token a stateless HTTP client identifies itself with: the CLIENT_TOKEN_HEADER, or an Mcp-Session-Id.
+    """
+    try:
+        headers = getattr(ctx.request_context.request, "headers", None)
+    except (AttributeError, ValueError):
+        return None
+    if headers is None:
+        return None
+    return headers.get(CLIENT_TOKEN_HEADER) or headers.get("Mcp-Session-Id")
+
+
+def _client_signature_key(state: ClientState) -> str:
+    return f"client:{state.key}"
+
+
+async def load_client_state(ctx: Optional[Context]) -> ClientState:
+    """
+    client_state, with a stateless client's signature refreshed from the shared store, where it may have been
+    set or used up by another worker.
+    """
+    state = client_state(ctx)
+    store = shared_state_store()
+    if state.key is not None and store is not None:
+        state.signature = await store.aget(_client_signature_key(state))
+    return state
+
+
+def _share_client_signature(state: ClientState) -> None:
+    """
+    Stores a stateless client's signature for the other workers. Blocks; run from a thread.
+    """
+    store = shared_state_store()
+    if state.key is not None and store is not None and state.signature:
+        store.set(_client_signature_key(state), state.signature, ttl=SIGNING_SESSION_TTL)
+
+
+async def set_client_signature(state: ClientState, signature: Optional[str]) -> None:
+    state.signature = signature
+    store = shared_state_store()
+    if state.key is not None and store is not None:
+        if signature:
+            await store.aset(_client_signature_key(state), signature, ttl=SIGNING_SESSION_TTL)
+        else:
+            await store.adelete(_client_signature_key(state))
+
+
+async def forget_signature(state: ClientState, signature: str) -> None:
+    """
+    Drops the client's signature once a mint has used it, so the next mint asks for a new one.
+    """
+    if state.signature == signature:
+        await set_client_signature(state, None)
+
+
+def get_state_store() -> StateStore:
+    global state_store
+    if state_store is None:
+        state_store = open_state_store(STATE_STORE_URL, os.path.join(STATE_DIR, "state.sqlite3"))
+    return state_store
+
+
+def shared_state_store() -> Optional[StateStore]:
+    """
+    Returns the state store if other worker processes share it, otherwise None.
+    """
+    store = get_state_store()
+    return store if store.shared else None
+
+
+def close_state_store() -> None:
+    global state_store
+    if state_store is not None:
+        state_store.close()
+    state_store = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the shared keep-alive client, creating it on first use.
+    A new client is created if the previous one was closed or belongs to another event loop.
+    """
+    global http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if http_client is None or http_client.is_closed or _http_client_loop is not loop:
+        if http_client is not None and not http_client.is_closed:
+            _discard_http_client(http_client, _http_client_loop)
+        http_client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            http2=HTTP2_ENABLED and _http2_available(),
+        )
+        _http_client_loop = loop
+    return http_client
+
+
+async def _aclose_quietly(client: httpx.AsyncClient) -> None:
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, timeout=10.0)
-            response.raise_for_status()
-            data: dict[str, Any] = response.json()
+        await client.aclose()
+    except Exception:
+        # Its connections may belong to a loop that is gone; they are dropped with it.
+        pass
+
+
+def _discard_http_client(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+    """
+    Closes a client left behind by another event loop: on that loop if it still runs, else on this one.
+    """
+    if loop is not None and loop.is_running() and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(_aclose_quietly(client), loop)
+        return
+    task = asyncio.get_running_loop().create_task(_aclose_quietly(client))
+    _closing_http_clients.add(task)
+    task.add_done_callback(_closing_http_clients.discard)
+
+
+async def close_http_client() -> None:
+    """
+    Closes the shared client and releases its pooled connections.
+    """
+    global http_client, _http_client_loop
+    if http_client is not None:
+        await http_client.aclose()
+    http_client = None
+    _http_client_loop = None
+
+
+def get_concurrency_limiter(endpoint: str) -> AdaptiveLimiter:
+    limiter = concurrency_limiters.get(endpoint)
+    if limiter is None:
+        limiter = concurrency_limiters[endpoint] = AdaptiveLimiter(
+            endpoint,
+            initial=CONCURRENCY_INITIAL,
+            min_limit=CONCURRENCY_MIN,
+            max_limit=CONCURRENCY_MAX,
+            latency_tolerance=CONCURRENCY_LATENCY_TOLERANCE,
+        )
+        metrics.gauge("genobank_concurrency_limit", lambda: int(limiter.limit), endpoint=endpoint)
+        metrics.gauge("genobank_concurrency_in_flight", lambda: limiter.in_flight, endpoint=endpoint)
+        metrics.gauge("genobank_concurrency_queued", lambda: limiter.queued, endpoint=endpoint)
+    return limiter
+
+
+async def genobank_request(
+    method: str,
+    endpoint: str,
+    *,
+    idempotent: bool,
+    on_retry=None,
+    base_url: str = "",
+    **kwargs: Any,
+) -> httpx.Response:
+    """
+    Sends a request to a GenoBank API endpoint with retries, the endpoint's circuit breaker and its
+    adaptive concurrency limit. base_url defaults to GENBANK_API_BASE; OpenCRAVAT calls pass OPENCRAVAT_API_BASE.
+    Non-idempotent calls should pass an Idempotency-Key header that stays the same across retries.
+    """
+    breaker = circuit_breakers.get(endpoint)
+    if breaker is None:
+        breaker = circuit_breakers[endpoint] = CircuitBreaker(endpoint, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT)
+        metrics.gauge("genobank_circuit_breaker_open", lambda: int(breaker.state != "closed"), endpoint=endpoint)
+    limiter = get_concurrency_limiter(endpoint)
+
+    def record_retry(attempt: int, delay: float) -> None:
+        metrics.inc("genobank_http_retries_total", endpoint=endpoint)
+        if on_retry is not None:
+            on_retry(attempt, delay)
+
+    started = time.perf_counter()
+    try:
+        with metrics.phase("http_request"):
+            response = await send_with_retries(
+                get_http_client(),
+                method,
+                f"{base_url or GENBANK_API_BASE}{endpoint}",
+                breaker=breaker,
+                policy=RETRY_POLICY,
+                idempotent=idempotent,
+                limiter=limiter,
+                on_retry=record_retry,
+                **kwargs,
+            )
     except Exception as e:
-        return f"Error during Minting IP Job: {e}"
-    
-    return f"Success: {data}"
+        metrics.inc("genobank_http_requests_total", endpoint=endpoint, outcome=type(e).__name__)
+        raise
+    metrics.observe("genobank_http_request_duration_seconds", time.perf_counter() - started, endpoint=endpoint)
+    metrics.inc("genobank_http_requests_total", endpoint=endpoint, outcome=f"{response.status_code // 100}xx")
+    return response
 
 
-@mcp.tool()
-async def start_signature_server() -> str:
+def _idempotency_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_mint_journal() -> Optional[MintJournal]:
     """
-    Starts a local web server that allows the user to sign with MetaMask.
-    Additionally, once started, the server automatically opens in the browser.
-    
-    return Please, visit http://localhost:8000
+    Returns the mint journal, opening it on first use. Its calls block on SQLite, so async code runs them in a thread.
     """
-    global user_signature, server_instance
-    user_signature = None
-    PORT = 8000
-    
-    html_content = """
+    global mint_journal
+    with _journal_lock:
+        if mint_journal is None and JOURNAL_PATH:
+            mint_journal = MintJournal(JOURNAL_PATH)
+    return mint_journal
+
+
+def close_mint_journal() -> None:
+    global mint_journal
+    if mint_journal is not None:
+        mint_journal.close()
+    mint_journal = None
+
+
+async def mint_once(
+    kind: str, key: str, params: dict[str, Any], call, receipt_ttl: Optional[float] = None
+) -> tuple[Any, bool]:
+    """
+    Runs a mint at most once per idempotency key.
+    Identical concurrent requests share one in-flight call, and a mint that already succeeded
+    returns its receipt from the journal, even after a restart, for up to receipt_ttl seconds (None: always).
+    The call runs in its own task that every caller awaits through a shield, so a cancelled caller
+    cancels neither the mint nor the other callers waiting on it.
+    Returns the result and whether it was replayed rather than minted by this call.
+    """
+    inflight = _inflight_mints.get(key)
+    if inflight is not None:
+        metrics.inc("genobank_mint_dedup_total", kind=kind, source="inflight")
+        result, _ = await asyncio.shield(inflight)
+        return result, True
+
+    task = _inflight_mints[key] = asyncio.create_task(_run_mint(kind, key, params, call, receipt_ttl))
+    # Retrieves the outcome in case every caller was cancelled before it finished.
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return await asyncio.shield(task)
+
+
+async def _run_mint(kind: str, key: str, params: dict[str, Any], call, receipt_ttl: Optional[float]) -> tuple[Any, bool]:
+    # The journal is consulted by the task that owns the key, so a caller arriving while the receipt is
+    # being recorded joins this task instead of minting again. SQLite calls run in a thread: another process
+    # holding the write lock must not stall the event loop.
+    try:
+        journal = await asyncio.to_thread(get_mint_journal)
+        if journal is not None:
+            receipt = await asyncio.to_thread(journal.receipt, key, receipt_ttl)
+            if receipt is not None:
+                metrics.inc("genobank_mint_dedup_total", kind=kind, source="journal")
+                return receipt, True
+            await asyncio.to_thread(journal.record_pending, key, kind, params)
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            # The request may already have reached the server: the mint stays pending instead of failed.
+            raise
+        except Exception as e:
+            if journal is not None:
+                await asyncio.to_thread(journal.record_failure, key, _compact_error(e))
+            raise
+        if journal is not None:
+            await asyncio.to_thread(journal.record_success, key, result)
+        return result, False
+    finally:
+        _inflight_mints.pop(key, None)
+
+
+_active_lifespans = 0
+_resume_task: Optional[asyncio.Task] = None
+loop_monitor: Optional[LoopLagMonitor] = LoopLagMonitor(LOOP_LAG_THRESHOLD) if LOOP_LAG_THRESHOLD > 0 else None
+
+
+@asynccontextmanager
+async def app_lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """
+    Opens the shared HTTP client when the server starts, and closes it, the background mint queue, the OpenCRAVAT
+    watcher and the signature server on shutdown. The queue and watcher otherwise start on first use; at startup
+    they are only opened, after the server is up, if a previous run left jobs to resume.
+    Over HTTP transports the lifespan runs once per client session; the shared resources stay open
+    until the last session ends, so every client reuses the same warm connection pool.
+    """
+    global _active_lifespans, _resume_task
+    _active_lifespans += 1
+    if loop_monitor is not None:
+        loop_monitor.start()
+    get_http_client()
+    if _resume_task is None:
+        _resume_task = asyncio.create_task(_resume_background_work())
+    try:
+        yield
+    finally:
+        _active_lifespans -= 1
+        if _active_lifespans == 0:
+            _resume_task.cancel()
+            _resume_task = None
+            await close_cravat_watcher()
+            await close_mint_queue()
+            await asyncio.to_thread(shutdown_signature_server)
+            await close_http_client()
+            close_mint_journal()
+            close_state_store()
+            close_profile_store()
+            close_vcf_pool()
+            if loop_monitor is not None:
+                loop_monitor.stop()
+
+
+def _pending_background_work(path: str) -> tuple[bool, bool]:
+    """
+    Whether the jobs database holds (mint jobs to resume, OpenCRAVAT jobs being watched), read without creating it.
+    """
+    import sqlite3
+
+    if not path or not os.path.exists(path):
+        return False, False
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        pending = []
+        for query in ("SELECT 1 FROM mint_jobs WHERE status IN ('queued', 'running') LIMIT 1",
+                      "SELECT 1 FROM cravat_watch WHERE status = 'watching' LIMIT 1"):
+            try:
+                pending.append(connection.execute(query).fetchone() is not None)
+            except sqlite3.OperationalError:
+                # The table was never created.
+                pending.append(False)
+        return pending[0], pending[1]
+    finally:
+        connection.close()
+
+
+async def _resume_background_work() -> None:
+    jobs, watched = await asyncio.to_thread(_pending_background_work, JOBS_PATH)
+    if jobs:
+        await get_mint_queue()
+    if watched:
+        await get_cravat_watcher()
+
+
+mcp = FastMCP("genobank_api_functions", lifespan=app_lifespan)
+
+SIGNING_PAGE_HTML = """
         <!DOCTYPE html>
         <html>
         <head>
             <title>MetaMask Signature</title>
-            <script src="https://cdn.jsdelivr.net/npm/web3@1.6.0/dist/web3.min.js"></script>
             <style>
                 /* Reset and base styles */
                 body, h1, p, button {
@@ -131,6 +713,17 @@ async def start_signature_server() -> str:
                     cursor: not-allowed;
                 }
                 /* Status message styling */
+                .details {
+                    text-align: left;
+                    background: #f4f6f8;
+                    padding: 10px;
+                    border-radius: 4px;
+                    font-size: 12px;
+                    max-height: 200px;
+                    overflow-y: auto;
+                    white-space: pre-wrap;
+                    word-break: break-all;
+                }
                 #status {
                     margin-top: 20px;
                     padding: 15px;
@@ -152,19 +745,26 @@ async def start_signature_server() -> str:
         <body>
             <div class="container">
                 <h1>Metamask signing process</h1>
-                <img src="https://cdn.iconscout.com/icon/free/png-512/free-metamask-logo-icon-download-in-svg-png-gif-file-formats--browser-extension-chrome-logos-icons-2261817.png?f=webp&w=256" width=50>
+                <img src="/static/metamask.svg" width=50 height=46 alt="MetaMask">
                 <p>To continue you must connect your wallet and sign your authorization.</p>
+                <!--SESSION_DETAILS-->
                 <button id="connectAndSignButton">Connect & Sign with MetaMask</button>
                 <div id="status"></div>
             </div>
             <script>
                 const message = "I want to proceed";
+                const sessionId = window.location.pathname.split('/').pop();
                 const statusDiv = document.getElementById('status');
                 
                 // Check if MetaMask is installed
                 window.addEventListener('load', function() {
                     if (!window.ethereum) {
-                        statusDiv.textContent = "MetaMask is not installed. Please install it to continue.";
+                        statusDiv.textContent = "MetaMask is not installed. Please install it to continue, or ";
+                        // On a phone, the MetaMask app opens this page in its own browser, which has a wallet.
+                        const appLink = document.createElement('a');
+                        appLink.href = "https://metamask.app.link/dapp/" + window.location.host + window.location.pathname;
+                        appLink.textContent = "open this page in the MetaMask app";
+                        statusDiv.appendChild(appLink);
                         statusDiv.className = "error";
                     }
                 });
@@ -187,12 +787,20 @@ async def start_signature_server() -> str:
                             // Step 3: Send signature to server
                             statusDiv.textContent = "Sending signature to server...";
                             
-                            fetch('/submit-signature', {
+                            fetch('/submit-signature/' + sessionId, {
                                 method: 'POST',
                                 headers: { 'Content-Type': 'application/json' },
-                                body: JSON.stringify({ signature })
+                                body: JSON.stringify({ signature, address: accounts[0] })
+                            })
+                            .then(response => {
+                                if (response.status === 400) {
+                                    throw new Error("The signature could not be verified. Please sign again.");
+                                }
+                                if (!response.ok) {
+                                    throw new Error("This signing session has expired. Please start a new one.");
+                                }
+                                return response.text();
                             })
-                            .then(response => response.text())
                             .then(data => {
                                 statusDiv.textContent = "Signature received! This window will close automatically.";
                                 statusDiv.className = "success";
@@ -201,6 +809,10 @@ async def start_signature_server() -> str:
                                 setTimeout(() => {
                                     window.close();
                                 }, 2000);
+                            })
+                            .catch(error => {
+                                statusDiv.textContent = `Error: ${error.message}`;
+                                statusDiv.className = "error";
                             });
                         } catch (error) {
                             statusDiv.textContent = `Error: ${error.message}`;
@@ -211,181 +823,1043 @@ async def start_signature_server() -> str:
             </script>
         </body>
         </html>
+"""
+HTML_CONTENT_TYPE = "text/html; charset=utf-8"
+
+def _compact_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+def _summarize_response(data: Any, max_fields: int = 12, max_value_chars: int = 120) -> dict[str, Any]:
+    """
+    Keeps the scalar fields of an API response, up to two levels deep, with long values shortened.
+    """
+    if not isinstance(data, dict):
+        return {"result": str(data)[:max_value_chars]}
+    summary: dict[str, Any] = {}
+    items = list(data.items())
+    while items and len(summary) < max_fields:
+        key, value = items.pop(0)
+        if isinstance(value, dict) and "." not in key:
+            items.extend((f"{key}.{k}", v) for k, v in value.items())
+        elif isinstance(value, str):
+            summary[key] = value if len(value) <= max_value_chars else value[:max_value_chars] + "..."
+        elif isinstance(value, (int, float, bool)) or value is None:
+            summary[key] = value
+    return summary
+
+
+def _tool_result(text: str, structured: dict[str, Any], max_chars: int = OUTPUT_MAX_CHARS) -> CallToolResult:
+    """
+    Wraps tool output as MCP text content cut to the size budget, plus structured content.
+    """
+    if 0 < max_chars < len(text):
+        note = f"... [truncated {len(text) - max_chars} characters; raise max_chars or use output_format='summary']"
+        text = text[:max(0, max_chars - len(note))] + note
+    return CallToolResult(content=[TextContent(type="text", text=text)], structuredContent=structured)
+
+
+def _error_result(text: str) -> CallToolResult:
+    """
+    Reports a failure of a tool that returns CallToolResult, flagged so clients see it as an error.
+    """
+    return CallToolResult(content=[TextContent(type="text", text=text)], isError=True)
+
+
+def _queued_result(ticket: str) -> CallToolResult:
+    return _tool_result(_queued_message(ticket), {"ticket": ticket})
+
+
+def _format_response(data: Any, output_format: str, max_chars: int, prefix: str = "Success") -> CallToolResult:
+    if output_format == "summary":
+        summary = _summarize_response(data)
+        return _tool_result(f"{prefix}: {_compact_json(summary)}", summary, max_chars)
+    text = _compact_json(data)
+    structured = data if isinstance(data, dict) else {"result": data}
+    if 0 < max_chars < len(text):
+        structured = _summarize_response(data)
+    return _tool_result(f"{prefix}: {text}", structured, max_chars)
+
+
+class IPJobRecord(BaseModel):
+    """
+    Fields of one OpenCRAVAT job to mint, as accepted by mint_ip_job.
+    """
+    receiver: str
+    job_id: str
+    biosample_serial: int
+    opencravat_version: str
+    num_unique_var: str
+    owner: str
+    submission_time: str
+    assembly: str
+    ip_asset: str = ""
+
+
+def _timeout_kwargs(timeout: Optional[float]) -> dict[str, Any]:
+    return {"timeout": timeout} if timeout else {}
+
+
+async def _mint_ip_job_request(
+    job: IPJobRecord, on_retry=None, timeout: Optional[float] = None
+) -> tuple[dict[str, Any], bool]:
+    params = job.model_dump()
+    key = _idempotency_key("mint_ipa_job", params)
+
+    async def call() -> dict[str, Any]:
+        response = await genobank_request(
+            "POST",
+            "/mint_ipa_job",
+            idempotent=False,
+            params=params,
+            headers={"Idempotency-Key": key},
+            on_retry=on_retry,
+            **_timeout_kwargs(timeout),
+        )
+        response.raise_for_status()
+        with metrics.phase("response_parsing"):
+            return response.json()
+
+    return await mint_once("mint_ipa_job", key, params, call)
+
+
+@mcp.tool()
+@instrument_tool
+async def mint_ip_job(
+    receiver: str,
+    job_id: str,
+    biosample_serial: int,
+    opencravat_version: str,
+    num_unique_var: str,
+    owner: str,
+    submission_time: str,
+    assembly: str,
+    ip_asset: str = "",
+    output_format: Literal["json", "summary"] = "json",
+    max_chars: int = OUTPUT_MAX_CHARS,
+    background: bool = False,
+) -> CallToolResult:
     """
+    Mints an IP asset for an OpenCRAVAT job.
+    output_format "json" returns the full response as compact JSON; "summary" keeps only its scalar fields.
+    Text output is cut to max_chars characters (0 disables the limit).
+    With background=True the mint is queued and a ticket is returned at once; follow it with get_mint_status.
+    """
+    job = IPJobRecord(
+        receiver=receiver,
+        job_id=job_id,
+        biosample_serial=biosample_serial,
+        opencravat_version=opencravat_version,
+        num_unique_var=num_unique_var,
+        owner=owner,
+        submission_time=submission_time,
+        assembly=assembly,
+        ip_asset=ip_asset,
+    )
+    if background:
+        return _queued_result(await (await get_mint_queue()).submit("mint_ip_job", job.model_dump()))
+    try:
+        data, replayed = await _mint_ip_job_request(job)
+    except Exception as e:
+        return _error_result(f"Error during Minting IP Job: {e}")
     
-    class SigningHandler(http.server.SimpleHTTPRequestHandler):
+    prefix = "Success (already minted, recorded receipt)" if replayed else "Success"
+    return _format_response(data, output_format, max_chars, prefix=prefix)
+
+
+def _compact_error(e: Exception) -> str:
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"HTTP {e.response.status_code} {e.response.reason_phrase}"
+    return str(e) or type(e).__name__
+
+
+async def _mint_ip_job_with_retries(job: IPJobRecord, semaphore: asyncio.Semaphore) -> dict[str, Any]:
+    """
+    Mints one batch item and counts how many times genobank_request retried it.
+    A success keeps only the response's key scalar fields; mint_ip_job returns the full response.
+    """
+    retries = 0
+
+    def count_retry(attempt: int, delay: float) -> None:
+        nonlocal retries
+        retries = attempt
+
+    async with semaphore:
+        try:
+            data, replayed = await _mint_ip_job_request(job, on_retry=count_retry)
+            result = {"job_id": job.job_id, "status": "success", "retries": retries,
+                      "data": _summarize_response(data, max_fields=6)}
+            if replayed:
+                result["replayed"] = True
+            return result
+        except Exception as e:
+            return {"job_id": job.job_id, "status": "error", "retries": retries, "error": _compact_error(e)}
+
+
+@mcp.tool()
+@instrument_tool
+async def mint_ip_jobs_batch(
+    jobs: list[IPJobRecord],
+    concurrency: int = BATCH_CONCURRENCY,
+    background: bool = False,
+    max_chars: int = OUTPUT_MAX_CHARS,
+) -> str:
+    """
+    Mints many OpenCRAVAT IP jobs in one call, with at most `concurrency` mints in flight.
+    Each job takes the same fields as mint_ip_job. A failed job does not stop the rest of the batch.
+    With background=True every job is queued instead, and one ticket per job is returned in input order.
+    Each result holds the job's status and the key fields of its response. If the output would exceed
+    max_chars characters, results are left out, successes before failures, and counted in "omitted"
+    (0 disables the limit).
+
+    return: JSON with the number of minted and failed jobs and one result per job, in input order
+    """
+    if background:
+        queue = await get_mint_queue()
+        return json.dumps({"tickets": [await queue.submit("mint_ip_job", job.model_dump()) for job in jobs]})
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, BATCH_MAX_CONCURRENCY)))
+    results = await asyncio.gather(*(_mint_ip_job_with_retries(job, semaphore) for job in jobs))
+    minted = sum(1 for r in results if r["status"] == "success")
+    return _fit_batch_results({"minted": minted, "failed": len(results) - minted}, results, max_chars)
+
+
+def _fit_batch_results(counts: dict[str, Any], results: list[dict[str, Any]], max_chars: int) -> str:
+    """
+    Serializes a batch's counts and results in input order, leaving out results that do not fit in max_chars,
+    successes first, and counting them in "omitted".
+    """
+    text = _compact_json({**counts, "results": results})
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    budget = max_chars - len(_compact_json({**counts, "results": [], "omitted": len(results)}))
+    kept = set()
+    for i in sorted(range(len(results)), key=lambda i: results[i]["status"] == "success"):
+        size = len(_compact_json(results[i])) + 1
+        if size > budget:
+            break
+        kept.add(i)
+        budget -= size
+    return _compact_json(
+        {**counts, "results": [r for i, r in enumerate(results) if i in kept], "omitted": len(results) - len(kept)}
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _signing_handler_class() -> type:
+    """
+    Defines the signing request handler on first use, so http.server is only imported when signing starts.
+    """
+    import http.server
+
+    from genobank_assets import IMMUTABLE_CACHE_CONTROL, load_assets, make_asset, send_asset
+
+    assets = load_assets()
+    page_html = SIGNING_PAGE_HTML
+    for name, asset in assets.items():
+        # Versioned URLs let browsers cache the assets for good; a changed file gets a new URL.
+        page_html = page_html.replace(f'"/static/{name}"', f'"/static/{name}?v={asset.version}"')
+    signing_page = make_asset(page_html.encode(), HTML_CONTENT_TYPE)
+
+    class SigningHandler(http.server.BaseHTTPRequestHandler):
+        """
+        Serves the signing page of each session and its static assets, and routes posted signatures to the flow
+        waiting for them. Connections are kept alive, and closed after being idle for `timeout` seconds.
+        """
+        protocol_version = "HTTP/1.1"
+        timeout = 30
+        # Headers and body are written separately; without this, delayed ACKs stall kept-alive responses by 40 ms.
+        disable_nagle_algorithm = True
+
         def do_GET(self):
+            if self.path.startswith('/static/'):
+                name, _, query = self.path[len('/static/'):].partition('?')
+                asset = assets.get(name)
+                if asset is None:
+                    self.send_error(404)
+                    return
+                versioned = query == f"v={asset.version}"
+                send_asset(self, asset, IMMUTABLE_CACHE_CONTROL if versioned else "no-cache")
+                return
+            nonce = self.path.rstrip('/').rsplit('/', 1)[-1]
+            session = get_signing_session(nonce)
+            # Sessions opened by another worker process are found in the shared store.
+            record = _shared_signing_record(nonce) if session is None else None
+            if not self.path.startswith('/sign/') or (session is None and record is None):
+                self.send_error(404, "Unknown or expired signing session")
+                return
+            description = session.description if session is not None else record.get("description", "")
+            page = signing_page
+            if description:
+                details = f'<pre class="details">{escape(description)}</pre>'
+                page = make_asset(page_html.replace("<!--SESSION_DETAILS-->", details).encode(), HTML_CONTENT_TYPE,
+                                  precompress=False)
+            send_asset(self, page, "no-cache")
+
+        def do_POST(self):
+            if not self.path.startswith('/submit-signature/'):
+                self.send_error(404)
+                return
+            nonce = self.path.rsplit('/', 1)[-1]
+            session = get_signing_session(nonce)
+            record = _shared_signing_record(nonce) if session is None else None
+            content_length = int(self.headers.get('Content-Length', 0))
+            post_data = self.rfile.read(content_length)
+            if session is None and record is None:
+                self.send_error(404, "Unknown or expired signing session")
+                return
+            try:
+                payload = json.loads(post_data.decode())
+                signature, account = payload.get('signature'), payload.get('address')
+            except (ValueError, AttributeError):
+                signature = account = None
+            if not signature:
+                self.send_error(400, "Missing signature")
+                return
+            # Checked here, so a malformed signature or one from another account is rejected while the user is
+            # still on the page, instead of failing on the first API call.
+            try:
+                address = signer_address(signature)
+            except InvalidSignature as e:
+                self.send_error(400, f"Invalid signature: {e}")
+                return
+            if account and not same_address(account, address):
+                self.send_error(400, "The signature was not made by the connected account")
+                return
+
+            if session is None:
+                # The flow waiting for it runs in another worker, which picks it up from the shared store.
+                _publish_signing_record(nonce, {**record, "signature": signature})
+            else:
+                session.signature = session.client.signature = signature
+                _publish_signing_session(session)
+                _share_client_signature(session.client)
+                try:
+                    session.loop.call_soon_threadsafe(_resolve_signature_waiter, session.future, signature)
+                except RuntimeError:
+                    # The event loop that opened the session is already closed.
+                    pass
+
+            body = b"Signature received"
             self.send_response(200)
-            self.send_header('Content-type', 'text/html')
+            self.send_header('Content-type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(html_content.encode())
-            
-        def do_POST(self):
-            global user_signature
-            if self.path == '/submit-signature':
-                content_length = int(self.headers['Content-Length'])
-                post_data = self.rfile.read(content_length)
-                post_json = json.loads(post_data.decode())
-                
-                user_signature = post_json.get('signature')
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'text/plain')
-                self.end_headers()
-                self.wfile.write(b"Signature received")
-    
-    def run_server():
-        global server_instance
-        with socketserver.TCPServer(("", PORT), SigningHandler) as httpd:
+            self.wfile.write(body)
+
+    return SigningHandler
+
+
+def _ensure_signature_server() -> int:
+    """
+    Starts the threaded signing server on first use and returns the port it is bound to.
+    """
+    global server_instance
+    with _signing_lock:
+        if server_instance is None:
+            import http.server
+
+            server_class = type("SigningServer", (http.server.ThreadingHTTPServer,), {
+                # Lets every worker process bind the same fixed signing port; whichever worker receives
+                # a signature hands it to the waiting flow through the shared state store.
+                "allow_reuse_port": MCP_WORKERS != 1 and SIGNATURE_SERVER_PORT != 0,
+            })
+            httpd = server_class((SIGNATURE_SERVER_BIND, SIGNATURE_SERVER_PORT), _signing_handler_class())
+            httpd.daemon_threads = True
+            server_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+            server_thread.start()
             server_instance = httpd
-            print(f"Server started at http://localhost:{PORT}")
-            try:
-                httpd.serve_forever()
-            except KeyboardInterrupt:
-                pass
-            finally:
-                httpd.server_close()
+            print(f"Signature server started at http://{SIGNATURE_SERVER_HOST}:{httpd.server_address[1]}", file=sys.stderr)
+        return server_instance.server_address[1]
+
+
+async def open_signing_session(client: ClientState, description: str = "") -> SigningSession:
+    """
+    Registers a new signing session of the given client, with its own nonce and URL on the shared server.
+    The optional description is shown on the signing page so the user sees what they authorize.
+    """
+    port = _ensure_signature_server()
+    nonce = secrets.token_urlsafe(16)
+    session = SigningSession(
+        nonce=nonce,
+        url=f"http://{SIGNATURE_SERVER_HOST}:{port}/sign/{nonce}",
+        loop=asyncio.get_running_loop(),
+        future=asyncio.get_running_loop().create_future(),
+        client=client,
+        description=description,
+    )
+    now = time.monotonic()
+    with _signing_lock:
+        for expired in [n for n, s in signing_sessions.items() if now - s.created > SIGNING_SESSION_TTL]:
+            signing_sessions.pop(expired).future.cancel()
+        signing_sessions[nonce] = session
+    store = shared_state_store()
+    if store is not None:
+        await store.aset(_signing_key(nonce), json.dumps(_signing_record(session)), ttl=SIGNING_SESSION_TTL)
+    return session
+
+
+def _signing_key(nonce: str) -> str:
+    return f"signing:{nonce}"
+
+
+def _publish_signing_record(nonce: str, record: dict[str, Any]) -> None:
+    store = shared_state_store()
+    if store is not None:
+        store.set(_signing_key(nonce), json.dumps(record), ttl=SIGNING_SESSION_TTL)
+
+
+def _signing_record(session: SigningSession) -> dict[str, Any]:
+    return {"description": session.description, "signature": session.signature}
+
+
+def _publish_signing_session(session: SigningSession) -> None:
+    """
+    Shares a signing session with the other worker processes, so any of them can serve its page and signature.
+    """
+    _publish_signing_record(session.nonce, _signing_record(session))
+
+
+def _shared_signing_record(nonce: str) -> Optional[dict[str, Any]]:
+    store = shared_state_store()
+    value = store.get(_signing_key(nonce)) if store is not None else None
+    return json.loads(value) if value else None
+
+
+async def _fetch_signing_record(nonce: str) -> Optional[dict[str, Any]]:
+    """
+    _shared_signing_record for code on the event loop.
+    """
+    store = shared_state_store()
+    value = await store.aget(_signing_key(nonce)) if store is not None else None
+    return json.loads(value) if value else None
+
+
+async def _pull_shared_signature(session: SigningSession) -> Optional[str]:
+    """
+    Returns the session's signature, taking it from the shared store if it was posted to another worker.
+    """
+    if session.signature is None:
+        record = await _fetch_signing_record(session.nonce)
+        if record and record.get("signature"):
+            session.signature = record["signature"]
+            await set_client_signature(session.client, session.signature)
+            _resolve_signature_waiter(session.future, session.signature)
+    return session.signature
+
+
+def get_signing_session(nonce: str, client: Optional[ClientState] = None) -> Optional[SigningSession]:
+    """
+    Looks up a signing session; when a client is given, only that client's sessions are found.
+    """
+    with _signing_lock:
+        session = signing_sessions.get(nonce)
+    if session is not None and client is not None and session.client is not client:
+        return None
+    return session
+
+
+async def find_signing_session(nonce: str, client: ClientState) -> Optional[SigningSession]:
+    """
+    Looks up one of the client's signing sessions with its latest signature.
+    A session opened by another worker process is returned as a detached copy from the shared store;
+    its unguessable session ID is what authorizes its use.
+    """
+    session = get_signing_session(nonce, client)
+    if session is not None:
+        await _pull_shared_signature(session)
+        return session
+    record = await _fetch_signing_record(nonce)
+    if record is None:
+        return None
+    loop = asyncio.get_running_loop()
+    return SigningSession(
+        nonce=nonce,
+        url="",
+        loop=loop,
+        future=loop.create_future(),
+        client=client,
+        description=record.get("description", ""),
+        signature=record.get("signature"),
+    )
+
+
+def close_signing_session(nonce: str) -> bool:
+    """
+    Forgets a signing session; late signatures for it are rejected.
+    Blocks on the shared store, so code on the event loop uses aclose_signing_session.
+    """
+    store = shared_state_store()
+    if store is not None:
+        store.delete(_signing_key(nonce))
+    return _forget_signing_session(nonce)
+
+
+async def aclose_signing_session(nonce: str) -> bool:
+    store = shared_state_store()
+    if store is not None:
+        await store.adelete(_signing_key(nonce))
+    return _forget_signing_session(nonce)
+
+
+def _forget_signing_session(nonce: str) -> bool:
+    with _signing_lock:
+        session = signing_sessions.pop(nonce, None)
+    if session is None:
+        return False
+    if not session.future.done():
+        # Sessions may be closed from a worker thread; the future belongs to the loop that opened it.
+        try:
+            session.loop.call_soon_threadsafe(session.future.cancel)
+        except RuntimeError:
+            # That loop is closed.
+            pass
+    return True
+
+
+async def _latest_signed_session(client: ClientState) -> Optional[SigningSession]:
+    with _signing_lock:
+        own = [s for s in signing_sessions.values() if s.client is client]
+    signed = [s for s in own if await _pull_shared_signature(s)]
+    return max(signed, key=lambda s: s.created) if signed else None
+
+
+@mcp.tool()
+@instrument_tool
+async def start_signature_server(ctx: Context = None) -> str:
+    """
+    Opens a new MetaMask signing session on the local signature server and opens its page in the browser.
+    Every session has its own URL and session ID, so several signing requests can be in flight at once.
     
-    server_thread = threading.Thread(target=run_server)
-    server_thread.daemon = True
-    server_thread.start()
-    webbrowser.open(f"http://localhost:{PORT}")
-    return f"Browser automatically opened at http://localhost:{PORT}"
+    return Please, visit the session URL
+    """
+    session = await open_signing_session(await load_client_state(ctx))
+    with metrics.phase("browser_launch"):
+        opened = await asyncio.to_thread(_open_browser, session.url)
+    if opened:
+        return f"Browser automatically opened at {session.url}\nSession ID: {session.nonce}"
+    return f"Open {session.url} to sign with MetaMask.\nSession ID: {session.nonce}"
+
+
+def _open_browser(url: str) -> bool:
+    """
+    Opens the URL in a browser on this machine, unless that is disabled. Returns whether it was opened.
+    Blocks while the browser starts, so async callers run it in a thread.
+    """
+    if OPEN_BROWSER == "0" or (OPEN_BROWSER == "" and MCP_TRANSPORT != "stdio"):
+        return False
+    import webbrowser
+
+    return webbrowser.open(url)
+
+
+def _latest_open_session(client: ClientState) -> Optional[SigningSession]:
+    with _signing_lock:
+        own = [s for s in signing_sessions.values() if s.client is client and s.signature is None]
+    return max(own, key=lambda s: s.created) if own else None
+
+
+def mobile_signing_link(url: str, link: str = "metamask") -> str:
+    """
+    The link a phone scans: the signing URL itself, or ("metamask") a deep link that opens it in MetaMask mobile.
+    """
+    return METAMASK_DAPP_LINK + url.split("://", 1)[-1] if link == "metamask" else url
+
+
+@functools.lru_cache(maxsize=QR_CACHE_SIZE)
+def qr_code_png(data: str) -> bytes:
+    """
+    QR code of data as PNG bytes, rendered in memory once per distinct data.
+    """
+    import io
+
+    import qrcode
+
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=8, border=4)
+    qr.add_data(data)
+    qr.make(fit=True)
+    buffer = io.BytesIO()
+    qr.make_image().save(buffer, format="PNG")
+    return buffer.getvalue()
 
 
 @mcp.tool()
-async def stop_signature_server() -> str:
+@instrument_tool
+async def get_signing_qr_code(
+    session_id: str = "",
+    link: Literal["metamask", "url"] = "metamask",
+    ctx: Context = None,
+) -> CallToolResult:
     """
-    Stops the signature server if it's running.
+    Lets the user sign from a phone: returns a QR code of a signing session as a PNG image to scan.
+    Without session_id it uses the client's latest unsigned session, such as the one a mint flow is waiting on,
+    so that flow goes on as soon as the phone signs; if there is none, a new session is opened.
+    link "metamask" opens the signing page in the MetaMask mobile app; "url" encodes the plain signing URL.
+    The phone must reach the signing server: set GENOBANK_SIGNATURE_HOST to this machine's LAN address
+    and GENOBANK_SIGNATURE_BIND to 0.0.0.0.
     """
-    global server_instance
-    if server_instance:
-        server_instance.shutdown()
-        server_instance.server_close()
-        server_instance = None
+    state = await load_client_state(ctx)
+    session = await find_signing_session(session_id, state) if session_id else _latest_open_session(state)
+    if session_id and session is None:
+        return _error_result(f"Error: no signing session {session_id} is open.")
+    if session is None:
+        session = await open_signing_session(state)
+    target = mobile_signing_link(session.url, link)
+    png = await asyncio.to_thread(qr_code_png, target)
+    text = f"Scan this QR code with your phone to sign with MetaMask: {target}\nSession ID: {session.nonce}"
+    loopback = ("localhost", "127.0.0.1", "::1")
+    if urlsplit(session.url).hostname in loopback or SIGNATURE_SERVER_BIND in loopback:
+        text += ("\nThe signing server only listens on this machine, so a phone cannot reach it. Set "
+                 "GENOBANK_SIGNATURE_HOST to this machine's LAN address and GENOBANK_SIGNATURE_BIND to 0.0.0.0.")
+    return CallToolResult(content=[
+        TextContent(type="text", text=text),
+        ImageContent(type="image", data=base64.b64encode(png).decode(), mimeType="image/png"),
+    ])
+
+
+def _resolve_signature_waiter(waiter: asyncio.Future, signature: str) -> None:
+    if not waiter.done():
+        waiter.set_result(signature)
+
+
+async def wait_for_signature(
+    session: SigningSession,
+    ctx: Optional[Context] = None,
+    timeout: float = SIGNATURE_TIMEOUT,
+) -> Optional[str]:
+    """
+    Waits until the session's signing page posts a signature, or the timeout expires.
+    Resumes as soon as the signature arrives and reports MCP progress while waiting.
+    """
+    waiter = session.future
+    loop = asyncio.get_running_loop()
+    shared = shared_state_store() is not None
+    poll_interval = STATE_POLL_INTERVAL if shared else SIGNATURE_PROGRESS_INTERVAL
+    started = last_progress = loop.time()
+    while not waiter.done():
+        elapsed = loop.time() - started
+        if elapsed >= timeout:
+            return None
+        await asyncio.wait({waiter}, timeout=min(poll_interval, timeout - elapsed))
+        if shared and not waiter.done():
+            await _pull_shared_signature(session)
+        now = loop.time()
+        if ctx is not None and not waiter.done() and now - last_progress >= SIGNATURE_PROGRESS_INTERVAL:
+            last_progress = now
+            await ctx.report_progress(min(now - started, timeout), timeout)
+    if waiter.cancelled():
+        return None
+    return waiter.result()
+
+
+async def request_signature(ctx: Optional[Context] = None, description: str = "", fresh: bool = False) -> Optional[str]:
+    """
+    Returns the calling client's current signature, or opens a signing session and waits for it to be signed.
+    With fresh=True the user is always asked to sign again, as mints require.
+    The session is closed once the wait is over.
+    """
+    state = await load_client_state(ctx)
+    if state.signature and not fresh:
+        return state.signature
+    session = await open_signing_session(state, description)
+    with metrics.phase("browser_launch"):
+        opened = await asyncio.to_thread(_open_browser, session.url)
+    if not opened and ctx is not None:
+        try:
+            await ctx.info(f"Open {session.url} to sign with MetaMask, or call get_signing_qr_code to sign from a phone.")
+        except ValueError:
+            # The context is not bound to a request.
+            pass
+    try:
+        with metrics.phase("signature_wait"):
+            return await wait_for_signature(session, ctx)
+    finally:
+        await aclose_signing_session(session.nonce)
+
+
+@mcp.tool()
+@instrument_tool
+async def stop_signature_server(session_id: str = "", ctx: Context = None) -> str:
+    """
+    Closes one signing session, or every signing session of this client if no session_id is given.
+    The signature server itself stops once no client has a session open on it.
+    """
+    state = await load_client_state(ctx)
+    if session_id:
+        if await find_signing_session(session_id, state) and await aclose_signing_session(session_id):
+            return f"Signing session {session_id} closed."
+        return f"No signing session {session_id} is currently open."
+    with _signing_lock:
+        own = [n for n, s in signing_sessions.items() if s.client is state]
+    for nonce in own:
+        await aclose_signing_session(nonce)
+    with _signing_lock:
+        if signing_sessions:
+            return f"Closed {len(own)} signing session(s). The signature server keeps running for other clients."
+    if await asyncio.to_thread(shutdown_signature_server):
         return "Signature server successfully stopped."
     else:
         return "No signature server is currently running."
 
 
+def shutdown_signature_server() -> bool:
+    """
+    Stops the signature server and cancels every pending session. Returns False if it was not running.
+    Blocks until the serving thread exits, so async callers run it in a thread.
+    """
+    global server_instance
+    with _signing_lock:
+        httpd, server_instance = server_instance, None
+        pending = list(signing_sessions)
+    for nonce in pending:
+        close_signing_session(nonce)
+    if httpd is None:
+        return False
+    httpd.shutdown()
+    httpd.server_close()
+    return True
+
+
+def signature_address(signature: str) -> Optional[str]:
+    """
+    The account that signed, from the per-signature cache filled when the signature was received.
+    """
+    try:
+        return signer_address(signature)
+    except InvalidSignature:
+        return None
+
+
 @mcp.tool()
-async def check_signature_status() -> str:
+@instrument_tool
+async def check_signature_status(session_id: str = "", ctx: Context = None) -> str:
     """
     Checks if the user has already signed with MetaMask.
+    Pass the session_id returned by start_signature_server to check a specific session.
     """
-    global user_signature
-    if user_signature:
-        return f"Signature received: {user_signature[:10]}...{user_signature[-10:]}"
+    state = await load_client_state(ctx)
+    if session_id:
+        session = await find_signing_session(session_id, state)
+        if session is None:
+            return f"No signing session {session_id} is currently open."
+        signature = session.signature
+    else:
+        signature = state.signature
+    if signature:
+        address = signature_address(signature)
+        return f"Signature received from {address or 'an unknown account'}: {signature[:10]}...{signature[-10:]}"
     else:
         return "No signature has been received yet. Please complete the signing process on the web page."
 
 
+async def _mint_license_token_call(
+    ip_asset: str, receiver: str, signature: str, timeout: Optional[float] = None, nonce: str = ""
+) -> tuple[dict[str, Any], bool]:
+    # A nonce (from force=True) makes the mint distinct from any earlier one with the same signature.
+    parts = ("mint_license_token", ip_asset, receiver, signature) + ((nonce,) if nonce else ())
+    key = _idempotency_key(*parts)
+
+    async def call() -> dict[str, Any]:
+        response = await genobank_request(
+            "POST",
+            "/mint_license_token",
+            idempotent=False,
+            params={"ip_asset": ip_asset, "receiver": receiver, "user_signature": signature},
+            headers={"Idempotency-Key": key},
+            **_timeout_kwargs(timeout),
+        )
+        response.raise_for_status()
+        with metrics.phase("response_parsing"):
+            return response.json()
+
+    # The signature itself is never written to the journal.
+    return await mint_once(
+        "mint_license_token", key, {"ip_asset": ip_asset, "receiver": receiver}, call, receipt_ttl=LICENSE_RECEIPT_TTL
+    )
+
+
+def _license_nonce(force: bool) -> str:
+    return secrets.token_hex(8) if force else ""
+
+
+async def _mint_license_token_request(ip_asset: str, receiver: str, signature: str, nonce: str = "") -> str:
+    try:
+        data, replayed = await _mint_license_token_call(ip_asset, receiver, signature, nonce=nonce)
+        if replayed:
+            return f"License Token already created (recorded receipt): {data}"
+        return f"License Token successfully created: {data}"
+    except Exception as e:
+        return f"Error minting License Token: {e}"
+
+
 @mcp.tool()
+@instrument_tool
 async def mint_license_token(
     ip_asset: str,
-    receiver: str,
+    receiver: str = "",
+    session_id: str = "",
+    background: bool = False,
+    force: bool = False,
+    ctx: Context = None,
 ) -> str:
     """
     Mints the license token using the signature provided by the user.
+    Pass the session_id returned by start_signature_server to use that session's signature.
+    Without a receiver, the token goes to the account that signed.
+    With background=True the mint is queued and a ticket is returned at once; follow it with get_mint_status.
+    A repeated mint of the same token with the same signature returns the recorded receipt for a while;
+    force=True mints another license instead.
     """
-    global user_signature
-    if not user_signature:
-        return "No signature has been received. Please use start_signature_server first and complete the signing process. Showing a link to redirect to 'http://localhost:8000/'"
-    url = (
-        f"{GENBANK_API_BASE}/mint_license_token?"
-        f"ip_asset={ip_asset}"
-        f"&receiver={receiver}"
-        f"&user_signature={user_signature}"
-    )
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, timeout=10.0)
-            response.raise_for_status()
-            data: dict[str, Any] = response.json()
-            user_signature = None
-            return f"License Token successfully created: {data}"
-    except Exception as e:
-        return f"Error minting License Token: {e}"
+    state = await load_client_state(ctx)
+    session = await find_signing_session(session_id, state) if session_id else await _latest_signed_session(state)
+    signature = session.signature if session else state.signature
+    if not signature:
+        return "No signature has been received. Please use start_signature_server first and complete the signing process, then open the signing URL it returns."
+    receiver = receiver or signature_address(signature)
+    if not receiver:
+        return "Error: the signature is invalid. Please sign again."
+    nonce = _license_nonce(force)
+    if background:
+        result = _queued_message(await _submit_license_token(ip_asset, receiver, signature, nonce))
+    else:
+        result = await _mint_license_token_request(ip_asset, receiver, signature, nonce)
+    if not result.startswith("Error"):
+        if session:
+            await aclose_signing_session(session.nonce)
+        await forget_signature(state, signature)
+    return result
 
 
 @mcp.tool()
+@instrument_tool
 async def mint_license_token_flow(
     ip_asset: str,
-    receiver: str,
+    receiver: str = "",
+    background: bool = False,
+    force: bool = False,
+    ctx: Context = None,
 ) -> str:
     """
     Complete flow to mint a license token, including obtaining the signature.
+    Without a receiver, the token goes to the account that signed.
+    With background=True the mint is queued once the user has signed, and a ticket is returned.
+    force=True mints a new license even if the same one was just minted with the same signature.
     """
-    server_result = await start_signature_server()
-    progress_message = f"Starting signature process...\n{server_result}\n\nWaiting for signature completion..."
-    global user_signature
-    max_attempts = 60 
-    attempt = 0
-    
-    while not user_signature and attempt < max_attempts:
-        await asyncio.sleep(2) 
-        attempt += 1
-    
-    if not user_signature:
-        await stop_signature_server()
+    progress_message = "Starting signature process...\n\nWaiting for signature completion..."
+    signature = await request_signature(ctx, fresh=True)
+    if not signature:
         return "Timeout reached. No signature was received. Please try again."
     
     progress_message += "\n\nSignature received! Processing license token minting..."
-    mint_result = await mint_license_token(ip_asset, receiver)
-    await stop_signature_server()
+    receiver = receiver or signature_address(signature)
+    if not receiver:
+        return f"{progress_message}\n\nError: the signature is invalid. Please sign again."
+    nonce = _license_nonce(force)
+    if background:
+        mint_result = _queued_message(await _submit_license_token(ip_asset, receiver, signature, nonce))
+    else:
+        mint_result = await _mint_license_token_request(ip_asset, receiver, signature, nonce)
+    state = await load_client_state(ctx)
+    if not mint_result.startswith("Error"):
+        await forget_signature(state, signature)
     return f"{progress_message}\n\n{mint_result}"
 
 
 
 
 
+class LicenseTokenRequest(BaseModel):
+    """
+    One license token to mint for an IP asset.
+    """
+    ip_asset: str
+    receiver: str
+
+
+def _describe_license_batch(tokens: list[LicenseTokenRequest], digest: str) -> str:
+    lines = [f"Authorize minting {len(tokens)} license tokens (batch {digest[:16]}):"]
+    lines += [f"{t.ip_asset} -> {t.receiver}" for t in tokens[:20]]
+    if len(tokens) > 20:
+        lines.append(f"... and {len(tokens) - 20} more")
+    return "\n".join(lines)
+
+
+@mcp.tool()
+@instrument_tool
+async def mint_license_tokens_batch(
+    tokens: list[LicenseTokenRequest],
+    concurrency: int = BATCH_CONCURRENCY,
+    background: bool = False,
+    force: bool = False,
+    ctx: Context = None,
+) -> str:
+    """
+    Mints license tokens for many (ip_asset, receiver) pairs with a single MetaMask signature.
+    The signing page lists the whole batch, then the mints run concurrently.
+    With background=True the mints are queued once the user has signed, and one ticket per token is returned.
+    force=True mints every token again even if the batch was just minted with the same signature.
+
+    return: JSON with the batch digest, the number of minted and failed tokens and one result per token, in input order
+    """
+    state = await load_client_state(ctx)
+    canonical = json.dumps([t.model_dump() for t in tokens], sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(canonical.encode()).hexdigest()
+    # Always a new session, so the page shows this batch and its digest rather than reusing an earlier signature.
+    signature = await request_signature(ctx, _describe_license_batch(tokens, digest), fresh=True)
+    if not signature:
+        return "Timeout reached. No signature was received. Please try again."
+    if background:
+        tickets = [await _submit_license_token(t.ip_asset, t.receiver, signature, _license_nonce(force)) for t in tokens]
+        await forget_signature(state, signature)
+        return json.dumps({"batch_digest": digest, "tickets": tickets})
+
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, BATCH_MAX_CONCURRENCY)))
+
+    async def mint(token: LicenseTokenRequest) -> dict[str, Any]:
+        async with semaphore:
+            try:
+                data, replayed = await _mint_license_token_call(
+                    token.ip_asset, token.receiver, signature, nonce=_license_nonce(force)
+                )
+                result = {"ip_asset": token.ip_asset, "receiver": token.receiver, "status": "success", "data": data}
+                if replayed:
+                    result["replayed"] = True
+                return result
+            except Exception as e:
+                return {"ip_asset": token.ip_asset, "receiver": token.receiver, "status": "error", "error": _compact_error(e)}
+
+    results = await asyncio.gather(*(mint(token) for token in tokens))
+    minted = sum(1 for r in results if r["status"] == "success")
+    if minted:
+        await forget_signature(state, signature)
+    return json.dumps(
+        {"batch_digest": digest, "minted": minted, "failed": len(results) - minted, "results": results},
+        default=str,
+    )
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+async def fetch_ancestry_results(signature: str) -> dict[str, Any]:
+    """
+    Returns the ancestry results for a signature, from the cache while fresh.
+    Stale entries are revalidated with If-None-Match when the server sent an ETag.
+    The cache is keyed by a hash of the signature, never the signature itself.
+    """
+    key = _digest(signature)
+    entry = results_cache.get(key)
+    if entry is None:
+        entry = await _shared_cached_results(key)
+    if entry is not None and entry.fresh:
+        return entry.value
+
+    headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else {}
+    response = await genobank_request(
+        "GET",
+        "/api_somos_dao/get_results",
+        idempotent=True,
+        params={"user_signature": signature},
+        headers=headers,
+    )
+    if response.status_code == 304 and entry is not None:
+        results_cache.touch(key)
+        await _share_cached_results(key, entry.value, entry.etag)
+        return entry.value
+    response.raise_for_status()
+    with metrics.phase("response_parsing"):
+        data: dict[str, Any] = response.json()
+    results_cache.set(key, data, len(response.content), response.headers.get("ETag"))
+    await _share_cached_results(key, data, response.headers.get("ETag"))
+    return data
+
+
+async def _shared_cached_results(key: str) -> Optional[CacheEntry]:
+    """
+    Loads results another worker process cached into the local cache.
+    """
+    store = shared_state_store()
+    value = await store.aget(f"results:{key}") if store is not None else None
+    if value is None:
+        return None
+    cached = json.loads(value)
+    return results_cache.set(key, cached["data"], len(value), cached.get("etag"))
+
+
+async def _share_cached_results(key: str, data: dict[str, Any], etag: Optional[str]) -> None:
+    store = shared_state_store()
+    if store is not None:
+        await store.aset(f"results:{key}", json.dumps({"data": data, "etag": etag}), ttl=RESULTS_CACHE_TTL)
+
+
+async def render_ancestry_page(data: dict[str, Any]) -> str:
+    """
+    Renders the ancestry report in a thread, reusing the cached page when the same data was rendered before.
+    """
+    key = _digest(json.dumps(data, sort_keys=True, default=str))
+    entry = report_cache.get(key)
+    if entry is not None:
+        return entry.value
+    with metrics.phase("html_rendering"):
+        html = await asyncio.to_thread(get_html_ancestry_page_chart, data)
+    report_cache.set(key, html, len(html))
+    return html
+
+
 @mcp.tool()
-async def get_ancestry_html_results() -> str:
+@instrument_tool
+async def get_ancestry_html_results(
+    output_format: Literal["html", "json", "summary"] = "html",
+    max_chars: int = OUTPUT_MAX_CHARS,
+    ctx: Context = None,
+) -> CallToolResult:
     """
     Gets the ancestry results for a user.
     If no signature exists, it requests one through the signature server.
+    output_format "html" returns the full report page, "json" the population percentages,
+    and "summary" a one-line text of the main populations.
+    If the report is larger than max_chars characters, a summary is returned instead (0 disables the limit).
     
-    return: Allways return the result in an HTML artifact preview
+    return: When output_format is "html", allways return the result in an HTML artifact preview
     """
-    global user_signature
-    
-    if not user_signature:
-        server_result = await start_signature_server()
-        progress_message = f"Starting signature process...\n{server_result}\n\nWaiting for signature completion..."
-        max_attempts = 60
-        attempt = 0
-        while not user_signature and attempt < max_attempts:
-            await asyncio.sleep(2)
-            attempt += 1
-        if not user_signature:
-            await stop_signature_server()
-            return "Timeout reached. No signature was received. Please try again."
-        await stop_signature_server()
-        progress_message += "\n\nSignature received! Processing ancestry request..."
-    else:
-        progress_message = "Using existing signature for ancestry request..."
-    
-    url = f"{GENBANK_API_BASE}/api_somos_dao/get_results?user_signature={user_signature}"
+    signature = await request_signature(ctx)
+    if not signature:
+        return _error_result("Timeout reached. No signature was received. Please try again.")
     
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, timeout=10.0)
-            response.raise_for_status()
-            data: dict[str, Any] = response.json()
-            html = get_html_ancestry_page_chart(data)    
-            return f"open in an html preview artifact {html}"
+        data = await fetch_ancestry_results(signature)
+        summary = summarize_ancestry(data)
+        if output_format == "json":
+            return _tool_result(_compact_json(summary), summary, max_chars)
+        if output_format == "html":
+            html = await render_ancestry_page(data)
+            if max_chars <= 0 or len(html) + 40 <= max_chars:
+                return _tool_result(f"open in an html preview artifact {html}", summary, max_chars)
+            note = f"The HTML report ({len(html)} characters) exceeds max_chars={max_chars}; showing a summary.\n"
+            return _tool_result(note + format_ancestry_summary(summary), summary, max_chars)
+        return _tool_result(format_ancestry_summary(summary), summary, max_chars)
     except Exception as e:
-        return f"Error retrieving ancestry results: {e}"
+        return _error_result(f"Error retrieving ancestry results: {e}")
 
-def get_html_ancestry_page_chart(data):
-    try:
-        ancestry_data = data.get("data", {}).get("ancestry", {})
-        filtered_data = {k: float(v) for k, v in ancestry_data.items() if float(v) > 0.0001}
-        colors = [f"hsl({(i * 137) % 360}, 70%, 65%)" for i in range(len(filtered_data))]
-        sorted_data = dict(sorted(filtered_data.items(), key=lambda x: float(x[1]), reverse=True))
-        labels = list(sorted_data.keys())
-        values = [float(v) * 100 for v in sorted_data.values()]  # Convert to percentages
-        html = f"""
+
+def summarize_ancestry(data: dict[str, Any]) -> dict[str, Any]:
+    """
+    Population percentages of an ancestry result, largest first, keyed by display name.
+    """
+    ancestry_data = data.get("data", {}).get("ancestry", {})
+    populations = [(k, f) for k, v in ancestry_data.items() if (f := float(v)) > 0.0001]
+    populations.sort(key=lambda x: x[1], reverse=True)
+    return {"ancestry": {format_ancestry_name(k): round(v * 100, 2) for k, v in populations}}
+
+
+def format_ancestry_summary(summary: dict[str, Any], top: int = 5) -> str:
+    ancestry = list(summary["ancestry"].items())
+    text = ", ".join(f"{name} {percentage:.2f}%" for name, percentage in ancestry[:top])
+    if len(ancestry) > top:
+        text += f" (+{len(ancestry) - top} more)"
+    return f"Ancestry: {text}" if text else "Ancestry: no populations above 0.01%"
+
+ANCESTRY_PAGE_TEMPLATE = """
         <!DOCTYPE html>
         <html lang="en">
         <head>
@@ -394,59 +1868,59 @@ def get_html_ancestry_page_chart(data):
             <title>Ancestry Results</title>
             <script src="https://cdnjs.cloudflare.com/ajax/libs/Chart.js/3.7.0/chart.min.js"></script>
             <style>
-                body {{
+                body {
                     font-family: Arial, sans-serif;
                     margin: 0;
                     padding: 20px;
                     background-color: #f5f5f5;
-                }}
-                .container {{
+                }
+                .container {
                     max-width: 800px;
                     margin: 0 auto;
                     background-color: white;
                     padding: 20px;
                     border-radius: 10px;
                     box-shadow: 0 0 10px rgba(0,0,0,0.1);
-                }}
-                h1 {{
+                }
+                h1 {
                     color: #333;
                     text-align: center;
-                }}
-                .chart-container {{
+                }
+                .chart-container {
                     position: relative;
                     height: 400px;
                     width: 100%;
                     margin: 20px auto;
-                }}
-                .data-table {{
+                }
+                .data-table {
                     width: 100%;
                     border-collapse: collapse;
                     margin-top: 20px;
-                }}
-                .data-table th, .data-table td {{
+                }
+                .data-table th, .data-table td {
                     padding: 8px;
                     text-align: left;
                     border-bottom: 1px solid #ddd;
-                }}
-                .data-table th {{
+                }
+                .data-table th {
                     background-color: #f2f2f2;
-                }}
-                .data-table tr:hover {{
+                }
+                .data-table tr:hover {
                     background-color: #f5f5f5;
-                }}
-                .chart-title {{
+                }
+                .chart-title {
                     text-align: center;
                     font-weight: bold;
                     margin-bottom: 10px;
-                }}
-                .center-text {{
+                }
+                .center-text {
                     position: absolute;
                     top: 50%;
                     left: 50%;
                     transform: translate(-50%, -50%);
                     font-size: 24px;
                     font-weight: bold;
-                }}
+                }
             </style>
         </head>
         <body>
@@ -466,39 +1940,20 @@ def get_html_ancestry_page_chart(data):
                         </tr>
                     </thead>
                     <tbody>
-        """
-        
-        # Add table rows
-        for label, value in sorted_data.items():
-            percentage = float(value) * 100
-            html += f"""
-                        <tr>
-                            <td>{format_ancestry_name(label)}</td>
-                            <td>{percentage:.2f}%</td>
-                        </tr>
-            """
-        
-        html += """
+{{rows}}
                     </tbody>
                 </table>
             </div>
             
             <script>
-                const formatLabels = (labels) => {
-                    return labels.map(label => {
-                        return label.split('_').map(word => 
-                            word.charAt(0).toUpperCase() + word.slice(1).toLowerCase()
-                        ).join(' ');
-                    });
-                };
                 const ctx = document.getElementById('ancestryChart').getContext('2d');
                 const ancestryChart = new Chart(ctx, {
                     type: 'doughnut',
                     data: {
-                        labels: formatLabels(""" + str(labels) + """),
+                        labels: {{labels}},
                         datasets: [{
-                            data: """ + str(values) + """,
-                            backgroundColor: """ + str(colors) + """,
+                            data: {{values}},
+                            backgroundColor: {{colors}},
                             borderColor: 'white',
                             borderWidth: 1,
                             hoverOffset: 15
@@ -536,7 +1991,7 @@ def get_html_ancestry_page_chart(data):
                     }
                 });
                 
-                const total = """ + str(values) + """.reduce((acc, val) => acc + val, 0).toFixed(2);
+                const total = {{total}};
                 
                 if (!Chart.registry.getPlugin('centerTextPlugin')) {
                     const centerTextPlugin = {
@@ -563,9 +2018,70 @@ def get_html_ancestry_page_chart(data):
             </script>
         </body>
         </html>
-        """
-        
-        return html
+"""
+
+ANCESTRY_ROW_TEMPLATE = """
+                        <tr>
+                            <td>{label}</td>
+                            <td>{percentage:.2f}%</td>
+                        </tr>
+            """
+
+
+def _compile_template(template: str) -> tuple[list[str], list[str]]:
+    """
+    Splits a template on its {{name}} placeholders once, so rendering is a single join.
+    """
+    parts = re.split(r"\{\{(\w+)\}\}", template)
+    return parts[0::2], parts[1::2]
+
+
+def _render_template(compiled: tuple[list[str], list[str]], values: dict[str, str]) -> str:
+    literals, names = compiled
+    chunks = [literals[0]]
+    for name, literal in zip(names, literals[1:]):
+        chunks.append(values[name])
+        chunks.append(literal)
+    return "".join(chunks)
+
+
+def _script_json(value: Any) -> str:
+    # Keep embedded JSON from closing the surrounding <script> element.
+    return json.dumps(value).replace("</", "<\\/")
+
+
+_ANCESTRY_PAGE = _compile_template(ANCESTRY_PAGE_TEMPLATE)
+
+
+@functools.lru_cache(maxsize=4096)
+def _ancestry_labels(name: str) -> tuple[str, str]:
+    """
+    Display label of a population, plain and HTML-escaped, computed once per population.
+    """
+    label = format_ancestry_name(name)
+    return label, escape(label)
+
+
+def get_html_ancestry_page_chart(data):
+    try:
+        ancestry_data = data.get("data", {}).get("ancestry", {})
+        filtered_data = [(k, f) for k, v in ancestry_data.items() if (f := float(v)) > 0.0001]
+        filtered_data.sort(key=lambda x: x[1], reverse=True)
+        display = [_ancestry_labels(k) for k, _ in filtered_data]
+        labels = [label for label, _ in display]
+        values = [v * 100 for _, v in filtered_data]  # Convert to percentages
+        colors = [f"hsl({(i * 137) % 360}, 70%, 65%)" for i in range(len(filtered_data))]
+        rows = "".join([
+            ANCESTRY_ROW_TEMPLATE.format(label=html_label, percentage=percentage)
+            for (_, html_label), percentage in zip(display, values)
+        ])
+        return _render_template(_ANCESTRY_PAGE, {
+            "rows": rows,
+            "labels": _script_json(labels),
+            "values": _script_json(values),
+            "colors": _script_json(colors),
+            "total": _script_json(f"{sum(values):.2f}"),
+        })
     except Exception as e:
         # In case of error, return a simple error page
         return f"""
@@ -582,36 +2098,38 @@ def get_html_ancestry_page_chart(data):
         </html>
         """
 
+ANCESTRY_NAME_REPLACEMENTS = {
+    "AFR": "African",
+    "EUR": "European",
+    "ASIA": "Asian",
+    "ESTE": "East",
+    "NORTE": "North",
+    "OESTE": "West",
+    "SUR": "South",
+    "SURESTE": "Southeast",
+    "NORESTE": "Northeast",
+    "SUROESTE": "Southwest",
+    "MEDIO_ORIENTE": "Middle East",
+    "JUDIO": "Jewish",
+    "AMAZONAS": "Amazonian",
+    "ANDES": "Andean",
+    "OCEANIA": "Oceanic",
+    "NAHUA_OTOMI": "Nahua-Otomi"
+}
+
+
 def format_ancestry_name(name):
     """
     Formats the ancestry name for better display.
     Example: "AFR_NORTE" becomes "African North"
     """
-    replacements = {
-        "AFR": "African",
-        "EUR": "European",
-        "ASIA": "Asian",
-        "ESTE": "East",
-        "NORTE": "North",
-        "OESTE": "West",
-        "SUR": "South",
-        "SURESTE": "Southeast",
-        "NORESTE": "Northeast",
-        "SUROESTE": "Southwest",
-        "MEDIO_ORIENTE": "Middle East",
-        "JUDIO": "Jewish",
-        "AMAZONAS": "Amazonian",
-        "ANDES": "Andean",
-        "OCEANIA": "Oceanic",
-        "NAHUA_OTOMI": "Nahua-Otomi"
-    }
     
     parts = name.split('_')
     formatted_parts = []
     
     for part in parts:
-        if part in replacements:
-            formatted_parts.append(replacements[part])
+        if part in ANCESTRY_NAME_REPLACEMENTS:
+            formatted_parts.append(ANCESTRY_NAME_REPLACEMENTS[part])
         else:
             # Capitalize the first letter of words not in the replacements dictionary
             formatted_parts.append(part.capitalize())
@@ -619,45 +2137,742 @@ def format_ancestry_name(name):
     return " ".join(formatted_parts)
 
 
+NUMPY_MISSING = 'Error: the cohort tools need NumPy. Install them with pip install -e ".[cohort]"'
+
+
+def resolve_data_paths(patterns: list[str]) -> list[str]:
+    """
+    Expands file names and glob patterns relative to DATA_DIR, refusing anything outside it.
+    """
+    import glob
+
+    paths = []
+    for pattern in patterns:
+        full = os.path.abspath(os.path.join(DATA_DIR, os.path.expanduser(pattern)))
+        matches = sorted(glob.glob(full, recursive=True)) if glob.has_magic(full) else [full]
+        for path in matches:
+            real = os.path.realpath(path)
+            if os.path.commonpath([real, os.path.realpath(DATA_DIR)]) != os.path.realpath(DATA_DIR):
+                raise ValueError(f"{pattern} is outside the data directory {DATA_DIR}")
+            if not os.path.isfile(real):
+                raise ValueError(f"No such file: {pattern}")
+            paths.append(real)
+    if not paths:
+        raise ValueError("No files matched")
+    return paths
+
+
+def format_cohort_summary(report: dict[str, Any], top: int = 5) -> str:
+    lines = [f"Cohort of {report['profiles']} profiles ({report['skipped']} skipped)."]
+    for entry in report["populations"][:top]:
+        lines.append(
+            f"{entry['population']}: mean {entry['mean']:.2f}% (p5 {entry['p5']:.2f}, median {entry['p50']:.2f}, "
+            f"p95 {entry['p95']:.2f}), present in {entry['present_pct']:.1f}%, dominant in {entry['dominant']}"
+        )
+    return "\n".join(lines)
+
+
+@mcp.tool()
+@instrument_tool
+async def aggregate_ancestry_cohort(
+    paths: list[str],
+    top: int = 0,
+    output_format: Literal["json", "summary"] = "json",
+    max_chars: int = OUTPUT_MAX_CHARS,
+) -> CallToolResult:
+    """
+    Aggregates the ancestry results of a whole cohort from local JSON or NDJSON files.
+    paths are file names or glob patterns (e.g. "cohort/*.ndjson") relative to the data directory.
+    Each file holds ancestry results as returned by the API, one JSON array of them, or one per line (NDJSON).
+    Files are streamed in chunks, so cohorts of any size are aggregated in bounded memory.
+    top limits the report to the populations with the largest mean (0 reports all).
+
+    return: per population, in percent: mean, std, p5/p25/p50/p75/p95, share of profiles where it is
+    present (>1%), number of profiles where it is dominant, and a 10-bin histogram of profile counts
+    """
+    try:
+        import genobank_cohort
+    except ImportError:
+        return _error_result(NUMPY_MISSING)
+    try:
+        files = resolve_data_paths(paths)
+        with metrics.phase("cohort_aggregation"):
+            report = await asyncio.to_thread(
+                genobank_cohort.aggregate_files, files, max(1, COHORT_CHUNK_SIZE), max(0, top)
+            )
+    except (OSError, ValueError) as e:
+        return _error_result(f"Error aggregating cohort: {e}")
+    report["files"] = len(files)
+    for entry in report["populations"]:
+        entry["population"] = format_ancestry_name(entry["code"])
+    if output_format == "summary":
+        return _tool_result(format_cohort_summary(report), report, max_chars)
+    return _format_response(report, "json", max_chars, prefix="Cohort report")
+
+
+def get_profile_store() -> "ProfileStore":
+    """
+    Opens the profile store on first use. Raises ImportError when NumPy is not installed.
+    """
+    global profile_store
+    if profile_store is None:
+        from genobank_profiles import ProfileStore
+
+        profile_store = ProfileStore(PROFILE_STORE_DIR)
+    return profile_store
+
+
+def close_profile_store() -> None:
+    global profile_store
+    if profile_store is not None:
+        profile_store.close()
+        profile_store = None
+
+
+def _index_profile_files(files: list[str], dropped: dict[str, int]) -> tuple[int, int]:
+    import genobank_cohort
+    import genobank_profiles
+
+    store = get_profile_store()
+    added = updated = 0
+    for path in files:
+        records = genobank_cohort.iter_records(path)
+        profiles = genobank_profiles.record_profiles(records, os.path.relpath(path, DATA_DIR), dropped)
+        # Written in chunks so a file of millions of profiles is never held in memory at once.
+        while chunk := list(itertools.islice(profiles, COHORT_CHUNK_SIZE)):
+            chunk_added, chunk_updated = store.add(chunk)
+            added += chunk_added
+            updated += chunk_updated
+    return added, updated
+
+
+def _describe_dropped(dropped: dict[str, int], top: int = 10) -> str:
+    """
+    Names the populations left out of profile vectors, most frequent first, with the number of profiles each.
+    """
+    names = sorted(dropped.items(), key=lambda item: item[1], reverse=True)
+    listed = ", ".join(f"{name} ({count})" for name, count in names[:top])
+    more = f" and {len(names) - top} more" if len(names) > top else ""
+    return f"Left out {len(names)} population(s) outside the reference set: {listed}{more}."
+
+
+@mcp.tool()
+@instrument_tool
+async def index_ancestry_profiles(paths: list[str]) -> str:
+    """
+    Adds the ancestry results in local JSON or NDJSON files to the profile store searched by
+    find_similar_ancestry_profiles. paths are file names or glob patterns relative to the data directory.
+    Each profile is identified by its "profile_id", "id" or "wallet" field, or by "<file>:<position>";
+    a profile whose id is already stored replaces the stored one.
+    Populations outside the reference set cannot be stored; they are reported with the number of profiles
+    that had them.
+    """
+    try:
+        store = get_profile_store()
+    except ImportError:
+        return NUMPY_MISSING
+    dropped: dict[str, int] = {}
+    try:
+        files = resolve_data_paths(paths)
+        with metrics.phase("profile_indexing"):
+            added, updated = await asyncio.to_thread(_index_profile_files, files, dropped)
+    except (OSError, ValueError) as e:
+        return f"Error indexing profiles: {e}"
+    message = f"Indexed {len(files)} file(s): {added} profiles added, {updated} updated, {store.count} stored."
+    if dropped:
+        message += " " + _describe_dropped(dropped)
+    return message
+
+
+def _describe_match(store: "ProfileStore", match: dict[str, Any], top: int = 3) -> dict[str, Any]:
+    from genobank_profiles import vector_to_ancestry
+
+    ancestry = vector_to_ancestry(store.get(match["profile_id"]))
+    main = sorted(ancestry.items(), key=lambda item: item[1], reverse=True)[:top]
+    match["main_populations"] = {format_ancestry_name(name): round(value * 100, 2) for name, value in main}
+    return match
+
+
+@mcp.tool()
+@instrument_tool
+async def find_similar_ancestry_profiles(
+    profile_id: str = "",
+    k: int = 10,
+    metric: Literal["cosine", "euclidean"] = "cosine",
+    save_my_profile: bool = False,
+    ctx: Context = None,
+) -> CallToolResult:
+    """
+    Finds the k stored ancestry profiles most similar to a profile.
+    With profile_id, the query is that stored profile. Without it, the query is the user's own ancestry
+    results, which needs a MetaMask signature; save_my_profile also adds them to the store.
+    metric "cosine" ranks by similarity of the population mix (1 = same proportions),
+    "euclidean" by distance between the population fractions (0 = identical).
+
+    return: the matches, closest first, with their score and main populations, and the query's populations
+    that are outside the reference set and were left out of the comparison
+    """
+    try:
+        import genobank_profiles
+
+        store = get_profile_store()
+    except ImportError:
+        return _error_result(NUMPY_MISSING)
+
+    dropped: dict[str, int] = {}
+    if profile_id:
+        query = await asyncio.to_thread(store.get, profile_id)
+        if query is None:
+            return _error_result(f"Error: no stored profile with id {profile_id}")
+    else:
+        signature = await request_signature(ctx)
+        if not signature:
+            return _error_result("Timeout reached. No signature was received. Please try again.")
+        try:
+            data = await fetch_ancestry_results(signature)
+            query = genobank_profiles.profile_vector(data.get("data", {}).get("ancestry", {}), dropped=dropped)
+        except Exception as e:
+            return _error_result(f"Error retrieving ancestry results: {e}")
+        # A wallet always produces the same signature, so its digest is a stable id that does not reveal it.
+        profile_id = f"user:{_digest(signature)[:16]}"
+        if save_my_profile:
+            await asyncio.to_thread(store.add, [(profile_id, query)])
+    if store.count == 0:
+        return _error_result("Error: the profile store is empty. Add profiles with index_ancestry_profiles first.")
+
+    try:
+        with metrics.phase("similarity_search"):
+            matches = await asyncio.to_thread(store.search, query, max(1, k), metric, profile_id)
+    except ValueError as e:
+        return _error_result(f"Error searching profiles: {e}")
+    result = {
+        "query": profile_id,
+        "metric": metric,
+        "searched": store.count,
+        "matches": [_describe_match(store, match) for match in matches],
+    }
+    if dropped:
+        result["dropped_populations"] = sorted(dropped)
+    return _format_response(result, "json", OUTPUT_MAX_CHARS, prefix="Similar profiles")
+
+
+async def _mint_ancestry_ip_asset_call(signature: str, timeout: Optional[float] = None) -> tuple[Any, bool]:
+    key = _idempotency_key("min_ancestry_ip_asset", signature)
+
+    async def call() -> Any:
+        response = await genobank_request(
+            "POST",
+            "/api_somos_dao/min_ancestry_ip_asset",
+            idempotent=False,
+            params={"user_singature": signature},
+            headers={"Idempotency-Key": key},
+            **_timeout_kwargs(timeout),
+        )
+        response.raise_for_status()
+        with metrics.phase("response_parsing"):
+            return response.json()
+
+    return await mint_once("min_ancestry_ip_asset", key, {}, call)
 
 
 @mcp.tool()
-async def mint_my_ancestry_results() -> str:
+@instrument_tool
+async def mint_my_ancestry_results(
+    output_format: Literal["json", "summary"] = "json",
+    max_chars: int = OUTPUT_MAX_CHARS,
+    background: bool = False,
+    ctx: Context = None,
+) -> CallToolResult:
     """
     Gets the ancestry results for a user.
     If no signature exists, it requests one through the signature server.
+    output_format "json" returns the full response as compact JSON; "summary" keeps only its scalar fields.
+    With background=True the mint is queued once the user has signed, and a ticket is returned.
     
     return: Allways return the result in an HTML artifact preview
     the ip asseet return with the mainnnet story url: https://explorer.story.foundation/ipa/<IP_ID>
 
     the transaction hash return using the block explorer: https://www.storyscan.io/tx/<TX_HASH>
     """
-    global user_signature
-    if not user_signature:
-        server_result = await start_signature_server()
-        progress_message = f"Iniciando proceso de firma...\n{server_result}\n\nPor favor, completa el proceso de firma en la página web..."
-        max_attempts = 60
-        attempt = 0
-        while not user_signature and attempt < max_attempts:
-            await asyncio.sleep(2)
-            attempt += 1
-            
-        if not user_signature:
-            return "Tiempo de espera agotado. No se recibió ninguna firma. Por favor, intente de nuevo."
+    signature = await request_signature(ctx)
+    if not signature:
+        return _error_result("Tiempo de espera agotado. No se recibió ninguna firma. Por favor, intente de nuevo.")
+    if background:
+        return _queued_result(await (await get_mint_queue()).submit("mint_ancestry_ip_asset", {}, signature))
     try:
-        url = f"{GENBANK_API_BASE}/api_somos_dao/min_ancestry_ip_asset"
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                url, 
-                params={"user_singature": user_signature},
-                timeout=10.0
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data
+        data, replayed = await _mint_ancestry_ip_asset_call(signature)
+        prefix = "Result (already minted, recorded receipt)" if replayed else "Result"
+        return _format_response(data, output_format, max_chars, prefix=prefix)
     except Exception as e:
-        return f"Error al procesar la solicitud: {str(e)}"
+        return _error_result(f"Error al procesar la solicitud: {str(e)}")
+
+
+def _job_handler(mint):
+    """
+    Adapts a mint call helper to the job queue: returns its data and reports errors compactly.
+    """
+    async def run(params: dict[str, Any], signature: Optional[str]) -> Any:
+        try:
+            data, _ = await mint(params, signature)
+        except Exception as e:
+            raise RuntimeError(_compact_error(e)) from e
+        return data
+    return run
+
+
+def _require_signature(signature: Optional[str]) -> str:
+    if not signature:
+        raise RuntimeError("The signature for this job was lost in a restart. Please submit the mint again.")
+    return signature
+
+
+MINT_JOB_HANDLERS = {
+    "mint_ip_job": _job_handler(
+        lambda params, signature: _mint_ip_job_request(IPJobRecord(**params), timeout=MINT_JOB_TIMEOUT)
+    ),
+    "mint_license_token": _job_handler(
+        lambda params, signature: _mint_license_token_call(
+            params["ip_asset"], params["receiver"], _require_signature(signature), timeout=MINT_JOB_TIMEOUT,
+            nonce=params.get("nonce", ""),
+        )
+    ),
+    "mint_ancestry_ip_asset": _job_handler(
+        lambda params, signature: _mint_ancestry_ip_asset_call(_require_signature(signature), timeout=MINT_JOB_TIMEOUT)
+    ),
+}
+
+
+async def get_mint_queue() -> MintJobQueue:
+    """
+    Returns the background mint queue, opening it (in a thread, since that blocks on SQLite) and starting its
+    workers on first use.
+    """
+    global mint_queue
+    if mint_queue is None:
+        queue = await asyncio.to_thread(MintJobQueue, JOBS_PATH, MINT_JOB_HANDLERS, MINT_WORKERS)
+        if mint_queue is None:
+            mint_queue = queue
+            for status in ("queued", "running"):
+                # Read from the counts of the last check, so rendering metrics never queries the database.
+                metrics.gauge("genobank_mint_jobs",
+                              lambda status=status: mint_queue.last_counts[status] if mint_queue else 0,
+                              status=status)
+        else:
+            # Another call opened the queue while this one waited.
+            queue.close()
+    mint_queue.ensure_started()
+    return mint_queue
+
+
+async def close_mint_queue() -> None:
+    """
+    Stops the workers; jobs still queued or running are resumed the next time the queue starts.
+    """
+    global mint_queue
+    if mint_queue is not None:
+        await mint_queue.stop()
+        mint_queue.close()
+    mint_queue = None
+
+
+async def _submit_license_token(ip_asset: str, receiver: str, signature: str, nonce: str = "") -> str:
+    # The signature is handed to the queue in memory only; it is not persisted with the job.
+    params = {"ip_asset": ip_asset, "receiver": receiver}
+    if nonce:
+        # Persisted, so a resumed job keeps its idempotency key.
+        params["nonce"] = nonce
+    return await (await get_mint_queue()).submit("mint_license_token", params, signature)
+
+
+def _queued_message(ticket: str) -> str:
+    return f"Mint queued with ticket {ticket}. Use get_mint_status to follow its progress."
+
+
+@mcp.tool()
+@instrument_tool
+async def get_mint_status(ticket: str) -> str:
+    """
+    Reports the status of a background mint job: queued, running, succeeded or failed.
+
+    return: JSON with the job's status, attempts, timestamps, and its result or error once finished
+    """
+    job = await (await get_mint_queue()).get(ticket)
+    if job is None:
+        return f"Error: no mint job with ticket {ticket}."
+    return json.dumps(job, default=str)
+
+
+@mcp.tool()
+@instrument_tool
+async def list_mint_jobs(status: Literal["", "queued", "running", "succeeded", "failed"] = "", limit: int = 20) -> str:
+    """
+    Lists the most recent background mint jobs, newest first, optionally only those with the given status.
+
+    return: JSON with the job counts per status and the listed jobs, without their results
+    """
+    queue = await get_mint_queue()
+    return json.dumps({"counts": await queue.counts(), "jobs": await queue.list(status, max(1, limit))}, default=str)
+
+async def fetch_cravat_jobs(job_ids: list[str]) -> dict[str, dict[str, Any]]:
+    """
+    Status of many OpenCRAVAT jobs in one request, keyed by job ID.
+    """
+    response = await genobank_request(
+        "POST",
+        OPENCRAVAT_JOBS_ENDPOINT,
+        idempotent=True,
+        base_url=OPENCRAVAT_API_BASE,
+        json={"ids": job_ids},
+    )
+    response.raise_for_status()
+    with metrics.phase("response_parsing"):
+        jobs = response.json()
+    if isinstance(jobs, dict):
+        jobs = jobs.get("jobs", [])
+    return {str(job["id"]): job for job in jobs if isinstance(job, dict) and job.get("id") is not None}
+
+
+async def _mint_watched_job(params: dict[str, Any]) -> str:
+    return await (await get_mint_queue()).submit("mint_ip_job", IPJobRecord(**params).model_dump())
+
+
+async def get_cravat_watcher() -> OpenCravatWatcher:
+    """
+    Returns the OpenCRAVAT job watcher, opening it (in a thread) and resuming its watched jobs on first use.
+    """
+    global cravat_watcher
+    if cravat_watcher is None:
+        watcher = await asyncio.to_thread(
+            OpenCravatWatcher,
+            JOBS_PATH,
+            fetch_cravat_jobs,
+            _mint_watched_job,
+            batch_size=CRAVAT_BATCH_SIZE,
+            concurrency=CRAVAT_POLL_CONCURRENCY,
+            min_interval=CRAVAT_POLL_MIN_INTERVAL,
+            max_interval=CRAVAT_POLL_MAX_INTERVAL,
+        )
+        if cravat_watcher is None:
+            cravat_watcher = watcher
+            metrics.gauge("genobank_cravat_jobs_watched",
+                          lambda: cravat_watcher.watched if cravat_watcher else 0)
+            metrics.gauge("genobank_cravat_polls", lambda: cravat_watcher.polls if cravat_watcher else 0)
+        else:
+            # Another call opened the watcher while this one waited.
+            watcher.close()
+    cravat_watcher.ensure_started()
+    return cravat_watcher
+
+
+async def close_cravat_watcher() -> None:
+    global cravat_watcher
+    if cravat_watcher is not None:
+        await cravat_watcher.stop()
+        cravat_watcher.close()
+    cravat_watcher = None
+
+
+class CravatWatchRequest(BaseModel):
+    """
+    One OpenCRAVAT job to watch, with the mint_ip_job fields that OpenCRAVAT does not report.
+    """
+    job_id: str
+    receiver: str = ""
+    biosample_serial: Optional[int] = None
+    owner: str = ""
+    ip_asset: str = ""
+
+
+@mcp.tool()
+@instrument_tool
+async def watch_opencravat_jobs(jobs: list[CravatWatchRequest], auto_mint: bool = False) -> str:
+    """
+    Watches OpenCRAVAT annotation jobs until they finish. Jobs are polled in batches, more often while they
+    progress and less often while they wait, so thousands of jobs can be watched at once.
+    When a job finishes, its version, number of unique variants, submission time and assembly are collected.
+    With auto_mint=True it is then queued for mint_ip_job; this needs receiver, biosample_serial and owner.
+    Follow the jobs with get_opencravat_watch_status.
+    """
+    if auto_mint:
+        incomplete = [j.job_id for j in jobs if not (j.receiver and j.owner and j.biosample_serial is not None)]
+        if incomplete:
+            return f"Error: auto_mint needs receiver, biosample_serial and owner for jobs: {', '.join(incomplete[:20])}"
+    watcher = await get_cravat_watcher()
+    added = 0
+    for job in jobs:
+        mint = job.model_dump(exclude={"job_id"}, exclude_defaults=True)
+        added += await watcher.watch(job.job_id, mint, auto_mint)
+    return (f"Watching {added} new OpenCRAVAT job(s) ({len(jobs) - added} already watched). "
+            "Use get_opencravat_watch_status to follow them.")
+
+
+@mcp.tool()
+@instrument_tool
+async def get_opencravat_watch_status(
+    job_id: str = "",
+    status: Literal["", "watching", "finished", "minting", "failed"] = "",
+    limit: int = 50,
+) -> str:
+    """
+    Reports watched OpenCRAVAT jobs: watching, finished (metadata ready; pass "mint_ip_job" to mint_ip_job),
+    minting (queued for minting; follow the ticket with get_mint_status) or failed.
+
+    return: JSON with the number of jobs per status and the most recent jobs, or the one job asked for
+    """
+    watcher = await get_cravat_watcher()
+    if job_id:
+        job = await watcher.get(job_id)
+        return json.dumps(job) if job else f"Error: OpenCRAVAT job {job_id} is not watched"
+    return json.dumps({"counts": await watcher.counts(), "jobs": await watcher.list(status, max(1, min(limit, 500)))})
+
+
+@mcp.tool()
+@instrument_tool
+async def unwatch_opencravat_jobs(job_ids: list[str]) -> str:
+    """
+    Stops watching OpenCRAVAT jobs and forgets them.
+    """
+    watcher = await get_cravat_watcher()
+    removed = sum([await watcher.unwatch(job_id) for job_id in job_ids])
+    return f"Stopped watching {removed} OpenCRAVAT job(s)."
+
+
+vcf_pool: Optional["ProcessPoolExecutor"] = None
+
+
+def vcf_workers() -> int:
+    return VCF_WORKERS if VCF_WORKERS > 0 else (os.cpu_count() or 1)
+
+
+def get_vcf_pool() -> "ProcessPoolExecutor":
+    """
+    Returns the process pool that summarizes VCF chunks, starting it on first use.
+    Workers are forked from a fresh server process that only imports genobank_vcf, not from this one; where
+    there is no forkserver (Windows), they are spawned instead.
+    """
+    global vcf_pool
+    if vcf_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["genobank_vcf"])
+        else:
+            context = multiprocessing.get_context("spawn")
+        vcf_pool = ProcessPoolExecutor(vcf_workers(), mp_context=context)
+    return vcf_pool
+
+
+def close_vcf_pool() -> None:
+    global vcf_pool
+    if vcf_pool is not None:
+        vcf_pool.shutdown(wait=False, cancel_futures=True)
+        vcf_pool = None
+
+
+@mcp.tool()
+@instrument_tool
+async def summarize_vcf_files(paths: list[str]) -> str:
+    """
+    Counts the unique variants of local VCF files (plain, bgzip or gzip) and detects their reference assembly
+    (GRCh37 as hg19, GRCh38 as hg38) from the contig lengths in the header.
+    paths are file names or glob patterns relative to the data directory. bgzip and plain files are split into
+    chunks summarized in parallel by a pool of processes; every file is streamed, so memory stays bounded.
+    Unique variants are distinct chromosome, position, REF and ALT alleles; gVCF reference blocks are not counted.
+
+    return: JSON with one summary per file; its "mint_ip_job" fields (num_unique_var, assembly) go with the
+    job's other fields to mint_ip_job, or to one record each of mint_ip_jobs_batch
+    """
+    from concurrent.futures import BrokenExecutor
+
+    import genobank_vcf
+
+    try:
+        files = resolve_data_paths(paths)
+    except ValueError as e:
+        return f"Error summarizing VCF: {e}"
+    workers = vcf_workers()
+    pool = get_vcf_pool() if workers > 1 else None
+    summaries = []
+    for path in files:
+        try:
+            with metrics.phase("vcf_summary"):
+                summary = await asyncio.to_thread(genobank_vcf.summarize_vcf, path, pool, workers)
+        except (OSError, ValueError, EOFError) as e:
+            summaries.append({"file": os.path.relpath(path, DATA_DIR), "error": str(e)})
+            continue
+        except BrokenExecutor as e:
+            # A worker died (e.g. killed for memory); the next call starts a new pool.
+            close_vcf_pool()
+            return f"Error summarizing VCF: {e}"
+        mint = {"num_unique_var": str(summary["num_unique_var"]), "assembly": summary["assembly"]}
+        summaries.append({"file": os.path.relpath(path, DATA_DIR), **summary, "mint_ip_job": mint})
+    return json.dumps({"files": summaries})
+
+
+def _endpoint_error_rates(snapshot: dict[str, Any]) -> dict[str, Any]:
+    totals: dict[str, list[float]] = {}
+    for row in snapshot.get("genobank_http_requests_total", []):
+        counts = totals.setdefault(row["endpoint"], [0, 0])
+        counts[0] += row["value"]
+        if row["outcome"] not in ("2xx", "3xx"):
+            counts[1] += row["value"]
+    return {
+        endpoint: {"requests": total, "errors": errors, "error_rate": round(errors / total, 4) if total else 0.0}
+        for endpoint, (total, errors) in totals.items()
+    }
+
+
+@mcp.tool()
+async def get_performance_metrics(
+    format: Literal["json", "prometheus"] = "json",
+    reset: bool = False,
+) -> str:
+    """
+    Reports latency histograms (count, mean, p50/p95/p99, max) and counters for every tool,
+    every phase (signature wait, browser launch, HTTP request, response parsing, HTML rendering)
+    and every GenoBank endpoint, including per-endpoint error rates and adaptive concurrency limits
+    (genobank_concurrency_limit, _in_flight and _queued).
+    Event-loop lag is in genobank_event_loop_lag_seconds and stalls per tool in genobank_event_loop_stalls_total;
+    the JSON format also lists recent stalls with the stack that blocked the loop.
+    format "prometheus" returns the Prometheus text exposition format. reset clears the metrics afterwards.
+    """
+    if mint_queue is not None:
+        # Refreshes the genobank_mint_jobs gauges.
+        await mint_queue.counts()
+    if format == "prometheus":
+        result = metrics.to_prometheus()
+    else:
+        snapshot = metrics.snapshot()
+        snapshot["endpoint_error_rates"] = _endpoint_error_rates(snapshot)
+        if loop_monitor is not None:
+            snapshot["event_loop"] = loop_monitor.report()
+        result = json.dumps(snapshot, default=str)
+    if reset:
+        metrics.reset()
+    return result
+
+
+@mcp.resource("metrics://performance", mime_type="text/plain")
+async def performance_metrics_resource() -> str:
+    """
+    Tool, phase and endpoint metrics in the Prometheus text exposition format.
+    """
+    if mint_queue is not None:
+        await mint_queue.counts()
+    return metrics.to_prometheus()
+
+
+def create_http_app():
+    """
+    Builds the ASGI app of the configured HTTP transport. Worker processes of the launcher call this on startup.
+    The shared resources open with the app rather than with each MCP session, so they stay warm between clients.
+    """
+    mcp.settings.host = MCP_HOST
+    mcp.settings.port = MCP_PORT
+    mcp.settings.stateless_http = MCP_STATELESS
+    if MCP_HOST not in ("127.0.0.1", "localhost", "::1"):
+        # The default DNS rebinding protection only allows loopback Host headers; a server bound for the team
+        # must accept the names it is reached by, and nothing else.
+        mcp.settings.transport_security = _transport_security()
+    app = mcp.streamable_http_app() if MCP_TRANSPORT == "streamable-http" else mcp.sse_app()
+    transport_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app) -> AsyncIterator[None]:
+        async with app_lifespan(mcp), transport_lifespan(app):
+            if MCP_WORKERS != 1 and SIGNATURE_SERVER_PORT:
+                # Every worker listens on the shared signing port, so a signature may reach any of them.
+                _ensure_signature_server()
+            yield
+
+    app.router.lifespan_context = lifespan
+    return app
+
+
+def _transport_security() -> "TransportSecuritySettings":
+    """
+    DNS rebinding protection that accepts the MCP_ALLOWED_HOSTS names (or the configured host) on any port.
+    """
+    import socket
+
+    from mcp.server.transport_security import TransportSecuritySettings
+
+    hosts = [h.strip() for h in MCP_ALLOWED_HOSTS.split(",") if h.strip()]
+    if not hosts:
+        hosts = [socket.getfqdn(), socket.gethostname()] if MCP_HOST in ("0.0.0.0", "::", "") else [MCP_HOST]
+    hosts = list(dict.fromkeys(hosts + ["127.0.0.1", "localhost", "[::1]"]))
+    return TransportSecuritySettings(
+        enable_dns_rebinding_protection=True,
+        allowed_hosts=[pattern for h in hosts for pattern in (h, f"{h}:*")],
+        allowed_origins=[f"{scheme}://{h}{port}" for h in hosts for scheme in ("http", "https") for port in ("", ":*")],
+    )
+
+
+def serve_http() -> None:
+    """
+    Serves every MCP client over streamable HTTP or SSE, from one process or from MCP_WORKERS processes.
+    Each client gets its own MCP session, so signatures and signing sessions stay isolated per client.
+    """
+    import uvicorn
+
+    workers = MCP_WORKERS or os.cpu_count() or 1
+    if workers > 1 and STATE_STORE_URL in ("", "memory"):
+        raise SystemExit("Several workers need a shared state store for signatures and signing sessions: "
+                         "set --state-store sqlite or redis://...")
+    options = {
+        "host": MCP_HOST,
+        "port": MCP_PORT,
+        "log_level": mcp.settings.log_level.lower(),
+        "limit_concurrency": MCP_MAX_CONCURRENCY or None,
+    }
+    if workers == 1:
+        uvicorn.run(create_http_app(), **options)
+    else:
+        uvicorn.run("genobank_api_functions:create_http_app", factory=True, workers=workers, **options)
+
+
+def main() -> None:
+    import argparse
+
+    global MCP_TRANSPORT, MCP_HOST, MCP_PORT, MCP_MAX_CONCURRENCY, MCP_WORKERS, MCP_STATELESS, STATE_STORE_URL
+    parser = argparse.ArgumentParser(description="GenoBank MCP server")
+    parser.add_argument("--transport", choices=["stdio", "streamable-http", "sse"], default=MCP_TRANSPORT)
+    parser.add_argument("--host", default=MCP_HOST, help="Interface the HTTP transports listen on")
+    parser.add_argument("--port", type=int, default=MCP_PORT, help="Port of the HTTP transports")
+    parser.add_argument("--max-concurrency", type=int, default=MCP_MAX_CONCURRENCY,
+                        help="Maximum concurrent HTTP connections per worker (0 means no limit)")
+    parser.add_argument("--workers", type=int, default=MCP_WORKERS,
+                        help="Worker processes of the HTTP transports (0 means one per CPU core)")
+    parser.add_argument("--state-store", default=STATE_STORE_URL,
+                        help='State shared by workers: "memory", "sqlite", "sqlite:///<path>" or "redis://..."')
+    args = parser.parse_args()
+
+    if args.transport == "stdio":
+        mcp.run(transport="stdio")
+        return
+    if args.workers != 1 and args.transport == "sse":
+        parser.error("SSE keeps each client on one process; use --transport streamable-http with several workers")
+    if args.workers != 1 and args.state_store in ("", "memory"):
+        parser.error("several workers need a shared state store: use --state-store sqlite or redis://...")
+    # Worker processes import this module afresh, so the settings are handed to them through the environment.
+    os.environ.update({
+        "GENOBANK_MCP_TRANSPORT": args.transport,
+        "GENOBANK_MCP_HOST": args.host,
+        "GENOBANK_MCP_PORT": str(args.port),
+        "GENOBANK_MCP_MAX_CONCURRENCY": str(args.max_concurrency),
+        "GENOBANK_MCP_WORKERS": str(args.workers),
+        "GENOBANK_STATE_STORE": args.state_store,
+    })
+    if args.workers != 1:
+        os.environ["GENOBANK_MCP_STATELESS"] = "1"
+
+    MCP_TRANSPORT, MCP_HOST, MCP_PORT = args.transport, args.host, args.port
+    MCP_MAX_CONCURRENCY, MCP_WORKERS, STATE_STORE_URL = args.max_concurrency, args.workers, args.state_store
+    MCP_STATELESS = MCP_STATELESS or args.workers != 1
+    serve_http()
+
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Static assets of the signing server, held in memory with precompressed gzip and brotli variants and served
+with ETags, so pages load from localhost without any request to a CDN.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+# Bodies smaller than this are sent as they are; compressing them saves less than the header costs.
+MIN_COMPRESS_BYTES = 256
+# Versioned asset URLs (?v=<etag>) never change content, so browsers keep them for a year without revalidating.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Preferred first.
+ENCODINGS = ("br", "gzip")
+
+CONTENT_TYPES = {".svg": "image/svg+xml", ".js": "text/javascript; charset=utf-8", ".css": "text/css; charset=utf-8"}
+
+
+@dataclass
+class StaticAsset:
+    body: bytes
+    content_type: str
+    etag: str
+    encodings: Dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def version(self) -> str:
+        return self.etag.strip('"')
+
+    def select(self, accept_encoding: str) -> Tuple[Optional[str], bytes]:
+        """
+        The smallest variant the client accepts: (Content-Encoding or None, body).
+        """
+        accepted = set()
+        for token in accept_encoding.lower().split(","):
+            name, _, params = token.strip().partition(";")
+            if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                accepted.add(name.strip())
+        for encoding in ENCODINGS:
+            if encoding in self.encodings and (encoding in accepted or "*" in accepted):
+                return encoding, self.encodings[encoding]
+        return None, self.body
+
+
+def make_asset(body: bytes, content_type: str, precompress: bool = True) -> StaticAsset:
+    """
+    Wraps a body with its ETag and, when precompress is set, its gzip and brotli variants (at their highest levels,
+    since they are computed once). Variants that are not smaller are dropped. Brotli needs the optional brotli package.
+    """
+    etag = '"' + hashlib.sha256(body).hexdigest()[:20] + '"'
+    asset = StaticAsset(body, content_type, etag)
+    if not precompress or len(body) < MIN_COMPRESS_BYTES:
+        return asset
+    variants = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants["br"] = brotli.compress(body, quality=11)
+    asset.encodings = {name: data for name, data in variants.items() if len(data) < len(body)}
+    return asset
+
+
+def load_assets(directory: str = STATIC_DIR) -> Dict[str, StaticAsset]:
+    """
+    Reads and precompresses every file of the static directory, keyed by file name.
+    """
+    assets = {}
+    if not os.path.isdir(directory):
+        return assets
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path) or name.startswith("."):
+            continue
+        extension = os.path.splitext(name)[1].lower()
+        content_type = CONTENT_TYPES.get(extension) or mimetypes.guess_type(name)[0] or "application/octet-stream"
+        with open(path, "rb") as f:
+            assets[name] = make_asset(f.read(), content_type)
+    return assets
+
+
+def send_asset(handler, asset: StaticAsset, cache_control: str) -> None:
+    """
+    Writes an asset as the response of an http.server request handler: 304 when the client's copy is current,
+    otherwise the best encoding it accepts, always with a Content-Length so the connection can be kept alive.
+    """
+    if_none_match = handler.headers.get("If-None-Match", "")
+    if if_none_match.strip() == "*" or asset.etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        handler.send_response(304)
+        handler.send_header("ETag", asset.etag)
+        handler.send_header("Cache-Control", cache_control)
+        handler.end_headers()
+        return
+    encoding, body = asset.select(handler.headers.get("Accept-Encoding", ""))
+    handler.send_response(200)
+    handler.send_header("Content-Type", asset.content_type)
+    handler.send_header("Content-Length", str(len(body)))
+    handler.send_header("ETag", asset.etag)
+    handler.send_header("Cache-Control", cache_control)
+    if asset.encodings:
+        handler.send_header("Vary", "Accept-Encoding")
+    if encoding:
+        handler.send_header("Content-Encoding", encoding)
+    handler.end_headers()
+    if handler.command != "HEAD":
+        handler.wfile.write(body)
@@ -0,0 +1,279 @@
+"""
+Cohort statistics over many ancestry results, streamed from JSON/NDJSON files and aggregated with NumPy.
+"""
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO
+
+import numpy as np
+
+# Reference populations, in report column order. These are the SOMOS Ancestry population codes that
+# format_ancestry_name translates (see ANCESTRY_NAME_REPLACEMENTS in genobank_api_functions), not a list
+# published by the API. Other populations get extra columns in cohort reports; profile vectors have no room
+# for them, so profile_vector counts them as dropped.
+REFERENCE_POPULATIONS = (
+    "AFR_NORTE", "AFR_OESTE", "AFR_ESTE", "AFR_SUR", "AFR_SUROESTE",
+    "EUR_NORTE", "EUR_SUR", "EUR_ESTE", "EUR_OESTE", "EUR_NORESTE",
+    "ASIA_ESTE", "ASIA_SUR", "ASIA_SURESTE", "ASIA_NORESTE",
+    "MEDIO_ORIENTE", "JUDIO", "OCEANIA", "AMAZONAS", "ANDES", "NAHUA_OTOMI",
+)
+
+_REFERENCE_SET = frozenset(REFERENCE_POPULATIONS)
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# Quantiles are read from per-population histograms over [0, 1] with this many bins (0.1 percentage points each).
+QUANTILE_BINS = 1000
+# Bins of the histograms included in the report.
+REPORT_BINS = 10
+# A population counts as present in a profile above this fraction.
+PRESENCE_THRESHOLD = 0.01
+CHUNK_SIZE = 10_000
+# Distinct population orders whose column indices are cached.
+MAX_LAYOUTS = 4096
+READ_BLOCK_SIZE = 1 << 20
+
+
+def ancestry_of(record: Any) -> Optional[Dict[str, Any]]:
+    """
+    Extracts the population fractions of one result: a full API response, {"ancestry": {...}} or a bare dict.
+    A bare dict is taken only if most of its keys are reference populations, so other JSON objects are skipped.
+    """
+    if not isinstance(record, dict):
+        return None
+    data = record.get("data")
+    if isinstance(data, dict) and isinstance(data.get("ancestry"), dict):
+        return data["ancestry"]
+    if isinstance(record.get("ancestry"), dict):
+        return record["ancestry"]
+    if (record and all(isinstance(v, (str, int, float)) for v in record.values())
+            and 2 * sum(key in _REFERENCE_SET for key in record) > len(record)):
+        return record
+    return None
+
+
+def _iter_json_array(f: TextIO, buffer: str) -> Iterator[Any]:
+    """
+    Decodes the elements of a top-level JSON array one at a time, reading the file in blocks.
+    """
+    decoder = json.JSONDecoder()
+    pos = buffer.index("[") + 1
+    while True:
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos == len(buffer):
+            more = f.read(READ_BLOCK_SIZE)
+            if not more:
+                raise ValueError("Unterminated JSON array")
+            buffer, pos = more, 0
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The element continues past the end of the buffer.
+            more = f.read(READ_BLOCK_SIZE)
+            if not more:
+                raise
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+        yield element
+        pos = end
+        if pos > READ_BLOCK_SIZE:
+            buffer, pos = buffer[pos:], 0
+
+
+def iter_records(path: str) -> Iterator[Any]:
+    """
+    Yields the results stored in a file: a JSON array of results, one JSON result, or NDJSON (one result per line).
+    Arrays and NDJSON are streamed, so memory does not grow with the file size.
+    """
+    with open(path, encoding="utf-8") as f:
+        head = f.read(READ_BLOCK_SIZE)
+        if head.lstrip().startswith("["):
+            yield from _iter_json_array(f, head)
+            return
+        f.seek(0)
+        first = True
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                if not first:
+                    raise
+                # Not NDJSON: a single pretty-printed JSON document.
+                f.seek(0)
+                yield json.load(f)
+                return
+            first = False
+            yield record
+
+
+def iter_chunks(paths: Iterable[str], chunk_size: int = CHUNK_SIZE) -> Iterator[List[Any]]:
+    chunk: List[Any] = []
+    for path in paths:
+        for record in iter_records(path):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+class CohortAggregator:
+    """
+    Streaming per-population statistics. Each chunk of profiles becomes a dense (profiles x populations) matrix;
+    only running sums and fixed-size histograms are kept between chunks.
+    """
+
+    def __init__(self, populations: Sequence[str] = REFERENCE_POPULATIONS):
+        self.populations: List[str] = list(populations)
+        self.columns = {name: i for i, name in enumerate(self.populations)}
+        self.count = 0
+        self.skipped = 0
+        width = len(self.populations)
+        self.sums = np.zeros(width)
+        self.squares = np.zeros(width)
+        self.present = np.zeros(width, dtype=np.int64)
+        self.zeros = np.zeros(width, dtype=np.int64)
+        self.dominant = np.zeros(width, dtype=np.int64)
+        self.histograms = np.zeros((width, QUANTILE_BINS), dtype=np.int64)
+        self._layouts: Dict[tuple, np.ndarray] = {}
+
+    def _column(self, name: str) -> int:
+        column = self.columns.get(name)
+        if column is None:
+            column = self.columns[name] = len(self.populations)
+            self.populations.append(name)
+            # Earlier profiles did not have this population: it was 0 in all of them.
+            self.sums = np.append(self.sums, 0.0)
+            self.squares = np.append(self.squares, 0.0)
+            self.present = np.append(self.present, 0)
+            self.zeros = np.append(self.zeros, self.count)
+            self.dominant = np.append(self.dominant, 0)
+            new_histogram = np.zeros((1, QUANTILE_BINS), dtype=np.int64)
+            new_histogram[0, 0] = self.count
+            self.histograms = np.vstack([self.histograms, new_histogram])
+        return column
+
+    def _layout(self, names: tuple) -> np.ndarray:
+        """
+        Column indices of a tuple of population names. Results usually list their populations in the same
+        order, so this is computed once per distinct layout rather than once per value.
+        """
+        columns = self._layouts.get(names)
+        if columns is None:
+            if len(self._layouts) >= MAX_LAYOUTS:
+                self._layouts.clear()
+            columns = self._layouts[names] = np.array([self._column(name) for name in names], dtype=np.intp)
+        return columns
+
+    @staticmethod
+    def _numeric(ancestry: Dict[str, Any]) -> bool:
+        try:
+            [float(v) for v in ancestry.values()]
+        except (TypeError, ValueError):
+            return False
+        return True
+
+    def add(self, records: List[Any]) -> None:
+        """
+        Adds one chunk of results. Results without an ancestry dict or with non-numeric values are skipped.
+        """
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for ancestry in map(ancestry_of, records):
+            if ancestry:
+                groups.setdefault(tuple(ancestry), []).append(ancestry)
+            else:
+                self.skipped += 1
+
+        blocks = []
+        for names, ancestries in groups.items():
+            try:
+                values = np.asarray([tuple(a.values()) for a in ancestries], dtype=np.float64)
+            except (TypeError, ValueError):
+                valid = [a for a in ancestries if self._numeric(a)]
+                self.skipped += len(ancestries) - len(valid)
+                if not valid:
+                    continue
+                values = np.asarray([tuple(a.values()) for a in valid], dtype=np.float64)
+            blocks.append((self._layout(names), values))
+        if not blocks:
+            return
+
+        ancestries_count = sum(len(values) for _, values in blocks)
+        matrix = np.zeros((ancestries_count, len(self.populations)))
+        row = 0
+        for columns, values in blocks:
+            matrix[row:row + len(values), columns] = values
+            row += len(values)
+        np.clip(np.nan_to_num(matrix, nan=0.0), 0.0, 1.0, out=matrix)
+
+        self.count += ancestries_count
+        self.sums += matrix.sum(axis=0)
+        self.squares += np.square(matrix).sum(axis=0)
+        self.present += (matrix > PRESENCE_THRESHOLD).sum(axis=0)
+        self.zeros += (matrix == 0.0).sum(axis=0)
+        nonempty = matrix.any(axis=1)
+        self.dominant += np.bincount(matrix[nonempty].argmax(axis=1), minlength=len(self.populations))
+        bins = np.minimum((matrix * QUANTILE_BINS).astype(np.int64), QUANTILE_BINS - 1)
+        bins += np.arange(len(self.populations)) * QUANTILE_BINS
+        self.histograms += np.bincount(bins.ravel(), minlength=self.histograms.size).reshape(self.histograms.shape)
+
+    def quantiles(self, qs: Sequence[float] = QUANTILES) -> np.ndarray:
+        """
+        Estimates quantiles for every population at once, shape (populations, len(qs)).
+        Interpolates linearly inside the histogram bin that holds each rank; exact zeros are kept at 0.
+        """
+        cumulative = self.histograms.cumsum(axis=1)
+        result = np.zeros((len(self.populations), len(qs)))
+        for j, q in enumerate(qs):
+            rank = q * self.count
+            bin_index = np.minimum((cumulative < rank).sum(axis=1), QUANTILE_BINS - 1)
+            in_bin = np.take_along_axis(self.histograms, bin_index[:, None], axis=1)[:, 0]
+            before = np.take_along_axis(cumulative, bin_index[:, None], axis=1)[:, 0] - in_bin
+            estimate = (bin_index + np.clip((rank - before) / np.maximum(in_bin, 1), 0.0, 1.0)) / QUANTILE_BINS
+            result[:, j] = np.where(rank <= self.zeros, 0.0, estimate)
+        return result
+
+    def report(self, top: int = 0) -> Dict[str, Any]:
+        """
+        Per-population statistics in percent, largest mean first; top limits the number of populations (0 = all).
+        """
+        count = max(self.count, 1)
+        means = self.sums / count
+        stds = np.sqrt(np.maximum(self.squares / count - np.square(means), 0.0))
+        quantiles = self.quantiles()
+        report_histograms = self.histograms.reshape(len(self.populations), REPORT_BINS, -1).sum(axis=2)
+        order = np.argsort(-means, kind="stable")
+        if top:
+            order = order[:top]
+        populations = []
+        for i in order:
+            entry = {
+                "code": self.populations[i],
+                "mean": round(float(means[i]) * 100, 2),
+                "std": round(float(stds[i]) * 100, 2),
+            }
+            entry.update({f"p{round(q * 100)}": round(float(v) * 100, 2) for q, v in zip(QUANTILES, quantiles[i])})
+            entry["present_pct"] = round(float(self.present[i]) / count * 100, 2)
+            entry["dominant"] = int(self.dominant[i])
+            entry["histogram"] = report_histograms[i].tolist()
+            populations.append(entry)
+        return {
+            "profiles": self.count,
+            "skipped": self.skipped,
+            "histogram_bins_pct": [round(100 / REPORT_BINS * b, 1) for b in range(REPORT_BINS + 1)],
+            "populations": populations,
+        }
+
+
+def aggregate_files(paths: Iterable[str], chunk_size: int = CHUNK_SIZE, top: int = 0) -> Dict[str, Any]:
+    aggregator = CohortAggregator()
+    for chunk in iter_chunks(paths, chunk_size):
+        aggregator.add(chunk)
+        # Release the chunk before the next one is read, so only one is held at a time.
+        del chunk
+    return aggregator.report(top)
@@ -0,0 +1,222 @@
+"""
+Local verification of MetaMask personal_sign signatures: Keccak-256 and secp256k1 public key recovery
+in pure Python, so no native crypto dependency is needed.
+"""
+import functools
+from typing import Optional, Tuple
+
+# The message the signing page asks MetaMask to sign.
+SIGNED_MESSAGE = "I want to proceed"
+# Recovered addresses kept in memory, by signature.
+ADDRESS_CACHE_SIZE = 4096
+
+
+class InvalidSignature(ValueError):
+    pass
+
+
+# Keccak-256 as used by Ethereum (the original Keccak padding, not NIST SHA3-256).
+
+_KECCAK_ROUND_CONSTANTS = (
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+)
+# Rotation offset of lane (x, y), at index x + 5 * y.
+_KECCAK_ROTATIONS = (
+    0, 1, 62, 28, 27,
+    36, 44, 6, 55, 20,
+    3, 10, 43, 25, 39,
+    41, 45, 15, 21, 8,
+    18, 2, 61, 56, 14,
+)
+_MASK64 = (1 << 64) - 1
+_KECCAK_RATE = 136
+
+
+def _keccak_f(lanes: list) -> None:
+    for round_constant in _KECCAK_ROUND_CONSTANTS:
+        # theta
+        c = [lanes[x] ^ lanes[x + 5] ^ lanes[x + 10] ^ lanes[x + 15] ^ lanes[x + 20] for x in range(5)]
+        for x in range(5):
+            d = c[x - 1] ^ (((c[(x + 1) % 5] << 1) | (c[(x + 1) % 5] >> 63)) & _MASK64)
+            for y in range(0, 25, 5):
+                lanes[x + y] ^= d
+        # rho and pi
+        b = [0] * 25
+        for x in range(5):
+            for y in range(5):
+                lane = lanes[x + 5 * y]
+                shift = _KECCAK_ROTATIONS[x + 5 * y]
+                b[y + 5 * ((2 * x + 3 * y) % 5)] = ((lane << shift) | (lane >> (64 - shift))) & _MASK64
+        # chi
+        for y in range(0, 25, 5):
+            row = b[y:y + 5]
+            for x in range(5):
+                lanes[x + y] = row[x] ^ (~row[(x + 1) % 5] & row[(x + 2) % 5])
+        # iota
+        lanes[0] ^= round_constant
+
+
+def keccak256(data: bytes) -> bytes:
+    padded = bytearray(data)
+    padded.append(0x01)
+    padded.extend(b"\x00" * (-len(padded) % _KECCAK_RATE))
+    padded[-1] |= 0x80
+    lanes = [0] * 25
+    for offset in range(0, len(padded), _KECCAK_RATE):
+        for i in range(_KECCAK_RATE // 8):
+            lanes[i] ^= int.from_bytes(padded[offset + 8 * i:offset + 8 * i + 8], "little")
+        _keccak_f(lanes)
+    return b"".join(lane.to_bytes(8, "little") for lane in lanes[:4])
+
+
+# secp256k1, with points in Jacobian coordinates (X, Y, Z) to avoid a modular inverse per step.
+
+_P = 2 ** 256 - 2 ** 32 - 977
+_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+_G = (
+    0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+    0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8,
+    1,
+)
+_INFINITY = (0, 1, 0)
+
+Point = Tuple[int, int, int]
+
+
+def _double(point: Point) -> Point:
+    x, y, z = point
+    if y == 0 or z == 0:
+        return _INFINITY
+    yy = y * y % _P
+    s = 4 * x * yy % _P
+    m = 3 * x * x % _P
+    nx = (m * m - 2 * s) % _P
+    return nx, (m * (s - nx) - 8 * yy * yy) % _P, 2 * y * z % _P
+
+
+def _add(p: Point, q: Point) -> Point:
+    if p[2] == 0:
+        return q
+    if q[2] == 0:
+        return p
+    x1, y1, z1 = p
+    x2, y2, z2 = q
+    z1z1 = z1 * z1 % _P
+    z2z2 = z2 * z2 % _P
+    u1 = x1 * z2z2 % _P
+    u2 = x2 * z1z1 % _P
+    s1 = y1 * z2 * z2z2 % _P
+    s2 = y2 * z1 * z1z1 % _P
+    if u1 == u2:
+        return _double(p) if s1 == s2 else _INFINITY
+    h = (u2 - u1) % _P
+    r = (s2 - s1) % _P
+    hh = h * h % _P
+    hhh = h * hh % _P
+    v = u1 * hh % _P
+    x3 = (r * r - hhh - 2 * v) % _P
+    return x3, (r * (v - x3) - s1 * hhh) % _P, z1 * z2 * h % _P
+
+
+def _multiply_add(a: int, p: Point, b: int, q: Point) -> Point:
+    """
+    a * p + b * q with one shared chain of doublings (Shamir's trick).
+    """
+    pq = _add(p, q)
+    result = _INFINITY
+    for bit in range(max(a.bit_length(), b.bit_length()) - 1, -1, -1):
+        result = _double(result)
+        a_bit, b_bit = (a >> bit) & 1, (b >> bit) & 1
+        if a_bit and b_bit:
+            result = _add(result, pq)
+        elif a_bit:
+            result = _add(result, p)
+        elif b_bit:
+            result = _add(result, q)
+    return result
+
+
+def _to_affine(point: Point) -> Tuple[int, int]:
+    x, y, z = point
+    z_inverse = pow(z, -1, _P)
+    z_inverse2 = z_inverse * z_inverse % _P
+    return x * z_inverse2 % _P, y * z_inverse2 * z_inverse % _P
+
+
+def personal_sign_hash(message: str) -> bytes:
+    """
+    The digest MetaMask signs for personal_sign (EIP-191 version 0x45).
+    """
+    data = message.encode()
+    return keccak256(b"\x19Ethereum Signed Message:\n" + str(len(data)).encode() + data)
+
+
+def checksum_address(address: bytes) -> str:
+    """
+    Mixed-case hex address (EIP-55).
+    """
+    hex_address = address.hex()
+    digest = keccak256(hex_address.encode()).hex()
+    return "0x" + "".join(c.upper() if int(d, 16) >= 8 else c for c, d in zip(hex_address, digest))
+
+
+def parse_signature(signature: str) -> Tuple[int, int, int]:
+    """
+    Splits a 65-byte hex signature into (r, s, recovery id), raising InvalidSignature if it is malformed.
+    """
+    if not isinstance(signature, str):
+        raise InvalidSignature("The signature must be a hex string")
+    text = signature[2:] if signature[:2] in ("0x", "0X") else signature
+    if len(text) != 130:
+        raise InvalidSignature(f"Expected a 65-byte signature, got {len(text) // 2} bytes")
+    try:
+        raw = bytes.fromhex(text)
+    except ValueError:
+        raise InvalidSignature("The signature is not valid hex") from None
+    r = int.from_bytes(raw[:32], "big")
+    s = int.from_bytes(raw[32:64], "big")
+    v = raw[64]
+    recovery_id = v - 27 if v >= 27 else v
+    if recovery_id not in (0, 1):
+        raise InvalidSignature(f"Invalid recovery byte {v}")
+    if not (0 < r < _N and 0 < s < _N):
+        raise InvalidSignature("Signature values out of range")
+    return r, s, recovery_id
+
+
+def recover_address(signature: str, message: str = SIGNED_MESSAGE) -> str:
+    """
+    Recovers the checksummed address that produced a personal_sign signature of message.
+    """
+    r, s, recovery_id = parse_signature(signature)
+    y_squared = (pow(r, 3, _P) + 7) % _P
+    y = pow(y_squared, (_P + 1) // 4, _P)
+    if y * y % _P != y_squared:
+        raise InvalidSignature("The signature does not correspond to a curve point")
+    if y % 2 != recovery_id:
+        y = _P - y
+    e = int.from_bytes(personal_sign_hash(message), "big") % _N
+    r_inverse = pow(r, -1, _N)
+    # Q = r^-1 * (s * R - e * G)
+    public_key = _multiply_add(s * r_inverse % _N, (r, y, 1), -e * r_inverse % _N, _G)
+    if public_key[2] == 0:
+        raise InvalidSignature("The signature does not recover a public key")
+    x, y = _to_affine(public_key)
+    return checksum_address(keccak256(x.to_bytes(32, "big") + y.to_bytes(32, "big"))[-20:])
+
+
+@functools.lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def signer_address(signature: str) -> str:
+    """
+    Address that signed SIGNED_MESSAGE, cached per signature. Raises InvalidSignature for malformed signatures.
+    """
+    return recover_address(signature)
+
+
+def same_address(a: Optional[str], b: Optional[str]) -> bool:
+    return bool(a and b) and a.lower() == b.lower()
@@ -0,0 +1,242 @@
+"""
+Persistent background queue for mint jobs, processed by a bounded pool of asyncio workers.
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from genobank_journal import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mint_jobs (
+    ticket TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    worker TEXT
+)
+"""
+
+JobHandler = Callable[[Dict[str, Any], Optional[str]], Awaitable[Any]]
+
+STATUSES = ("queued", "running", "succeeded", "failed")
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def worker_alive(worker: Optional[str]) -> bool:
+    """
+    Whether the process that owns a job still runs. Processes on other hosts are assumed alive.
+    """
+    if not worker:
+        return False
+    host, _, pid = worker.rpartition(":")
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+
+class MintJobQueue:
+    """
+    Jobs are written to SQLite before they are queued, so queued and interrupted jobs are resumed after a restart.
+    Signatures are only kept in memory; a job that needs one and was interrupted by a restart fails and must be resubmitted.
+    Several processes may share the database: each job belongs to the process that submitted it, and is only
+    taken over by another process once its owner has exited.
+    Opening the queue blocks on SQLite; every other database call runs in a thread, so a process holding the
+    write lock never stalls the event loop.
+    """
+
+    def __init__(self, path: str, handlers: Dict[str, JobHandler], workers: int = 4):
+        self.path = path
+        self.handlers = handlers
+        self.workers = workers
+        self._connection = connect(path)
+        self._connection.execute(SCHEMA)
+        columns = {row[1] for row in self._connection.execute("PRAGMA table_info(mint_jobs)")}
+        if "worker" not in columns:
+            self._connection.execute("ALTER TABLE mint_jobs ADD COLUMN worker TEXT")
+        self.worker = worker_id()
+        self._lock = threading.Lock()
+        self._signatures: Dict[str, str] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Job counts as of the last counts() call, read by metrics gauges without touching the database.
+        self.last_counts: Dict[str, int] = dict.fromkeys(STATUSES, 0)
+
+    def _execute(self, sql: str, args: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._connection.execute(sql, args)
+
+    def ensure_started(self) -> None:
+        """
+        Starts the worker pool on the running event loop and re-queues jobs left over from a previous run.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tasks:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._tasks = [loop.create_task(self._resume())]
+        self._tasks += [loop.create_task(self._worker()) for _ in range(max(1, self.workers))]
+
+    async def _resume(self) -> None:
+        for ticket in await asyncio.to_thread(self._take_over_orphans):
+            self._queue.put_nowait(ticket)
+
+    def _take_over_orphans(self) -> List[str]:
+        tickets = []
+        orphaned = self._execute(
+            "SELECT ticket, worker FROM mint_jobs WHERE status IN ('queued', 'running') ORDER BY created"
+        ).fetchall()
+        for ticket, worker in orphaned:
+            if worker != self.worker and worker_alive(worker):
+                continue
+            self._execute(
+                "UPDATE mint_jobs SET status = 'queued', worker = ? WHERE ticket = ? AND status IN ('queued', 'running')",
+                (self.worker, ticket),
+            )
+            tickets.append(ticket)
+        return tickets
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    async def submit(self, kind: str, params: Dict[str, Any], signature: Optional[str] = None) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown mint job kind: {kind}")
+        self.ensure_started()
+        ticket = uuid.uuid4().hex
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO mint_jobs (ticket, kind, params, status, created, worker) VALUES (?, ?, ?, 'queued', ?, ?)",
+            (ticket, kind, json.dumps(params, sort_keys=True, default=str), time.time(), self.worker),
+        )
+        if signature:
+            self._signatures[ticket] = signature
+        self._queue.put_nowait(ticket)
+        return ticket
+
+    async def get(self, ticket: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, ticket)
+
+    def _get(self, ticket: str) -> Optional[Dict[str, Any]]:
+        row = self._execute(
+            "SELECT ticket, kind, params, status, result, error, attempts, created, started, finished "
+            "FROM mint_jobs WHERE ticket = ?",
+            (ticket,),
+        ).fetchone()
+        return self._row_to_job(row, with_result=True) if row else None
+
+    async def list(self, status: str = "", limit: int = 20) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self._list, status, limit)
+
+    def _list(self, status: str, limit: int) -> List[Dict[str, Any]]:
+        columns = "ticket, kind, params, status, result, error, attempts, created, started, finished"
+        if status:
+            rows = self._execute(
+                f"SELECT {columns} FROM mint_jobs WHERE status = ? ORDER BY created DESC LIMIT ?", (status, limit)
+            ).fetchall()
+        else:
+            rows = self._execute(f"SELECT {columns} FROM mint_jobs ORDER BY created DESC LIMIT ?", (limit,)).fetchall()
+        return [self._row_to_job(row, with_result=False) for row in rows]
+
+    async def counts(self) -> Dict[str, int]:
+        rows = await asyncio.to_thread(
+            lambda: self._execute("SELECT status, COUNT(*) FROM mint_jobs GROUP BY status").fetchall()
+        )
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(dict(rows))
+        self.last_counts = counts
+        return counts
+
+    @staticmethod
+    def _row_to_job(row: tuple, with_result: bool) -> Dict[str, Any]:
+        ticket, kind, params, status, result, error, attempts, created, started, finished = row
+        job = {
+            "ticket": ticket,
+            "kind": kind,
+            "status": status,
+            "attempts": attempts,
+            "created": created,
+            "started": started,
+            "finished": finished,
+        }
+        if error:
+            job["error"] = error
+        if with_result:
+            job["params"] = json.loads(params)
+            if result is not None:
+                job["result"] = json.loads(result)
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            ticket = await self._queue.get()
+            try:
+                await self._run(ticket)
+            finally:
+                self._queue.task_done()
+
+    def _claim(self, ticket: str) -> Optional[tuple]:
+        # Claiming the job is a single conditional update, so it runs at most once even if it was queued twice.
+        claimed = self._execute(
+            "UPDATE mint_jobs SET status = 'running', started = ?, attempts = attempts + 1, worker = ? "
+            "WHERE ticket = ? AND status = 'queued'",
+            (time.time(), self.worker, ticket),
+        ).rowcount
+        if not claimed:
+            return None
+        return self._execute("SELECT kind, params FROM mint_jobs WHERE ticket = ?", (ticket,)).fetchone()
+
+    async def _run(self, ticket: str) -> None:
+        claimed = await asyncio.to_thread(self._claim, ticket)
+        if claimed is None:
+            return
+        kind, params = claimed
+        try:
+            result = await self.handlers[kind](json.loads(params), self._signatures.get(ticket))
+        except asyncio.CancelledError:
+            # Left as 'running'; it is re-queued when the queue starts again.
+            raise
+        except Exception as e:
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE mint_jobs SET status = 'failed', error = ?, finished = ? WHERE ticket = ?",
+                (str(e) or type(e).__name__, time.time(), ticket),
+            )
+        else:
+            await asyncio.to_thread(
+                self._execute,
+                "UPDATE mint_jobs SET status = 'succeeded', result = ?, finished = ? WHERE ticket = ?",
+                (json.dumps(result, default=str), time.time(), ticket),
+            )
+        self._signatures.pop(ticket, None)
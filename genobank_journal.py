@@ -0,0 +1,110 @@
+"""
+Persistent journal of mint requests, so a repeated mint returns its recorded receipt instead of minting again.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mint_requests (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Opens a SQLite database in WAL mode, shared by the journal and the other local stores.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+class MintJournal:
+    """
+    Records each mint request by idempotency key with its status: pending, success or error.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = connect(path)
+        self._connection.execute(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT kind, params, status, result, error, attempts, created, updated FROM mint_requests WHERE key = ?",
+                (key,),
+            ).fetchone()
+        if row is None:
+            return None
+        kind, params, status, result, error, attempts, created, updated = row
+        return {
+            "key": key,
+            "kind": kind,
+            "params": json.loads(params),
+            "status": status,
+            "result": json.loads(result) if result is not None else None,
+            "error": error,
+            "attempts": attempts,
+            "created": created,
+            "updated": updated,
+        }
+
+    def receipt(self, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        """
+        Returns the recorded result of a successful mint, or None. With max_age, receipts recorded more than
+        max_age seconds ago are ignored.
+        """
+        entry = self.get(key)
+        if entry is None or entry["status"] != "success":
+            return None
+        if max_age is not None and time.time() - entry["updated"] > max_age:
+            return None
+        return entry["result"]
+
+    def record_pending(self, key: str, kind: str, params: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO mint_requests (key, kind, params, status, attempts, created, updated) "
+                "VALUES (?, ?, ?, 'pending', 1, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET status = 'pending', error = NULL, "
+                "attempts = attempts + 1, updated = excluded.updated",
+                (key, kind, json.dumps(params, sort_keys=True, default=str), now, now),
+            )
+
+    def record_success(self, key: str, result: Any) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE mint_requests SET status = 'success', result = ?, error = NULL, updated = ? WHERE key = ?",
+                (json.dumps(result, default=str), time.time(), key),
+            )
+
+    def record_failure(self, key: str, error: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE mint_requests SET status = 'error', error = ?, updated = ? WHERE key = ?",
+                (error, time.time(), key),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,115 @@
+"""
+Event-loop lag monitor: a heartbeat on the loop measures how late it runs, and a watchdog thread samples the
+loop thread's stack while the heartbeat is overdue, so a stall can be traced to the tool and call that caused it.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from genobank_metrics import metrics, tool_of_frame
+
+# Innermost frames kept from a stalled stack.
+STACK_LIMIT = 20
+# Stalls kept for get_performance_metrics.
+STALL_HISTORY = 50
+
+
+def format_frames(frame: Any, limit: int = STACK_LIMIT) -> List[str]:
+    return [f"{f.filename}:{f.lineno} in {f.name}" + (f": {f.line}" if f.line else "")
+            for f in traceback.extract_stack(frame, limit=limit)]
+
+
+class LoopLagMonitor:
+    """
+    Records event-loop stalls of at least `threshold` seconds. The heartbeat runs every threshold / 2 seconds and
+    observes its lateness in genobank_event_loop_lag_seconds. The watchdog sleeps until the heartbeat is half a
+    threshold overdue and then captures the loop thread's stack, which is kept if the stall reaches the threshold. Stalls are counted per tool in genobank_event_loop_stalls_total, logged to stderr
+    and kept in `stalls`.
+    """
+
+    def __init__(self, threshold: float, history: int = STALL_HISTORY):
+        self.threshold = threshold
+        self.interval = max(0.005, threshold / 2)
+        self.stalls: deque = deque(maxlen=history)
+        self.max_lag = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        # Monotonic time the next heartbeat is due, and the stack captured while waiting for it.
+        self._due = 0.0
+        self._captured: Optional[Tuple[float, str, List[str]]] = None
+
+    def start(self) -> None:
+        """
+        Starts monitoring the running event loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        self.stop()
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._stopped = threading.Event()
+        self._schedule()
+        self._watchdog = threading.Thread(target=self._watch, args=(self._stopped,), name="genobank-loop-watchdog",
+                                          daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = None
+        self._loop = None
+
+    def _schedule(self) -> None:
+        self._due = time.monotonic() + self.interval
+        self._handle = self._loop.call_later(self.interval, self._heartbeat)
+
+    def _heartbeat(self) -> None:
+        lag = max(0.0, time.monotonic() - self._due)
+        metrics.observe("genobank_event_loop_lag_seconds", lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.threshold:
+            self._record(lag)
+        self._captured = None
+        self._schedule()
+
+    def _watch(self, stopped: threading.Event) -> None:
+        wait = self.threshold / 2
+        while not stopped.wait(wait):
+            due = self._due
+            overdue = time.monotonic() - due
+            if overdue < self.threshold / 2:
+                # Wake up only when this heartbeat would be half a threshold late.
+                wait = self.threshold / 2 - overdue
+                continue
+            wait = self.threshold / 2
+            if self._captured is not None and self._captured[0] == due:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                self._captured = (due, tool_of_frame(frame), format_frames(frame))
+            del frame
+
+    def _record(self, lag: float) -> None:
+        captured = self._captured
+        if captured is not None and captured[0] == self._due:
+            _, tool, stack = captured
+        else:
+            tool, stack = "unknown", []
+        metrics.inc("genobank_event_loop_stalls_total", tool=tool)
+        self.stalls.append({"time": round(time.time() - lag, 3), "seconds": round(lag, 3), "tool": tool,
+                            "stack": stack})
+        where = f"\n  {stack[-1]}" if stack else ""
+        print(f"Event loop stalled for {lag * 1000:.0f} ms in tool {tool}{where}", file=sys.stderr)
+
+    def report(self) -> Dict[str, Any]:
+        return {"threshold_seconds": self.threshold, "max_lag_seconds": round(self.max_lag, 6),
+                "stalls": list(self.stalls)}
@@ -0,0 +1,215 @@
+"""
+In-process latency histograms and counters for the GenoBank MCP tools.
+"""
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from types import CodeType, FrameType
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Name of the tool whose invocation is currently running, used to label phase timings.
+current_tool: contextvars.ContextVar[str] = contextvars.ContextVar("current_tool", default="")
+
+LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# Code objects of the instrumented tools, to name the tool a stack belongs to from another thread.
+tool_codes: Dict[CodeType, str] = {}
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, as exported in the Prometheus text format.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile by linear interpolation inside the bucket that contains it.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bucket_count, upper in zip(self.counts, self.buckets + (self.max,)):
+            if bucket_count and seen + bucket_count >= rank:
+                upper = min(upper, self.max)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = upper
+        return self.max
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.started = time.time()
+        self._histograms: Dict[LabelKey, Histogram] = {}
+        self._counters: Dict[LabelKey, float] = {}
+        self._gauges: Dict[LabelKey, Any] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> LabelKey:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, read: Any, **labels: Any) -> None:
+        """
+        Registers a gauge whose value is read from the callable at snapshot time.
+        """
+        with self._lock:
+            self._gauges[self._key(name, labels)] = read
+
+    @contextmanager
+    def phase(self, phase: str) -> Iterator[None]:
+        """
+        Times one phase of the current tool invocation.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("genobank_phase_duration_seconds", time.perf_counter() - started,
+                         phase=phase, tool=current_tool.get() or "none")
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            histograms = list(self._histograms.items())
+            counters = list(self._counters.items())
+            gauges = list(self._gauges.items())
+        result: Dict[str, Any] = {"uptime_seconds": round(time.time() - self.started, 3)}
+        for (name, labels), histogram in histograms:
+            result.setdefault(name, []).append({**dict(labels), **{k: round(v, 6) for k, v in histogram.snapshot().items()}})
+        for (name, labels), value in counters:
+            result.setdefault(name, []).append({**dict(labels), "value": value})
+        for (name, labels), read in gauges:
+            result.setdefault(name, []).append({**dict(labels), "value": read()})
+        return result
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items(), key=lambda item: item[0])
+        lines = []
+        typed = set()
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        for (name, labels), value in counters:
+            if name not in typed:
+                lines.append(f"# TYPE {name} counter")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+        for (name, labels), read in gauges:
+            if name not in typed:
+                lines.append(f"# TYPE {name} gauge")
+                typed.add(name)
+            lines.append(f"{name}{_format_labels(labels)} {read()}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+metrics = MetricsRegistry()
+
+
+def instrument_tool(fn):
+    """
+    Times every invocation of an async tool and counts its outcome.
+    Tools report failures as strings starting with "Error", or as results flagged isError, which count as errors too.
+    """
+    tool_codes[fn.__code__] = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        token = current_tool.set(fn.__name__)
+        started = time.perf_counter()
+        outcome = "ok"
+        try:
+            result = await fn(*args, **kwargs)
+            if getattr(result, "isError", False) or isinstance(result, str) and result.startswith("Error"):
+                outcome = "error"
+            return result
+        except BaseException:
+            outcome = "exception"
+            raise
+        finally:
+            metrics.observe("genobank_tool_duration_seconds", time.perf_counter() - started, tool=fn.__name__)
+            metrics.inc("genobank_tool_calls_total", tool=fn.__name__, outcome=outcome)
+            current_tool.reset(token)
+    return wrapper
+
+
+def tool_of_frame(frame: Optional[FrameType]) -> str:
+    """
+    Name of the instrumented tool running in a stack, or "none".
+    """
+    while frame is not None:
+        name = tool_codes.get(frame.f_code)
+        if name is not None:
+            return name
+        frame = frame.f_back
+    return "none"
@@ -0,0 +1,274 @@
+"""
+Compact ancestry profiles: float32 vectors over the reference populations, stored in memory-mapped files
+and searched for nearest neighbors with blocked NumPy scans.
+"""
+import json
+import os
+import sys
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from genobank_cohort import REFERENCE_POPULATIONS
+
+# Interned population names and their column in every profile vector.
+POPULATION_IDS: Dict[str, int] = {sys.intern(name): i for i, name in enumerate(REFERENCE_POPULATIONS)}
+DIMENSIONS = len(REFERENCE_POPULATIONS)
+# Profile ids are stored as fixed-width UTF-8 byte strings.
+ID_BYTES = 64
+METRICS = ("cosine", "euclidean")
+# Rows scored per step of a search; bounds the temporary memory of a query to a few MiB.
+SEARCH_BLOCK_ROWS = 1 << 18
+INITIAL_CAPACITY = 1024
+FORMAT_VERSION = 1
+
+
+def population_id(name: str) -> Optional[int]:
+    return POPULATION_IDS.get(name)
+
+
+def profile_vector(
+    ancestry: Dict[str, Any], out: Optional[np.ndarray] = None, dropped: Optional[Dict[str, int]] = None
+) -> np.ndarray:
+    """
+    Parses an ancestry dict ({"AFR_NORTE": "0.12", ...}) once into a float32 vector of fractions.
+    Populations outside the reference set have no column; they are left out and, when dropped is given,
+    counted in it by name.
+    """
+    vector = np.zeros(DIMENSIONS, dtype=np.float32) if out is None else out
+    for name, value in ancestry.items():
+        column = POPULATION_IDS.get(name)
+        if column is not None:
+            vector[column] = float(value)
+        elif dropped is not None:
+            dropped[name] = dropped.get(name, 0) + 1
+    np.clip(np.nan_to_num(vector, nan=0.0), 0.0, 1.0, out=vector)
+    return vector
+
+
+def vector_to_ancestry(vector: np.ndarray, threshold: float = 0.0001) -> Dict[str, float]:
+    return {REFERENCE_POPULATIONS[i]: round(float(v), 6) for i, v in enumerate(vector) if v > threshold}
+
+
+def _encode_id(profile_id: str) -> bytes:
+    encoded = profile_id.encode()
+    if not encoded or len(encoded) > ID_BYTES:
+        raise ValueError(f"Profile ids must be 1 to {ID_BYTES} bytes: {profile_id!r}")
+    return encoded
+
+
+class ProfileStore:
+    """
+    Profiles in a directory of memory-mapped arrays: vectors.f32 (rows x populations), norms.f32 (L2 norm of
+    each row) and ids.bin (fixed-width ids), plus meta.json with the row count. Files grow by doubling.
+    meta.json is replaced atomically after the rows are flushed, so readers in other processes only see
+    complete rows; they pick up new rows on their next query.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._meta_mtime: Optional[int] = None
+        self.count = 0
+        self.capacity = 0
+        self._rows: Dict[bytes, int] = {}
+        self._indexed = 0
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self) -> None:
+        meta_path = self._path("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get("version") != FORMAT_VERSION or meta.get("populations") != list(REFERENCE_POPULATIONS):
+                raise ValueError(f"Incompatible profile store in {self.directory}")
+            self._meta_mtime = os.stat(meta_path).st_mtime_ns
+            self.count = meta["count"]
+        norms_path = self._path("norms.f32")
+        existing = os.path.getsize(norms_path) // 4 if os.path.exists(norms_path) else 0
+        self._map(max(self.count, existing, INITIAL_CAPACITY))
+
+    def _map(self, capacity: int) -> None:
+        """
+        (Re)maps the arrays with room for at least capacity rows, extending the files if needed.
+        """
+        for name, row_bytes in (("vectors.f32", 4 * DIMENSIONS), ("norms.f32", 4), ("ids.bin", ID_BYTES)):
+            with open(self._path(name), "ab") as f:
+                if f.tell() < capacity * row_bytes:
+                    f.truncate(capacity * row_bytes)
+        self.capacity = capacity
+        self.vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+", shape=(capacity, DIMENSIONS))
+        self.norms = np.memmap(self._path("norms.f32"), dtype=np.float32, mode="r+", shape=(capacity,))
+        self.ids = np.memmap(self._path("ids.bin"), dtype=f"S{ID_BYTES}", mode="r+", shape=(capacity,))
+
+    def refresh(self) -> None:
+        """
+        Picks up rows written by another process since the last call.
+        """
+        try:
+            mtime = os.stat(self._path("meta.json")).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._meta_mtime:
+            with self._lock:
+                self._load()
+
+    def _write_meta(self) -> None:
+        meta_path = self._path("meta.json")
+        temporary = f"{meta_path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({"version": FORMAT_VERSION, "populations": list(REFERENCE_POPULATIONS), "count": self.count}, f)
+        os.replace(temporary, meta_path)
+        self._meta_mtime = os.stat(meta_path).st_mtime_ns
+
+    def _row_index(self) -> Dict[bytes, int]:
+        # Built incrementally, so a store with millions of rows is only scanned once per process.
+        if self._indexed > self.count:
+            self._rows, self._indexed = {}, 0
+        for row, key in enumerate(self.ids[self._indexed:self.count].tolist(), self._indexed):
+            self._rows[key] = row
+        self._indexed = self.count
+        return self._rows
+
+    def row_of(self, profile_id: str) -> Optional[int]:
+        self.refresh()
+        with self._lock:
+            return self._row_index().get(profile_id.encode())
+
+    def get(self, profile_id: str) -> Optional[np.ndarray]:
+        row = self.row_of(profile_id)
+        return None if row is None else np.array(self.vectors[row])
+
+    def add(self, profiles: Iterable[Tuple[str, np.ndarray]]) -> Tuple[int, int]:
+        """
+        Adds or replaces profiles by id. Returns (added, updated).
+        """
+        profiles = list(profiles)
+        if not profiles:
+            return 0, 0
+        keys = [_encode_id(profile_id) for profile_id, _ in profiles]
+        vectors = np.asarray([vector for _, vector in profiles], dtype=np.float32)
+        self.refresh()
+        with self._lock:
+            index = self._row_index()
+            start = self.count
+            rows, new_keys = [], []
+            for key in keys:
+                row = index.get(key)
+                if row is None:
+                    row = index[key] = self.count
+                    self.count += 1
+                    new_keys.append(key)
+                rows.append(row)
+            added = self.count - start
+            if self.count > self.capacity:
+                self._flush()
+                self._map(max(self.capacity * 2, self.count))
+            self._indexed = self.count
+            rows = np.asarray(rows)
+            # With duplicate ids in one call, the last vector wins, as with separate calls.
+            self.ids[start:self.count] = new_keys
+            self.vectors[rows] = vectors
+            self.norms[rows] = np.linalg.norm(vectors, axis=1)
+            self._flush()
+            self._write_meta()
+        return added, len(keys) - added
+
+    def _flush(self) -> None:
+        for array in (self.vectors, self.norms, self.ids):
+            array.flush()
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 10,
+        metric: str = "cosine",
+        exclude: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Exact k nearest neighbors of a query vector. The rows are scored in blocks of SEARCH_BLOCK_ROWS with one
+        matrix-vector product each, and only the best k of each block are kept, so memory stays bounded and a
+        few million profiles are searched in tens of milliseconds.
+        cosine ranks by cosine similarity (higher is closer); euclidean by distance between fraction vectors.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        self.refresh()
+        query = np.asarray(query, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        if metric == "cosine" and query_norm == 0.0:
+            raise ValueError("The query profile is empty")
+        excluded_row = self.row_of(exclude) if exclude else None
+        count = self.count
+        k = max(1, min(k, count))
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_keys = np.empty(0, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            stop = min(start + SEARCH_BLOCK_ROWS, count)
+            dots = self.vectors[start:stop] @ query
+            norms = self.norms[start:stop]
+            if metric == "cosine":
+                # Sort key: negative similarity, so that smaller is closer for both metrics.
+                keys = -np.divide(dots, norms * query_norm, out=np.zeros_like(dots), where=norms > 0)
+            else:
+                keys = np.square(norms) - 2 * dots + query_norm ** 2
+            if excluded_row is not None and start <= excluded_row < stop:
+                keys[excluded_row - start] = np.inf
+            if len(keys) > k:
+                candidates = np.argpartition(keys, k)[:k]
+            else:
+                candidates = np.arange(len(keys))
+            best_rows = np.concatenate([best_rows, candidates + start])
+            best_keys = np.concatenate([best_keys, keys[candidates]])
+            if len(best_keys) > k:
+                keep = np.argpartition(best_keys, k)[:k]
+                best_rows, best_keys = best_rows[keep], best_keys[keep]
+
+        order = np.argsort(best_keys, kind="stable")
+        results = []
+        for row, key in zip(best_rows[order].tolist(), best_keys[order].tolist()):
+            if key == np.inf:
+                continue
+            result = {"profile_id": self.ids[row].decode()}
+            if metric == "cosine":
+                result["similarity"] = round(-key, 6)
+            else:
+                result["distance"] = round(float(np.sqrt(max(key, 0.0))), 6)
+            results.append(result)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush()
+            del self.vectors, self.norms, self.ids
+
+
+def record_profiles(
+    records: Iterable[Any], default_prefix: str, dropped: Optional[Dict[str, int]] = None
+) -> Iterable[Tuple[str, np.ndarray]]:
+    """
+    (id, vector) pairs of stored ancestry results. The id is the record's "profile_id", "id" or "wallet"
+    field, or "<default_prefix>:<position>" when it has none. Records without an ancestry dict are skipped.
+    Populations outside the reference set are counted in dropped, as in profile_vector.
+    """
+    from genobank_cohort import ancestry_of
+
+    for position, record in enumerate(records):
+        ancestry = ancestry_of(record)
+        if not ancestry:
+            continue
+        try:
+            vector = profile_vector(ancestry, dropped=dropped)
+        except (TypeError, ValueError):
+            continue
+        profile_id = next(
+            (str(record[field]) for field in ("profile_id", "id", "wallet") if record.get(field)),
+            f"{default_prefix}:{position}",
+        )
+        yield profile_id, vector
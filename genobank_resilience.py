@@ -0,0 +1,268 @@
+"""
+Retry, backoff, circuit breaking and adaptive concurrency limits for outbound GenoBank API calls.
+"""
+import asyncio
+import collections
+import email.utils
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Optional
+
+import httpx
+
+# Failures that happen before the request reaches the server; retrying these can never duplicate a mint.
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request while an endpoint's circuit breaker is open.
+    """
+
+    def __init__(self, endpoint: str, retry_in: float):
+        super().__init__(f"GenoBank endpoint {endpoint} is unavailable; not retrying for {retry_in:.0f}s")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 10.0
+    max_retry_after: float = 30.0
+    retry_statuses: frozenset = field(default_factory=lambda: frozenset({429, 502, 503, 504}))
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Exponential backoff with full jitter for the given retry (1-based).
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and fails fast for `reset_timeout` seconds.
+    It then lets one trial request through and closes again if that request succeeds.
+    """
+
+    def __init__(self, endpoint: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_request(self) -> bool:
+        """
+        Raises CircuitOpenError while the circuit is open. Returns whether the request is the half-open trial.
+        """
+        state = self.state
+        if state == "open":
+            raise CircuitOpenError(self.endpoint, self.reset_timeout - (time.monotonic() - self.opened_at))
+        if state == "half-open":
+            if self._trial_in_flight:
+                raise CircuitOpenError(self.endpoint, 0)
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def release_trial(self) -> None:
+        """
+        Ends a trial request that produced no outcome (e.g. it was cancelled), so another trial can be made.
+        """
+        self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency window for one endpoint. Requests beyond the current limit wait in a FIFO queue.
+    The limit grows by about one per window of healthy responses while the window is in use, and is cut by
+    `backoff_ratio` on 429/5xx responses or transport errors, at most once per round trip so a burst of
+    failures counts as one congestion signal. Latency above `latency_tolerance` times the baseline (the
+    lowest recent latency) shrinks it more gently, before the service starts refusing requests.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        initial: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: float = 2.0,
+    ):
+        self.endpoint = endpoint
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.baseline: Optional[float] = None
+        self._waiters: Deque[asyncio.Future] = collections.deque()
+        self._last_decrease = 0.0
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    async def acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the caller was cancelled; pass it on.
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False) -> None:
+        """
+        Frees a slot and adapts the limit. latency is the duration of the request; None records no sample.
+        """
+        self.in_flight -= 1
+        if overloaded:
+            self._decrease(self.backoff_ratio)
+        elif latency is not None:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                # Drifts slowly upwards, so a lasting change of the service's latency becomes the new baseline.
+                self.baseline += (latency - self.baseline) * 0.01
+            if latency > self.baseline * self.latency_tolerance:
+                self._decrease(0.9)
+            elif self.in_flight + 1 >= self.limit / 2:
+                # Only grows while at least half the window is in use; an idle window proves nothing.
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self._wake()
+
+    def _decrease(self, ratio: float) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < (self.baseline or 0.1):
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * ratio)
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+def retry_after_seconds(response: httpx.Response) -> Optional[float]:
+    """
+    Parses a Retry-After header given either in seconds or as an HTTP date.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def _is_failure(response: httpx.Response) -> bool:
+    return response.status_code == 429 or response.status_code >= 500
+
+
+async def send_with_retries(
+    client: httpx.AsyncClient,
+    method: str,
+    url: str,
+    *,
+    breaker: CircuitBreaker,
+    policy: RetryPolicy,
+    idempotent: bool,
+    limiter: Optional[AdaptiveLimiter] = None,
+    on_retry: Optional[Callable[[int, float], Any]] = None,
+    **kwargs: Any,
+) -> httpx.Response:
+    """
+    Sends a request through the endpoint's circuit breaker and concurrency limiter, retrying with backoff.
+    Idempotent requests are retried on transport errors and on retryable statuses.
+    Non-idempotent requests are only retried when the request was never sent, or was refused with 429.
+    Each attempt holds a limiter slot only while it is in flight, not during the backoff delay.
+    """
+    attempt = 1
+    while True:
+        trial = breaker.before_request()
+        if limiter is not None:
+            try:
+                await limiter.acquire()
+            except BaseException:
+                if trial:
+                    breaker.release_trial()
+                raise
+        started = time.monotonic()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            if limiter is not None:
+                limiter.release(overloaded=isinstance(e, httpx.TimeoutException))
+            breaker.record_failure()
+            retryable = idempotent or isinstance(e, NOT_SENT_ERRORS)
+            if not retryable or attempt >= policy.max_attempts:
+                raise
+            delay = policy.backoff(attempt)
+        except BaseException:
+            if limiter is not None:
+                limiter.release()
+            if trial:
+                # Cancelled or failed outside HTTP: no outcome to record, but the trial must not stay in flight.
+                breaker.release_trial()
+            raise
+        else:
+            if limiter is not None:
+                limiter.release(time.monotonic() - started, overloaded=_is_failure(response))
+            if _is_failure(response):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            retryable = response.status_code in policy.retry_statuses and (idempotent or response.status_code == 429)
+            if not retryable or attempt >= policy.max_attempts:
+                return response
+            retry_after = retry_after_seconds(response)
+            if retry_after is not None and retry_after > policy.max_retry_after:
+                return response
+            delay = retry_after if retry_after is not None else policy.backoff(attempt)
+        if on_retry is not None:
+            on_retry(attempt, delay)
+        attempt += 1
+        await asyncio.sleep(delay)
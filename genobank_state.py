@@ -0,0 +1,179 @@
+"""
+Key-value store for state that several server processes must share: signing sessions and cached results.
+"""
+import abc
+import asyncio
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from genobank_journal import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shared_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires REAL
+)
+"""
+
+
+class StateStore(abc.ABC):
+    """
+    String values with an optional TTL in seconds.
+    `shared` is True when other processes see the same data, so callers know whether to consult it.
+    get, set and delete block on I/O; code on the event loop uses aget, aset and adelete, which run them
+    in a thread.
+    """
+    shared = False
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    async def adelete(self, key: str) -> None:
+        await asyncio.to_thread(self.delete, key)
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryStateStore(StateStore):
+    """
+    Process-local store; the default for a single server process.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires <= time.time():
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._values[key] = (value, time.time() + ttl if ttl else None)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    # Nothing here blocks, so the async variants skip the thread.
+    async def aget(self, key: str) -> Optional[str]:
+        return self.get(key)
+
+    async def aset(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self.set(key, value, ttl)
+
+    async def adelete(self, key: str) -> None:
+        self.delete(key)
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Store in a local SQLite database (WAL mode), shared by every worker process on the same machine.
+    """
+    shared = True
+    # Expired rows are purged on every this many writes.
+    PURGE_EVERY = 256
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = connect(path)
+        self._connection.execute(SCHEMA)
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value FROM shared_state WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (key, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO shared_state (key, value, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires = excluded.expires",
+                (key, value, now + ttl if ttl else None),
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._connection.execute("DELETE FROM shared_state WHERE expires <= ?", (now,))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class RedisStateStore(StateStore):
+    """
+    Store on a Redis-compatible server, shared by worker processes on any machine.
+    Requires the optional redis package: pip install -e ".[redis]"
+    """
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "genobank:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('The Redis state store needs the redis package: pip install -e ".[redis]"') from e
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self._client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self.prefix + key)
+
+    def close(self) -> None:
+        self._client.close()
+
+
+def open_state_store(url: str, default_sqlite_path: str) -> StateStore:
+    """
+    Opens the store named by a URL: "memory", "sqlite" (at the default path), "sqlite:///<path>",
+    or "redis://..." / "rediss://...".
+    """
+    if url in ("", "memory"):
+        return MemoryStateStore()
+    if url == "sqlite":
+        return SQLiteStateStore(default_sqlite_path)
+    if url.startswith("sqlite:///"):
+        return SQLiteStateStore(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStateStore(url)
+    raise ValueError(f"Unsupported state store: {url}")
@@ -0,0 +1,350 @@
+"""
+Streaming VCF summaries for mint metadata: the number of unique variants and the reference assembly.
+Plain and BGZF-compressed (bgzip) files are split into chunks that a process pool summarizes in parallel;
+other gzip files are streamed in a single process.
+"""
+import gzip
+import os
+import re
+import struct
+import zlib
+from concurrent.futures import Executor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+BGZF_MAGIC = b"\x1f\x8b\x08\x04"
+# Uncompressed bytes handed to the line parser at a time; bounds the memory of each worker.
+PIECE_BYTES = 4 << 20
+# Smallest chunk of the file given to one worker, and chunks per worker, which evens out uneven chunks.
+MIN_CHUNK_BYTES = 8 << 20
+CHUNKS_PER_WORKER = 4
+
+# ALT values that are not variants: no call, spanning deletion, and gVCF reference blocks.
+NON_VARIANT_ALTS = frozenset((b".", b"*", b"<NON_REF>", b"<*>"))
+
+# Contig lengths that tell the two human reference assemblies apart.
+ASSEMBLY_CONTIG_LENGTHS = {
+    "GRCh37": {"1": 249250621, "2": 243199373, "3": 198022430, "X": 155270560, "Y": 59373566},
+    "GRCh38": {"1": 248956422, "2": 242193529, "3": 198295559, "X": 156040895, "Y": 57227415},
+}
+# Names OpenCRAVAT, and therefore mint_ip_job, uses for each assembly.
+OPENCRAVAT_ASSEMBLIES = {"GRCh37": "hg19", "GRCh38": "hg38"}
+REFERENCE_PATTERNS = (
+    (re.compile(r"grch38|hg38|hs38|\bb38\b|assembly38", re.IGNORECASE), "GRCh38"),
+    (re.compile(r"grch37|hg19|hs37|\bb37\b|g1k_v37|assembly19", re.IGNORECASE), "GRCh37"),
+)
+CONTIG_PATTERN = re.compile(r"^##contig=<(.*)>\s*$")
+
+# A group of records at one position: (chromosome, position, set of (ref, alt) alleles).
+Site = Tuple[bytes, int, frozenset]
+
+
+def file_kind(path: str) -> str:
+    """
+    "bgzf" for bgzip files, "gzip" for other gzip files, "plain" otherwise.
+    """
+    with open(path, "rb") as f:
+        header = f.read(18)
+    if header[:4] == BGZF_MAGIC and len(header) == 18 and header[12:14] == b"BC":
+        return "bgzf"
+    if header[:2] == b"\x1f\x8b":
+        return "gzip"
+    return "plain"
+
+
+def read_header(path: str, kind: str) -> List[str]:
+    opener = open if kind == "plain" else gzip.open
+    lines = []
+    with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+            lines.append(line.rstrip("\n"))
+    return lines
+
+
+def detect_assembly(header: List[str]) -> Dict[str, Any]:
+    """
+    Reference assembly from the lengths of the ##contig lines, or failing that from the ##reference line.
+    """
+    votes = dict.fromkeys(ASSEMBLY_CONTIG_LENGTHS, 0)
+    matched = []
+    for line in header:
+        contig = CONTIG_PATTERN.match(line)
+        if contig is None:
+            continue
+        fields = dict(item.split("=", 1) for item in contig.group(1).split(",") if "=" in item)
+        name = fields.get("ID", "")
+        name = name[3:] if name.lower().startswith("chr") else name
+        try:
+            length = int(fields.get("length", ""))
+        except ValueError:
+            continue
+        for assembly, lengths in ASSEMBLY_CONTIG_LENGTHS.items():
+            if lengths.get(name) == length:
+                votes[assembly] += 1
+                matched.append(f"{fields['ID']}={length}")
+    if any(votes.values()):
+        build = max(votes, key=votes.get)
+        if list(votes.values()).count(votes[build]) == 1:
+            return {"genome_build": build, "assembly": OPENCRAVAT_ASSEMBLIES[build],
+                    "evidence": "contig lengths " + ", ".join(matched)}
+    for line in header:
+        if line.startswith("##reference") or line.startswith("##assembly"):
+            for pattern, build in REFERENCE_PATTERNS:
+                if pattern.search(line):
+                    return {"genome_build": build, "assembly": OPENCRAVAT_ASSEMBLIES[build], "evidence": line}
+    return {"genome_build": "unknown", "assembly": "", "evidence": "no known contig lengths or reference name"}
+
+
+def _read_bgzf_block(f) -> Tuple[int, bytes]:
+    """
+    Reads the BGZF block at the file position; returns its compressed size and data ((0, b"") at the end).
+    """
+    header = f.read(12)
+    if len(header) < 12:
+        return 0, b""
+    if header[:4] != BGZF_MAGIC:
+        raise ValueError("Corrupt BGZF block")
+    extra_length = struct.unpack("<H", header[10:12])[0]
+    extra = f.read(extra_length)
+    block_size = None
+    position = 0
+    while position + 4 <= len(extra):
+        subfield_length = struct.unpack("<H", extra[position + 2:position + 4])[0]
+        if extra[position:position + 2] == b"BC":
+            block_size = struct.unpack("<H", extra[position + 4:position + 6])[0] + 1
+        position += 4 + subfield_length
+    if block_size is None:
+        raise ValueError("BGZF block without a size")
+    rest = f.read(block_size - 12 - extra_length)
+    try:
+        return block_size, zlib.decompress(rest[:-8], -15)
+    except zlib.error as e:
+        raise ValueError(f"Corrupt BGZF block: {e}") from None
+
+
+def bgzf_block_offsets(path: str) -> List[int]:
+    """
+    Start offset of every BGZF block, found by skipping from one block header to the next.
+    """
+    offsets = []
+    offset = 0
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(18)
+            if len(header) < 18:
+                break
+            if header[:4] != BGZF_MAGIC or header[12:14] != b"BC":
+                raise ValueError(f"Corrupt BGZF block at offset {offset}")
+            offsets.append(offset)
+            offset += struct.unpack("<H", header[16:18])[0] + 1
+            f.seek(offset)
+    return offsets
+
+
+def _range_data(path: str, kind: str, previous: Optional[int], start: int, end: Optional[int]) -> Iterator[bytes]:
+    """
+    Uncompressed data of a chunk, from the first line that starts in it to the end of the last one,
+    which may run past the chunk's end. previous is the offset of the block before the chunk (BGZF only).
+    """
+    if kind == "gzip":
+        with gzip.open(path, "rb") as f:
+            while data := f.read(PIECE_BYTES):
+                yield data
+        return
+
+    with open(path, "rb", buffering=1 << 20) as f:
+        if kind == "plain":
+            skip_partial = False
+            if start > 0:
+                f.seek(start - 1)
+                skip_partial = f.read(1) != b"\n"
+
+            def read() -> Tuple[int, bytes]:
+                position = f.tell()
+                limit = PIECE_BYTES if end is None or position >= end else min(PIECE_BYTES, end - position)
+                return position, f.read(limit)
+        else:
+            skip_partial = False
+            if previous is not None:
+                f.seek(previous)
+                skip_partial = not _read_bgzf_block(f)[1].endswith(b"\n")
+            f.seek(start)
+
+            def read() -> Tuple[int, bytes]:
+                position = f.tell()
+                return position, _read_bgzf_block(f)[1]
+
+        at_line_start = True
+        while True:
+            position, data = read()
+            if end is not None and position >= end:
+                break
+            if not data:
+                if position == f.tell():
+                    return
+                continue
+            if skip_partial:
+                newline = data.find(b"\n")
+                if newline < 0:
+                    continue
+                data = data[newline + 1:]
+                skip_partial = False
+                if not data:
+                    continue
+            yield data
+            at_line_start = data.endswith(b"\n")
+        # The chunk ended inside a line: finish it with data past the chunk's end.
+        while not at_line_start:
+            if not data:
+                if position == f.tell():
+                    return
+            newline = data.find(b"\n")
+            if newline >= 0:
+                yield data[:newline + 1]
+                return
+            yield data
+            position, data = read()
+
+
+def summarize_range(path: str, kind: str, previous: Optional[int], start: int, end: Optional[int]) -> Dict[str, Any]:
+    """
+    Counts the unique variants of one chunk. Runs in a worker process.
+    Records at the same position are adjacent in a sorted VCF, so only one site's alleles are kept at a time;
+    the first and last sites are returned so that sites split across chunks are counted once.
+    """
+    unique = records = malformed = 0
+    contigs: List[bytes] = []
+    in_order = True
+    chrom: Optional[bytes] = None
+    pos = -1
+    alleles: set = set()
+    first: Optional[Site] = None
+    tail = b""
+    for data in _range_data(path, kind, previous, start, end):
+        lines = (tail + data).split(b"\n")
+        tail = lines.pop()
+        for line in lines:
+            if not line or line[0] == 35:  # "#"
+                continue
+            fields = line.split(b"\t", 5)
+            if len(fields) < 5:
+                malformed += 1
+                continue
+            try:
+                line_pos = int(fields[1])
+            except ValueError:
+                malformed += 1
+                continue
+            records += 1
+            if line_pos != pos or fields[0] != chrom:
+                if chrom is not None:
+                    unique += len(alleles)
+                    if first is None:
+                        first = (chrom, pos, frozenset(alleles))
+                if fields[0] != chrom:
+                    if fields[0] in contigs:
+                        in_order = False
+                    contigs.append(fields[0])
+                    chrom = fields[0]
+                elif line_pos < pos:
+                    in_order = False
+                pos = line_pos
+                alleles = set()
+            ref = fields[3]
+            for alt in fields[4].split(b","):
+                if alt not in NON_VARIANT_ALTS:
+                    alleles.add((ref, alt))
+    if tail.strip():
+        malformed += 1
+    last: Optional[Site] = None
+    if chrom is not None:
+        unique += len(alleles)
+        last = (chrom, pos, frozenset(alleles))
+        if first is None:
+            first = last
+    return {"unique": unique, "records": records, "malformed": malformed, "contigs": contigs,
+            "in_order": in_order, "first": first, "last": last}
+
+
+def plan_chunks(path: str, kind: str, workers: int) -> List[Tuple[Optional[int], int, Optional[int]]]:
+    """
+    Splits a file into (previous block, start, end) chunks of at least MIN_CHUNK_BYTES compressed bytes.
+    """
+    if kind == "gzip":
+        return [(None, 0, None)]
+    if kind == "plain":
+        size = os.path.getsize(path)
+        chunk = max(MIN_CHUNK_BYTES, -(-size // max(1, workers * CHUNKS_PER_WORKER)))
+        return [(None, start, min(start + chunk, size)) for start in range(0, size, chunk)] or [(None, 0, 0)]
+    offsets = bgzf_block_offsets(path)
+    if not offsets:
+        return [(None, 0, 0)]
+    total = offsets[-1]
+    chunk = max(MIN_CHUNK_BYTES, -(-total // max(1, workers * CHUNKS_PER_WORKER)))
+    chunks = []
+    first_block = 0
+    for i in range(1, len(offsets) + 1):
+        if i == len(offsets) or offsets[i] - offsets[first_block] >= chunk:
+            previous = offsets[first_block - 1] if first_block > 0 else None
+            end = offsets[i] if i < len(offsets) else None
+            chunks.append((previous, offsets[first_block], end))
+            first_block = i
+    return chunks
+
+
+def merge_summaries(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    unique = sum(p["unique"] for p in parts)
+    records = sum(p["records"] for p in parts)
+    malformed = sum(p["malformed"] for p in parts)
+    in_order = all(p["in_order"] for p in parts)
+    contigs: List[bytes] = []
+    last: Optional[Site] = None
+    for part in parts:
+        if part["first"] is None:
+            continue
+        if last is not None and last[:2] == part["first"][:2]:
+            # One site split across two chunks: its alleles were counted in both.
+            unique -= len(last[2] & part["first"][2])
+        elif last is not None and last[0] == part["first"][0] and part["first"][1] < last[1]:
+            in_order = False
+        for contig in part["contigs"]:
+            if contigs and contigs[-1] == contig:
+                continue
+            if contig in contigs:
+                in_order = False
+            contigs.append(contig)
+        last = part["last"]
+    return {"unique": unique, "records": records, "malformed": malformed, "in_order": in_order,
+            "contigs": [c.decode(errors="replace") for c in contigs]}
+
+
+def summarize_vcf(path: str, executor: Optional[Executor] = None, workers: int = 1) -> Dict[str, Any]:
+    """
+    Summarizes one VCF: unique variants (distinct chromosome, position, REF and ALT allele), records,
+    contigs and reference assembly. Chunks run on the executor when one is given.
+    Unique variants are exact for coordinate-sorted files, as bgzip/tabix-indexed VCFs are; for unsorted
+    files "sorted" is false and the count may include duplicates.
+    """
+    kind = file_kind(path)
+    header = read_header(path, kind)
+    chunks = plan_chunks(path, kind, workers)
+    if executor is None or len(chunks) == 1:
+        parts = [summarize_range(path, kind, *chunk) for chunk in chunks]
+    else:
+        futures = [executor.submit(summarize_range, path, kind, *chunk) for chunk in chunks]
+        parts = [future.result() for future in futures]
+    merged = merge_summaries(parts)
+    assembly = detect_assembly(header)
+    return {
+        "num_unique_var": merged["unique"],
+        "assembly": assembly["assembly"],
+        "genome_build": assembly["genome_build"],
+        "assembly_evidence": assembly["evidence"],
+        "records": merged["records"],
+        "malformed_lines": merged["malformed"],
+        "sorted": merged["in_order"],
+        "contigs": len(merged["contigs"]),
+        "compression": kind,
+        "chunks": len(chunks),
+    }
@@ -0,0 +1,354 @@
+"""
+Watches OpenCRAVAT annotation jobs until they finish, polling their status in batches with adaptive intervals,
+and hands finished jobs with their metadata to the mint queue.
+"""
+import asyncio
+import json
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from genobank_jobs import worker_alive, worker_id
+from genobank_journal import connect
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cravat_watch (
+    job_id TEXT PRIMARY KEY,
+    mint TEXT,
+    auto_mint INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    cravat_status TEXT,
+    metadata TEXT,
+    ticket TEXT,
+    error TEXT,
+    checks INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL,
+    worker TEXT
+)
+"""
+
+# watching: polled until OpenCRAVAT reports a final status; finished: metadata ready to mint;
+# minting: handed to the mint queue (see ticket); failed: the job errored, was aborted or is unknown.
+STATUSES = ("watching", "finished", "minting", "failed")
+FINISHED_STATUSES = ("Finished",)
+FAILED_STATUSES = ("Error", "Aborted")
+# Consecutive polls a job may be missing from OpenCRAVAT's answer before it is reported as unknown.
+MAX_MISSING = 5
+
+# Maps the IP job fields to the keys OpenCRAVAT uses for them in its job status.
+METADATA_FIELDS = {
+    "opencravat_version": ("open_cravat_version", "opencravat_version"),
+    "num_unique_var": ("num_unique_var",),
+    "submission_time": ("submission_time",),
+    "assembly": ("assembly",),
+}
+
+FetchJobs = Callable[[List[str]], Awaitable[Dict[str, Dict[str, Any]]]]
+MintJob = Callable[[Dict[str, Any]], Awaitable[str]]
+
+
+def job_metadata(info: Dict[str, Any]) -> Dict[str, str]:
+    metadata = {}
+    for field, keys in METADATA_FIELDS.items():
+        value = next((info[key] for key in keys if info.get(key) is not None), "")
+        metadata[field] = str(value)
+    return metadata
+
+
+@dataclass
+class _Pending:
+    job_id: str
+    interval: float
+    next_check: float
+    cravat_status: Optional[str] = None
+    missing: int = 0
+
+
+class OpenCravatWatcher:
+    """
+    One background task polls every watched job. Due jobs are grouped into batches of `batch_size` ids per
+    request, and at most `concurrency` batches are in flight, so thousands of jobs cost a few requests per
+    interval. A job's interval starts at `min_interval` and grows by half after each poll that shows no progress,
+    up to `max_interval`; it resets when the job moves to a new step. Failed polls double the interval.
+    Watched jobs are stored in SQLite and resumed after a restart. The database is only touched from a thread,
+    and each poll writes its results in one transaction.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        fetch: FetchJobs,
+        mint: MintJob,
+        batch_size: int = 100,
+        concurrency: int = 4,
+        min_interval: float = 5.0,
+        max_interval: float = 300.0,
+    ):
+        self.path = path
+        self.fetch = fetch
+        self.mint = mint
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.worker = worker_id()
+        self._connection = connect(path)
+        self._connection.execute(SCHEMA)
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _Pending] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.polls = 0
+
+    @property
+    def watched(self) -> int:
+        """
+        Jobs this process is polling.
+        """
+        return len(self._pending)
+
+    def _execute(self, sql: str, args: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._connection.execute(sql, args)
+
+    def _write(self, statements: List[Tuple[str, List[tuple]]], read_ids: Sequence[str] = ()) -> Dict[str, tuple]:
+        """
+        Runs each statement over its rows in one transaction, and reads the (mint, auto_mint) fields of read_ids
+        in it. Blocks on SQLite; async code runs it in a thread.
+        """
+        if not read_ids and not any(rows for _, rows in statements):
+            return {}
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                for sql, rows in statements:
+                    if rows:
+                        self._connection.executemany(sql, rows)
+                fields = {}
+                for job_id in read_ids:
+                    fields[job_id] = self._connection.execute(
+                        "SELECT mint, auto_mint FROM cravat_watch WHERE job_id = ?", (job_id,)
+                    ).fetchone()
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+        return fields
+
+    def ensure_started(self) -> None:
+        """
+        Starts the polling task on the running event loop; it first resumes the jobs left over from a previous run.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._task is not None and not self._task.done():
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self._run())
+
+    def _take_over_orphans(self) -> List[str]:
+        rows = self._execute("SELECT job_id, worker FROM cravat_watch WHERE status = 'watching'").fetchall()
+        orphans = [job_id for job_id, worker in rows if worker == self.worker or not worker_alive(worker)]
+        self._write([("UPDATE cravat_watch SET worker = ? WHERE job_id = ?", [(self.worker, j) for j in orphans])])
+        return orphans
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._loop = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    async def watch(self, job_id: str, mint: Optional[Dict[str, Any]] = None, auto_mint: bool = False) -> bool:
+        """
+        Starts watching a job; mint holds the IP job fields OpenCRAVAT does not know (receiver, owner, ...).
+        Returns False if the job was already watched; its mint fields are updated.
+        """
+        self.ensure_started()
+        added = await asyncio.to_thread(self._insert, job_id, json.dumps(mint, sort_keys=True) if mint else None,
+                                        auto_mint)
+        if not added:
+            return False
+        self._pending[job_id] = _Pending(job_id, self.min_interval, time.monotonic())
+        self._wakeup.set()
+        return True
+
+    def _insert(self, job_id: str, mint_json: Optional[str], auto_mint: bool) -> bool:
+        added = self._execute(
+            "INSERT OR IGNORE INTO cravat_watch (job_id, mint, auto_mint, status, created, worker) "
+            "VALUES (?, ?, ?, 'watching', ?, ?)",
+            (job_id, mint_json, int(auto_mint), time.time(), self.worker),
+        ).rowcount
+        if not added:
+            self._execute(
+                "UPDATE cravat_watch SET mint = COALESCE(?, mint), auto_mint = ? WHERE job_id = ?",
+                (mint_json, int(auto_mint), job_id),
+            )
+        return bool(added)
+
+    async def unwatch(self, job_id: str) -> bool:
+        self._pending.pop(job_id, None)
+        cursor = await asyncio.to_thread(self._execute, "DELETE FROM cravat_watch WHERE job_id = ?", (job_id,))
+        return bool(cursor.rowcount)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = await asyncio.to_thread(
+            lambda: self._execute(f"SELECT {self._COLUMNS} FROM cravat_watch WHERE job_id = ?", (job_id,)).fetchone()
+        )
+        return self._row_to_job(row) if row else None
+
+    async def list(self, status: str = "", limit: int = 50) -> List[Dict[str, Any]]:
+        if status:
+            sql, args = f"SELECT {self._COLUMNS} FROM cravat_watch WHERE status = ? ORDER BY created DESC LIMIT ?", (
+                status, limit)
+        else:
+            sql, args = f"SELECT {self._COLUMNS} FROM cravat_watch ORDER BY created DESC LIMIT ?", (limit,)
+        rows = await asyncio.to_thread(lambda: self._execute(sql, args).fetchall())
+        return [self._row_to_job(row) for row in rows]
+
+    async def counts(self) -> Dict[str, int]:
+        rows = await asyncio.to_thread(
+            lambda: self._execute("SELECT status, COUNT(*) FROM cravat_watch GROUP BY status").fetchall()
+        )
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(dict(rows))
+        return counts
+
+    _COLUMNS = "job_id, mint, auto_mint, status, cravat_status, metadata, ticket, error, checks, created, updated"
+
+    def _row_to_job(self, row: tuple) -> Dict[str, Any]:
+        job_id, mint, auto_mint, status, cravat_status, metadata, ticket, error, checks, created, updated = row
+        job = {
+            "job_id": job_id,
+            "status": status,
+            "cravat_status": cravat_status,
+            "auto_mint": bool(auto_mint),
+            "checks": checks,
+            "created": created,
+            "updated": updated,
+        }
+        pending = self._pending.get(job_id)
+        if pending is not None:
+            job["next_check_in"] = round(max(0.0, pending.next_check - time.monotonic()), 1)
+        if metadata:
+            # Everything mint_ip_job needs, once the job has finished.
+            job["mint_ip_job"] = {**json.loads(mint or "{}"), "job_id": job_id, **json.loads(metadata)}
+        if ticket:
+            job["ticket"] = ticket
+        if error:
+            job["error"] = error
+        return job
+
+    def _reschedule(self, pending: _Pending, interval: float) -> None:
+        pending.interval = min(self.max_interval, max(self.min_interval, interval))
+        # Jitter keeps jobs added together from being polled in lockstep forever.
+        pending.next_check = time.monotonic() + pending.interval * random.uniform(0.9, 1.1)
+
+    _FINISH_SQL = ("UPDATE cravat_watch SET status = ?, updated = ?, metadata = COALESCE(?, metadata), "
+                   "ticket = COALESCE(?, ticket), error = COALESCE(?, error) WHERE job_id = ?")
+    _CHECKED_SQL = ("UPDATE cravat_watch SET cravat_status = ?, checks = checks + 1, error = NULL, updated = ? "
+                    "WHERE job_id = ?")
+    _POLL_FAILED_SQL = "UPDATE cravat_watch SET error = ? WHERE job_id = ?"
+
+    def _finish(self, job_id: str, status: str, metadata: Optional[str] = None, ticket: Optional[str] = None,
+                error: Optional[str] = None) -> tuple:
+        """
+        Stops polling a job and returns the row of _FINISH_SQL that records its outcome.
+        """
+        self._pending.pop(job_id, None)
+        return status, time.time(), metadata, ticket, error, job_id
+
+    async def _run(self) -> None:
+        now = time.monotonic()
+        for job_id in await asyncio.to_thread(self._take_over_orphans):
+            self._pending.setdefault(job_id, _Pending(job_id, self.min_interval, now))
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def poll(batch: List[_Pending]) -> None:
+            async with semaphore:
+                await self._poll(batch)
+
+        while True:
+            now = time.monotonic()
+            due = sorted((p for p in self._pending.values() if p.next_check <= now), key=lambda p: p.next_check)
+            if due:
+                batches = [due[i:i + self.batch_size] for i in range(0, len(due), self.batch_size)]
+                await asyncio.gather(*(poll(batch) for batch in batches))
+                continue
+            self._wakeup.clear()
+            delay = min((p.next_check for p in self._pending.values()), default=now + self.max_interval) - now
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.05, delay))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, batch: List[_Pending]) -> None:
+        self.polls += 1
+        try:
+            results = await self.fetch([p.job_id for p in batch])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            for pending in batch:
+                self._reschedule(pending, pending.interval * 2)
+            error = f"Status check failed: {e}"
+            await asyncio.to_thread(self._write, [(self._POLL_FAILED_SQL, [(error, p.job_id) for p in batch])])
+            return
+
+        now = time.time()
+        checked, finished, completed = [], [], {}
+        for pending in batch:
+            if pending.job_id not in self._pending:
+                continue
+            info = results.get(pending.job_id)
+            if info is None:
+                pending.missing += 1
+                if pending.missing >= MAX_MISSING:
+                    finished.append(self._finish(pending.job_id, "failed", error="OpenCRAVAT does not know this job"))
+                else:
+                    self._reschedule(pending, pending.interval * 2)
+                continue
+            pending.missing = 0
+            cravat_status = str(info.get("status", ""))
+            checked.append((cravat_status, now, pending.job_id))
+            if cravat_status in FINISHED_STATUSES:
+                completed[pending.job_id] = job_metadata(info)
+            elif cravat_status in FAILED_STATUSES:
+                error = f"OpenCRAVAT job status: {cravat_status}"
+                finished.append(self._finish(pending.job_id, "failed", error=error))
+            elif cravat_status != pending.cravat_status:
+                pending.cravat_status = cravat_status
+                self._reschedule(pending, self.min_interval)
+            else:
+                self._reschedule(pending, pending.interval * 1.5)
+
+        fields = await asyncio.to_thread(
+            self._write, [(self._CHECKED_SQL, checked), (self._FINISH_SQL, finished)], list(completed)
+        )
+        if completed:
+            # A job unwatched during the poll has no row left to read.
+            rows = [await self._complete(job_id, metadata, *fields[job_id])
+                    for job_id, metadata in completed.items() if fields[job_id]]
+            await asyncio.to_thread(self._write, [(self._FINISH_SQL, rows)])
+
+    async def _complete(self, job_id: str, metadata: Dict[str, str], mint: Optional[str], auto_mint: int) -> tuple:
+        """
+        Hands a finished job to the mint queue if it was watched with auto_mint, and returns its _FINISH_SQL row.
+        """
+        metadata_json = json.dumps(metadata)
+        if not auto_mint:
+            return self._finish(job_id, "finished", metadata=metadata_json)
+        try:
+            ticket = await self.mint({**json.loads(mint or "{}"), "job_id": job_id, **metadata})
+        except Exception as e:
+            return self._finish(job_id, "finished", metadata=metadata_json, error=f"Auto-mint failed: {e}")
+        return self._finish(job_id, "minting", metadata=metadata_json, ticket=ticket)